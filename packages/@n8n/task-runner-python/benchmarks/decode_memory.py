@@ -0,0 +1,126 @@
+"""Compare peak RSS of decoding a large task, in the runner and in the child.
+
+Run with `just bench decode_memory`. Each case runs in a fresh process, which
+reads the encoded task from a file and reports how much its peak RSS grew while
+decoding and holding the decoded value.
+"""
+
+import json
+import multiprocessing
+import resource
+import tempfile
+from collections.abc import Callable
+
+from src import json_codec
+from src.constants import BROKER_TASK_SETTINGS
+from src.message_serde import MessageSerde
+
+ITEM_COUNT = 100_000
+
+STATUSES = ["active", "inactive", "pending"]
+COUNTRIES = ["DE", "FR", "US", "VN"]
+
+
+def create_item(i: int) -> dict:
+    return {
+        "json": {
+            "id": i,
+            "name": f"Contact {i}",
+            "email": f"contact{i}@example.com",
+            "status": STATUSES[i % len(STATUSES)],
+            "country": COUNTRIES[i % len(COUNTRIES)],
+            "createdAt": "2024-05-01T12:34:56.000Z",
+            "tags": ["lead", "newsletter"],
+        },
+        "pairedItem": {"item": i},
+    }
+
+
+def create_task_settings(items_json: bytes) -> bytes:
+    head = json.dumps(
+        {
+            "type": BROKER_TASK_SETTINGS,
+            "taskId": "t1",
+            "settings": {"code": "return _items", "nodeMode": "runOnceForAllItems"},
+        }
+    ).encode()
+    # place the items as the broker does, ahead of a few short fields
+    return head[:-2] + b', "items": ' + items_json + b', "continueOnFail": false}}'
+
+
+def get_max_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_in_process(path: str, decode: Callable[[bytes], object], conn) -> None:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    before = get_max_rss_kb()
+    decoded = decode(data)
+    conn.send(get_max_rss_kb() - before)
+    del decoded
+
+
+def measure(path: str, decode: Callable[[bytes], object]) -> float:
+    """Peak RSS growth in MiB."""
+
+    context = multiprocessing.get_context("spawn")
+    recv_conn, send_conn = context.Pipe(duplex=False)
+    process = context.Process(target=measure_in_process, args=(path, decode, send_conn))
+    process.start()
+    growth_kb = recv_conn.recv()
+    process.join()
+    return growth_kb / 1024
+
+
+# ========== runner ==========
+
+
+def runner_legacy(data: bytes) -> object:
+    """As it was: the whole message, items included, decoded in the runner."""
+
+    return json.loads(data)
+
+
+def runner_current(data: bytes) -> object:
+    return MessageSerde.deserialize_broker_message(data)
+
+
+# ========== child ==========
+
+
+def child_loads(data: bytes) -> object:
+    return json_codec.loads(data)
+
+
+def child_loads_compact(data: bytes) -> object:
+    return json_codec.loads_compact(data)
+
+
+def main():
+    items_json = json_codec.dumps([create_item(i) for i in range(ITEM_COUNT)])
+    message = create_task_settings(items_json)
+
+    cases = [
+        ("runner", message, runner_legacy, runner_current),
+        ("child", items_json, child_loads, child_loads_compact),
+    ]
+
+    print(f"{ITEM_COUNT:,} items, {len(items_json) / (1024 * 1024):.1f} MiB of JSON\n")
+    print(f"{'process':>8} {'before (MiB)':>13} {'after (MiB)':>12} {'saved':>7}")
+
+    for name, data, before_decode, after_decode in cases:
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+
+            before = measure(f.name, before_decode)
+            after = measure(f.name, after_decode)
+
+        saved = (1 - after / before) * 100 if before else 0.0
+        print(f"{name:>8} {before:>13.1f} {after:>12.1f} {saved:>6.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare JSON decoding backends on typical n8n item shapes.
+
+Run with `just bench json_codec`. Backends that are not installed are skipped,
+so to include them run e.g. `uv run --extra json python -m benchmarks.json_codec`.
+"""
+
+import statistics
+import time
+
+from src import json_codec
+from src.message_types.broker import Items
+
+ITEM_COUNT = 20_000
+ROUNDS = 5
+
+
+def flat_record(i: int) -> dict:
+    return {
+        "id": i,
+        "name": f"Contact {i}",
+        "email": f"contact{i}@example.com",
+        "createdAt": "2024-05-01T12:34:56.000Z",
+        "active": i % 2 == 0,
+        "score": i * 0.37,
+        "tags": ["lead", "newsletter"],
+    }
+
+
+def nested_record(i: int) -> dict:
+    return {
+        "order": {
+            "id": f"ord_{i}",
+            "customer": {"id": i, "name": f"Customer {i}", "vip": False},
+            "lines": [
+                {"sku": f"SKU-{j}", "quantity": j + 1, "price": 9.99 * (j + 1)}
+                for j in range(5)
+            ],
+            "shipping": {
+                "address": {"street": "Main St 1", "city": "Berlin", "zip": "10115"},
+                "method": "express",
+            },
+        },
+        "meta": {"source": "webhook", "headers": {"content-type": "application/json"}},
+    }
+
+
+def text_record(i: int) -> dict:
+    return {
+        "subject": f"Re: Angebot Nr. {i} – Rückfrage",
+        "body": "Grüße aus Köln! Café, naïve façade, 東京, emoji 🎉. " * 20,
+        "from": "sender@example.com",
+    }
+
+
+def numeric_record(i: int) -> dict:
+    return {
+        "sensor": f"s-{i % 16}",
+        "readings": [i * 0.001 + j * 0.5 for j in range(50)],
+    }
+
+
+SHAPES = {
+    "flat": flat_record,
+    "nested": nested_record,
+    "text": text_record,
+    "numeric": numeric_record,
+}
+
+
+def create_items(shape) -> Items:
+    return [{"json": shape(i), "pairedItem": {"item": i}} for i in range(ITEM_COUNT)]
+
+
+def measure(fn) -> float:
+    durations = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    backends = {}
+    for name in json_codec.BACKENDS:
+        try:
+            backends[name] = json_codec.load_backend(name)
+        except ImportError:
+            print(f"{name} is not installed, skipping")
+
+    print(f"Selected: {json_codec.backend_name} for decoding\n")
+    print(
+        f"{'shape':>8} {'backend':>8} {'MB':>7} {'encode (ms)':>12} {'decode (ms)':>12}"
+    )
+
+    for shape_name, shape in SHAPES.items():
+        items = create_items(shape)
+        data = json_codec.dumps(items)
+        size_mb = len(data) / (1024 * 1024)
+        encode = measure(lambda items=items: json_codec.dumps(items)) * 1000
+
+        for name, backend_loads in backends.items():
+            decode = (
+                measure(
+                    lambda backend_loads=backend_loads, data=data: backend_loads(data)
+                )
+                * 1000
+            )
+
+            print(
+                f"{shape_name:>8} {name:>8} {size_mb:>7.1f} {encode:>12.1f} {decode:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Compare runner message serialization before and after the copy-free fast path.
+
+Run with `just bench message_serde`.
+"""
+
+import json
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from src.constants import RUNNER_TASK_DONE
+from src.message_serde import MessageSerde, _snake_to_camel_case
+from src.message_types import (
+    RunnerInfo,
+    RunnerMessage,
+    RunnerRpcCall,
+    RunnerTaskAccepted,
+    RunnerTaskDone,
+    RunnerTaskError,
+    RunnerTaskOffer,
+    RunnerTaskRejected,
+)
+
+ROUNDS = 5
+LARGE_RESULT_ITEM_COUNT = 100_000
+
+
+@dataclass
+class LegacyTaskDone:
+    """`runner:taskdone` as it was: the decoded result nested in `data`."""
+
+    task_id: str
+    data: dict[str, Any]
+    type: str = RUNNER_TASK_DONE
+
+
+def legacy_serialize(message) -> str:
+    """Serialization as it was: deep-copy via `asdict`, camel-case on every call."""
+
+    data = asdict(message)
+    camel_case_data = {_snake_to_camel_case(k): v for k, v in data.items()}
+    return json.dumps(camel_case_data)
+
+
+def measure(fn, iterations: int) -> float:
+    """Median seconds per call."""
+
+    durations = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        durations.append((time.perf_counter() - start) / iterations)
+    return statistics.median(durations)
+
+
+def main():
+    items = [{"json": {"id": i, "name": f"item {i}"}} for i in range(10)]
+    large_items = [
+        {"json": {"id": i, "name": f"item {i}"}} for i in range(LARGE_RESULT_ITEM_COUNT)
+    ]
+
+    # (name, legacy message, current message, iterations)
+    cases: list[tuple[str, Any, RunnerMessage, int]] = [
+        (
+            "info",
+            RunnerInfo(name="Python Task Runner", types=["python"]),
+            RunnerInfo(name="Python Task Runner", types=["python"]),
+            100_000,
+        ),
+        (
+            "taskoffer",
+            RunnerTaskOffer(offer_id="o1", task_type="python", valid_for=5000),
+            RunnerTaskOffer(offer_id="o1", task_type="python", valid_for=5000),
+            100_000,
+        ),
+        (
+            "taskaccepted",
+            RunnerTaskAccepted(task_id="t1"),
+            RunnerTaskAccepted(task_id="t1"),
+            100_000,
+        ),
+        (
+            "taskrejected",
+            RunnerTaskRejected(task_id="t1", reason="at capacity"),
+            RunnerTaskRejected(task_id="t1", reason="at capacity"),
+            100_000,
+        ),
+        (
+            "taskerror",
+            RunnerTaskError(task_id="t1", error={"message": "boom"}),
+            RunnerTaskError(task_id="t1", error={"message": "boom"}),
+            100_000,
+        ),
+        (
+            "rpc",
+            RunnerRpcCall(call_id="c1", task_id="t1", name="log", params=["'hi'"]),
+            RunnerRpcCall(call_id="c1", task_id="t1", name="log", params=["'hi'"]),
+            100_000,
+        ),
+        (
+            "taskdone (10 items)",
+            LegacyTaskDone(task_id="t1", data={"result": items}),
+            RunnerTaskDone(task_id="t1", result=json.dumps(items).encode()),
+            20_000,
+        ),
+        (
+            f"taskdone ({LARGE_RESULT_ITEM_COUNT:,} items)",
+            LegacyTaskDone(task_id="t1", data={"result": large_items}),
+            RunnerTaskDone(task_id="t1", result=json.dumps(large_items).encode()),
+            3,
+        ),
+    ]
+
+    print(f"{'message':>26} {'legacy (us)':>12} {'current (us)':>13} {'speedup':>8}")
+
+    for name, legacy_message, message, iterations in cases:
+        legacy = measure(
+            lambda legacy_message=legacy_message: legacy_serialize(legacy_message),
+            iterations,
+        )
+        current = measure(
+            lambda message=message: MessageSerde.serialize_runner_message(message),
+            iterations,
+        )
+
+        print(
+            f"{name:>26} {legacy * 1e6:>12.1f} {current * 1e6:>13.1f} {legacy / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
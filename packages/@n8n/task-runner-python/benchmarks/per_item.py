@@ -0,0 +1,84 @@
+"""Compare per-item execution before and after defining the user function once.
+
+Run with `just bench per_item`.
+"""
+
+import builtins
+import marshal
+import statistics
+import time
+from typing import Any
+
+from src.config.security_config import SecurityConfig
+from src.constants import EXECUTOR_PER_ITEM_FILENAME, EXECUTOR_USER_OUTPUT_KEY
+from src.message_types.broker import Items
+from src.task_analyzer import TaskAnalyzer
+from src.task_executor import TaskExecutor
+
+ITEM_COUNTS = [10_000, 100_000]
+ROUNDS = 5
+USER_CODE = "return {'doubled': _item['json']['value'] * 2}"
+
+
+def legacy_per_item(raw_code: str, items: Items, builtins: dict[str, Any]) -> Items:
+    """Per-item execution as it was: re-exec the whole module for every item."""
+
+    wrapped_code = TaskAnalyzer._wrap_code(raw_code, "all_items")
+    compiled_code = compile(wrapped_code, EXECUTOR_PER_ITEM_FILENAME, "exec")
+    custom_print = TaskExecutor._format_print_args
+
+    result: Items = []
+    for index, item in enumerate(items):
+        globals = {"__builtins__": builtins, "_item": item, "print": custom_print}
+        exec(compiled_code, globals)
+        user_output = globals[EXECUTOR_USER_OUTPUT_KEY]
+        if user_output is None:
+            continue
+        json_data = TaskExecutor._extract_json_data_per_item(user_output)
+        result.append({"json": json_data, "pairedItem": {"item": index}})
+
+    return result
+
+
+def measure(fn) -> float:
+    durations = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    security_config = SecurityConfig(
+        stdlib_allow=set(),
+        external_allow=set(),
+        builtins_deny=set(),
+        runner_env_deny=False,
+    )
+    compiled_code = TaskAnalyzer(security_config).compile(USER_CODE, "per_item")
+    code_object = marshal.loads(compiled_code)
+    builtins_dict = dict(builtins.__dict__)
+    custom_print = TaskExecutor._format_print_args
+
+    print(f"{'items':>8} {'legacy (ms)':>12} {'current (ms)':>13} {'speedup':>8}")
+
+    for count in ITEM_COUNTS:
+        items = [{"json": {"value": i}} for i in range(count)]
+
+        legacy = measure(
+            lambda items=items: legacy_per_item(USER_CODE, items, builtins_dict)
+        )
+        current = measure(
+            lambda items=items: TaskExecutor._per_item(
+                code_object, items, custom_print, builtins_dict
+            )
+        )
+
+        print(
+            f"{count:>8} {legacy * 1000:>12.1f} {current * 1000:>13.1f} {legacy / current:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
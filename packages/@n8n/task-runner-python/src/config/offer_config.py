@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class OfferConfig:
+    validity_min: int  # ms
+    validity_max: int  # ms
+    latency_buffer_min: int  # ms
+    latency_buffer_max: int  # ms
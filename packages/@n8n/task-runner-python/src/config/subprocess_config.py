@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class SubprocessConfig:
+    print_max_bytes: int
+    print_records_kept: int
+    max_result_size: int
+    compact_decode: bool  # decode items with `json_codec.loads_compact`
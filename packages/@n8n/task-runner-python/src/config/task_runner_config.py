@@ -1,30 +1,56 @@
 from dataclasses import dataclass
 
-from src.env import read_bool_env, read_int_env, read_str_env
+from src.env import read_bool_env, read_env, read_int_env, read_str_env
 from src.errors import ConfigurationError
 from src.constants import (
     BUILTINS_DENY_DEFAULT,
     DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_PREFETCH_DEPTH,
     DEFAULT_MAX_PAYLOAD_SIZE,
     DEFAULT_TASK_BROKER_URI,
     DEFAULT_TASK_TIMEOUT,
     DEFAULT_AUTO_SHUTDOWN_TIMEOUT,
     DEFAULT_SHUTDOWN_TIMEOUT,
+    DEFAULT_WORKER_POOL_MAX_TASKS,
+    DEFAULT_WORKER_POOL_MAX_RSS,
+    DEFAULT_PER_ITEM_SHARD_THRESHOLD,
+    DEFAULT_ITEMS_SPILL_THRESHOLD,
+    DEFAULT_RESULT_CHUNK_SIZE,
+    DEFAULT_MESSAGE_SPOOL_THRESHOLD,
+    DEFAULT_PRINT_MAX_BYTES,
+    DEFAULT_PRINT_RECORDS_KEPT,
+    DEFAULT_OFFER_VALIDITY_MIN,
+    DEFAULT_OFFER_VALIDITY_MAX,
+    DEFAULT_OFFER_LATENCY_BUFFER_MIN,
+    DEFAULT_OFFER_LATENCY_BUFFER_MAX,
     ENV_BLOCK_RUNNER_ENV_ACCESS,
     ENV_BUILTINS_DENY,
     ENV_EXTERNAL_ALLOW,
     ENV_GRANT_TOKEN,
     ENV_MAX_CONCURRENCY,
+    ENV_PREFETCH_DEPTH,
     ENV_MAX_PAYLOAD_SIZE,
     ENV_STDLIB_ALLOW,
     ENV_TASK_BROKER_URI,
     ENV_TASK_TIMEOUT,
     ENV_AUTO_SHUTDOWN_TIMEOUT,
     ENV_GRACEFUL_SHUTDOWN_TIMEOUT,
+    ENV_PRELOAD,
+    ENV_WORKER_POOL_ENABLED,
+    ENV_WORKER_POOL_MAX_TASKS,
+    ENV_WORKER_POOL_MAX_RSS,
+    ENV_PER_ITEM_SHARD_THRESHOLD,
+    ENV_ITEMS_SPILL_THRESHOLD,
+    ENV_RESULT_CHUNK_SIZE,
+    ENV_MESSAGE_SPOOL_THRESHOLD,
+    ENV_PRINT_MAX_BYTES,
+    ENV_ITEMS_COMPACT_DECODE,
+    ENV_PRINT_RECORDS_KEPT,
+    ENV_OFFER_VALIDITY_MIN,
+    ENV_OFFER_VALIDITY_MAX,
+    ENV_OFFER_LATENCY_BUFFER_MIN,
+    ENV_OFFER_LATENCY_BUFFER_MAX,
     PIPE_MSG_MAX_SIZE,
-    TYPICAL_PAYLOAD_RATIO,
-    PARSE_THROUGHPUT_BYTES_PER_SEC,
-    PIPE_READER_JOIN_TIMEOUT_SAFETY_BUFFER,
 )
 
 
@@ -47,11 +73,30 @@ def parse_allowlist(allowlist_str: str, list_name: str) -> set[str]:
     return modules
 
 
+def parse_preload(
+    preload_str: str | None, stdlib_allow: set[str], external_allow: set[str]
+) -> set[str]:
+    """Modules to import into the forkserver, defaulting to all allowlisted modules."""
+
+    if preload_str is None:
+        return {module for module in stdlib_allow | external_allow if module != "*"}
+
+    modules = parse_allowlist(preload_str, ENV_PRELOAD)
+
+    if "*" in modules:
+        raise ConfigurationError(
+            f"Wildcard '*' is not supported in {ENV_PRELOAD}, list modules explicitly"
+        )
+
+    return modules
+
+
 @dataclass
 class TaskRunnerConfig:
     grant_token: str
     task_broker_uri: str
     max_concurrency: int
+    prefetch_depth: int
     max_payload_size: int
     task_timeout: int
     auto_shutdown_timeout: int
@@ -60,7 +105,21 @@ class TaskRunnerConfig:
     external_allow: set[str]
     builtins_deny: set[str]
     env_deny: bool
-    pipe_reader_timeout: float
+    preload: set[str]
+    worker_pool_enabled: bool
+    worker_pool_max_tasks: int
+    worker_pool_max_rss: int
+    per_item_shard_threshold: int
+    items_spill_threshold: int
+    result_chunk_size: int
+    message_spool_threshold: int
+    print_max_bytes: int
+    print_records_kept: int
+    items_compact_decode: bool
+    offer_validity_min: int
+    offer_validity_max: int
+    offer_latency_buffer_min: int
+    offer_latency_buffer_max: int
 
     @property
     def is_auto_shutdown_enabled(self) -> bool:
@@ -96,32 +155,130 @@ class TaskRunnerConfig:
                 f"Graceful shutdown timeout must be positive, got {graceful_shutdown_timeout}"
             )
 
+        prefetch_depth = read_int_env(ENV_PREFETCH_DEPTH, DEFAULT_PREFETCH_DEPTH)
+        if prefetch_depth < 0:
+            raise ConfigurationError(
+                f"Prefetch depth must be non-negative, got {prefetch_depth}"
+            )
+
         max_payload_size = read_int_env(ENV_MAX_PAYLOAD_SIZE, DEFAULT_MAX_PAYLOAD_SIZE)
         if max_payload_size > PIPE_MSG_MAX_SIZE:
             raise ConfigurationError(
                 f"Max payload size of {max_payload_size} bytes exceeds pipe message limit of {PIPE_MSG_MAX_SIZE} bytes. Reduce {ENV_MAX_PAYLOAD_SIZE}."
             )
 
-        # Calculate pipe reader timeout based on configured max payload size (3s for default 1 GiB)
-        typical_payload = max_payload_size * TYPICAL_PAYLOAD_RATIO
-        pipe_reader_timeout = (
-            typical_payload / PARSE_THROUGHPUT_BYTES_PER_SEC
-        ) + PIPE_READER_JOIN_TIMEOUT_SAFETY_BUFFER
+        worker_pool_max_tasks = read_int_env(
+            ENV_WORKER_POOL_MAX_TASKS, DEFAULT_WORKER_POOL_MAX_TASKS
+        )
+        if worker_pool_max_tasks <= 0:
+            raise ConfigurationError(
+                f"Worker pool max tasks must be positive, got {worker_pool_max_tasks}"
+            )
+
+        worker_pool_max_rss = read_int_env(
+            ENV_WORKER_POOL_MAX_RSS, DEFAULT_WORKER_POOL_MAX_RSS
+        )
+        if worker_pool_max_rss < 0:
+            raise ConfigurationError(
+                f"Worker pool max RSS must be non-negative, got {worker_pool_max_rss}"
+            )
+
+        per_item_shard_threshold = read_int_env(
+            ENV_PER_ITEM_SHARD_THRESHOLD, DEFAULT_PER_ITEM_SHARD_THRESHOLD
+        )
+        if per_item_shard_threshold < 0:
+            raise ConfigurationError(
+                f"Per-item shard threshold must be non-negative, got {per_item_shard_threshold}"
+            )
+
+        items_spill_threshold = read_int_env(
+            ENV_ITEMS_SPILL_THRESHOLD, DEFAULT_ITEMS_SPILL_THRESHOLD
+        )
+        if items_spill_threshold < 0:
+            raise ConfigurationError(
+                f"Items spill threshold must be non-negative, got {items_spill_threshold}"
+            )
+
+        result_chunk_size = read_int_env(
+            ENV_RESULT_CHUNK_SIZE, DEFAULT_RESULT_CHUNK_SIZE
+        )
+        if result_chunk_size <= 0:
+            raise ConfigurationError(
+                f"Result chunk size must be positive, got {result_chunk_size}"
+            )
+
+        message_spool_threshold = read_int_env(
+            ENV_MESSAGE_SPOOL_THRESHOLD, DEFAULT_MESSAGE_SPOOL_THRESHOLD
+        )
+        if message_spool_threshold < 0:
+            raise ConfigurationError(
+                f"Message spool threshold must be non-negative, got {message_spool_threshold}"
+            )
+
+        print_max_bytes = read_int_env(ENV_PRINT_MAX_BYTES, DEFAULT_PRINT_MAX_BYTES)
+        if print_max_bytes < 0:
+            raise ConfigurationError(
+                f"Print max bytes must be non-negative, got {print_max_bytes}"
+            )
+
+        print_records_kept = read_int_env(
+            ENV_PRINT_RECORDS_KEPT, DEFAULT_PRINT_RECORDS_KEPT
+        )
+        if print_records_kept < 0:
+            raise ConfigurationError(
+                f"Print records kept must be non-negative, got {print_records_kept}"
+            )
+
+        offer_validity_min = read_int_env(
+            ENV_OFFER_VALIDITY_MIN, DEFAULT_OFFER_VALIDITY_MIN
+        )
+        if offer_validity_min <= 0:
+            raise ConfigurationError(
+                f"Offer validity min must be positive, got {offer_validity_min}"
+            )
+
+        offer_validity_max = read_int_env(
+            ENV_OFFER_VALIDITY_MAX, DEFAULT_OFFER_VALIDITY_MAX
+        )
+        if offer_validity_max < offer_validity_min:
+            raise ConfigurationError(
+                f"Offer validity max must be at least the min of {offer_validity_min}, got {offer_validity_max}"
+            )
+
+        offer_latency_buffer_min = read_int_env(
+            ENV_OFFER_LATENCY_BUFFER_MIN, DEFAULT_OFFER_LATENCY_BUFFER_MIN
+        )
+        if offer_latency_buffer_min < 0:
+            raise ConfigurationError(
+                f"Offer latency buffer min must be non-negative, got {offer_latency_buffer_min}"
+            )
+
+        offer_latency_buffer_max = read_int_env(
+            ENV_OFFER_LATENCY_BUFFER_MAX, DEFAULT_OFFER_LATENCY_BUFFER_MAX
+        )
+        if offer_latency_buffer_max < offer_latency_buffer_min:
+            raise ConfigurationError(
+                f"Offer latency buffer max must be at least the min of {offer_latency_buffer_min}, got {offer_latency_buffer_max}"
+            )
+
+        stdlib_allow = parse_allowlist(
+            read_str_env(ENV_STDLIB_ALLOW, ""), ENV_STDLIB_ALLOW
+        )
+        external_allow = parse_allowlist(
+            read_str_env(ENV_EXTERNAL_ALLOW, ""), ENV_EXTERNAL_ALLOW
+        )
 
         return cls(
             grant_token=grant_token,
             task_broker_uri=read_str_env(ENV_TASK_BROKER_URI, DEFAULT_TASK_BROKER_URI),
             max_concurrency=read_int_env(ENV_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY),
+            prefetch_depth=prefetch_depth,
             max_payload_size=max_payload_size,
             task_timeout=task_timeout,
             auto_shutdown_timeout=auto_shutdown_timeout,
             graceful_shutdown_timeout=graceful_shutdown_timeout,
-            stdlib_allow=parse_allowlist(
-                read_str_env(ENV_STDLIB_ALLOW, ""), ENV_STDLIB_ALLOW
-            ),
-            external_allow=parse_allowlist(
-                read_str_env(ENV_EXTERNAL_ALLOW, ""), ENV_EXTERNAL_ALLOW
-            ),
+            stdlib_allow=stdlib_allow,
+            external_allow=external_allow,
             builtins_deny=set(
                 module.strip()
                 for module in read_str_env(
@@ -129,5 +286,19 @@ class TaskRunnerConfig:
                 ).split(",")
             ),
             env_deny=read_bool_env(ENV_BLOCK_RUNNER_ENV_ACCESS, True),
-            pipe_reader_timeout=pipe_reader_timeout,
+            preload=parse_preload(read_env(ENV_PRELOAD), stdlib_allow, external_allow),
+            worker_pool_enabled=read_bool_env(ENV_WORKER_POOL_ENABLED, False),
+            worker_pool_max_tasks=worker_pool_max_tasks,
+            worker_pool_max_rss=worker_pool_max_rss,
+            per_item_shard_threshold=per_item_shard_threshold,
+            items_spill_threshold=items_spill_threshold,
+            result_chunk_size=result_chunk_size,
+            message_spool_threshold=message_spool_threshold,
+            print_max_bytes=print_max_bytes,
+            print_records_kept=print_records_kept,
+            items_compact_decode=read_bool_env(ENV_ITEMS_COMPACT_DECODE, False),
+            offer_validity_min=offer_validity_min,
+            offer_validity_max=offer_validity_max,
+            offer_latency_buffer_min=offer_latency_buffer_min,
+            offer_latency_buffer_max=offer_latency_buffer_max,
         )
@@ -26,33 +26,62 @@ RUNNER_RPC_CALL = "runner:rpc"
 TASK_TYPE_PYTHON = "python"
 RUNNER_NAME = "Python Task Runner"
 DEFAULT_MAX_CONCURRENCY = 5  # tasks
+DEFAULT_PREFETCH_DEPTH = 0  # tasks accepted ahead of free slots, 0 to disable
 DEFAULT_MAX_PAYLOAD_SIZE = 1024 * 1024 * 1024  # 1 GiB
 DEFAULT_TASK_TIMEOUT = 60  # seconds
 DEFAULT_AUTO_SHUTDOWN_TIMEOUT = 0  # seconds
 DEFAULT_SHUTDOWN_TIMEOUT = 10  # seconds
-OFFER_INTERVAL = 0.25  # 250ms
-OFFER_VALIDITY = 5000  # ms
-OFFER_VALIDITY_MAX_JITTER = 500  # ms
-OFFER_VALIDITY_LATENCY_BUFFER = 0.1  # 100ms
+DEFAULT_OFFER_VALIDITY_MIN = 1000  # ms
+DEFAULT_OFFER_VALIDITY_MAX = 5000  # ms, also until offers have been accepted
+DEFAULT_OFFER_LATENCY_BUFFER_MIN = 100  # ms, also until the broker has been pinged
+DEFAULT_OFFER_LATENCY_BUFFER_MAX = 2000  # ms
+OFFER_VALIDITY_MAX_JITTER_RATIO = 0.1  # of the offer validity
+OFFER_VALIDITY_HEADROOM = 2.0  # times the p95 offer-to-accept latency
+OFFER_ACCEPT_LATENCY_SAMPLES = 100  # most recent accepted offers, for latency stats
+BROKER_RTT_SAMPLES = 100  # most recent keepalive pings, for round-trip time stats
+BROKER_RTT_POLL_INTERVAL = 5.0  # seconds, between reads of the connection latency
 MAX_VALIDATION_CACHE_SIZE = 500  # cached validation results
+MAX_CODE_CACHE_SIZE = 500  # cached compiled code objects
+DEFAULT_WORKER_POOL_MAX_TASKS = 100  # tasks per worker before recycling
+DEFAULT_WORKER_POOL_MAX_RSS = 512 * 1024 * 1024  # 512 MiB
+WORKER_POOL_RSS_REPORT_TIMEOUT = 1.0  # seconds
+WORKER_POOL_RETIRE_TIMEOUT = 1.0  # seconds
+WORKER_POOL_READY_TIMEOUT = 10.0  # seconds
+FORKSERVER_CHECK_INTERVAL = 5.0  # seconds
+SERDE_OFFLOAD_THRESHOLD = 1024 * 1024  # 1 MiB, larger messages go to the serde thread
+LOOP_STALL_CHECK_INTERVAL = 0.1  # seconds
+LOOP_STALL_WARNING_THRESHOLD = 0.5  # seconds
+PRINT_BATCH_INTERVAL = 0.1  # seconds, longest print() output waits to be forwarded
+PRINT_BATCH_MAX_CALLS = 50  # print() calls forwarded at once, without waiting
+DEFAULT_PER_ITEM_SHARD_THRESHOLD = 0  # items, 0 to disable sharding
+DEFAULT_ITEMS_SPILL_THRESHOLD = 1024 * 1024  # 1 MiB, 0 to pickle items unless pooled
+DEFAULT_RESULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB, larger results are sent fragmented
+DEFAULT_PRINT_MAX_BYTES = 1024 * 1024  # 1 MiB of print() output per task
+DEFAULT_PRINT_RECORDS_KEPT = 50  # print() calls kept at the start and at the end
+# spooling bounds memory only for fragmented messages, not ones sent in a single frame
+DEFAULT_MESSAGE_SPOOL_THRESHOLD = 64 * 1024 * 1024  # 64 MiB, 0 to disable spooling
 
 # Executor
 EXECUTOR_USER_OUTPUT_KEY = "__n8n_internal_user_output__"
+EXECUTOR_USER_FUNCTION_NAME = "_user_function"
 EXECUTOR_CIRCULAR_REFERENCE_KEY = "__n8n_internal_circular_ref__"
 EXECUTOR_ALL_ITEMS_FILENAME = "<all_items_task_execution>"
 EXECUTOR_PER_ITEM_FILENAME = "<per_item_task_execution>"
 EXECUTOR_FILENAMES = {EXECUTOR_ALL_ITEMS_FILENAME, EXECUTOR_PER_ITEM_FILENAME}
+EXECUTOR_MODULE = "src.task_executor"
+PRELOADED_MODULES_MODULE = "src.preloaded_modules"
 SIGTERM_EXIT_CODE = -15
 SIGKILL_EXIT_CODE = -9
-PIPE_MSG_PREFIX_LENGTH = 4  # bytes
-PIPE_MSG_MAX_SIZE = (
-    2 ** (PIPE_MSG_PREFIX_LENGTH * 8) - 1
-)  # bytes (~4 GiB with 4-byte prefix)
-
-# Pipe reader join timeout
-TYPICAL_PAYLOAD_RATIO = 0.1  # assume typical size is 10% of max payload
-PARSE_THROUGHPUT_BYTES_PER_SEC = 100_000_000  # 100 MB/s
-PIPE_READER_JOIN_TIMEOUT_SAFETY_BUFFER = 2.0  # seconds
+PROCESS_STOP_GRACE_PERIOD = 1.0  # seconds between SIGTERM and SIGKILL
+PIPE_MSG_KIND_PRINT = b"p"  # formatted args of one print() call, sent as it happens
+PIPE_MSG_KIND_FINAL = b"f"  # result or error, ends the task's messages
+PIPE_MSG_PREFIX_LENGTH = 8  # bytes, after the one-byte message kind
+PIPE_MSG_RESULT_SEPARATOR = b"\n"  # never occurs in compact JSON, ends the envelope
+RESULT_ENCODE_BATCH_SIZE = 1000  # items encoded at once, between result size checks
+PIPE_MSG_MEMFD_THRESHOLD = 1024 * 1024  # 1 MiB, larger results are sent in a memfd
+PIPE_READ_MAX_BYTES_PER_WAKEUP = 1024 * 1024  # 1 MiB, before serving other pipes
+MEMFD_NAME = "n8n-task-payload"
+PIPE_MSG_MAX_SIZE = 2 ** (PIPE_MSG_PREFIX_LENGTH * 8) - 1  # bytes
 
 # Broker
 DEFAULT_TASK_BROKER_URI = "http://127.0.0.1:5679"
@@ -66,6 +95,7 @@ DEFAULT_HEALTH_CHECK_SERVER_PORT = 5681
 ENV_TASK_BROKER_URI = "N8N_RUNNERS_TASK_BROKER_URI"
 ENV_GRANT_TOKEN = "N8N_RUNNERS_GRANT_TOKEN"
 ENV_MAX_CONCURRENCY = "N8N_RUNNERS_MAX_CONCURRENCY"
+ENV_PREFETCH_DEPTH = "N8N_RUNNERS_PREFETCH_DEPTH"
 ENV_MAX_PAYLOAD_SIZE = "N8N_RUNNERS_MAX_PAYLOAD"
 ENV_TASK_TIMEOUT = "N8N_RUNNERS_TASK_TIMEOUT"
 ENV_AUTO_SHUTDOWN_TIMEOUT = "N8N_RUNNERS_AUTO_SHUTDOWN_TIMEOUT"
@@ -78,6 +108,21 @@ ENV_HEALTH_CHECK_SERVER_HOST = "N8N_RUNNERS_HEALTH_CHECK_SERVER_HOST"
 ENV_HEALTH_CHECK_SERVER_PORT = "N8N_RUNNERS_HEALTH_CHECK_SERVER_PORT"
 ENV_LAUNCHER_LOG_LEVEL = "N8N_RUNNERS_LAUNCHER_LOG_LEVEL"
 ENV_BLOCK_RUNNER_ENV_ACCESS = "N8N_BLOCK_RUNNER_ENV_ACCESS"
+ENV_PRELOAD = "N8N_RUNNERS_PRELOAD"
+ENV_WORKER_POOL_ENABLED = "N8N_RUNNERS_WORKER_POOL_ENABLED"
+ENV_WORKER_POOL_MAX_TASKS = "N8N_RUNNERS_WORKER_POOL_MAX_TASKS"
+ENV_WORKER_POOL_MAX_RSS = "N8N_RUNNERS_WORKER_POOL_MAX_RSS"
+ENV_PER_ITEM_SHARD_THRESHOLD = "N8N_RUNNERS_PER_ITEM_SHARD_THRESHOLD"
+ENV_ITEMS_SPILL_THRESHOLD = "N8N_RUNNERS_ITEMS_SPILL_THRESHOLD"
+ENV_RESULT_CHUNK_SIZE = "N8N_RUNNERS_RESULT_CHUNK_SIZE"
+ENV_ITEMS_COMPACT_DECODE = "N8N_RUNNERS_ITEMS_COMPACT_DECODE"
+ENV_PRINT_MAX_BYTES = "N8N_RUNNERS_PRINT_MAX_BYTES"
+ENV_PRINT_RECORDS_KEPT = "N8N_RUNNERS_PRINT_RECORDS_KEPT"
+ENV_MESSAGE_SPOOL_THRESHOLD = "N8N_RUNNERS_MESSAGE_SPOOL_THRESHOLD"
+ENV_OFFER_VALIDITY_MIN = "N8N_RUNNERS_OFFER_VALIDITY_MIN"
+ENV_OFFER_VALIDITY_MAX = "N8N_RUNNERS_OFFER_VALIDITY_MAX"
+ENV_OFFER_LATENCY_BUFFER_MIN = "N8N_RUNNERS_OFFER_LATENCY_BUFFER_MIN"
+ENV_OFFER_LATENCY_BUFFER_MAX = "N8N_RUNNERS_OFFER_LATENCY_BUFFER_MAX"
 ENV_SENTRY_DSN = "N8N_SENTRY_DSN"
 ENV_N8N_VERSION = "N8N_VERSION"
 ENV_ENVIRONMENT = "ENVIRONMENT"
@@ -105,15 +150,20 @@ LOG_TASK_CANCEL_UNKNOWN = (
     "Received cancel for unknown task: {task_id}. Discarding message."
 )
 LOG_TASK_CANCEL_WAITING = "Cancelled task {task_id} (waiting for settings)"
+LOG_TASK_CANCEL_PREFETCHED = "Cancelled task {task_id} (prefetched)"
+LOG_TASK_PREFETCHED = "Received task {task_id}, prefetched until a slot is free"
 LOG_SENTRY_MISSING = "Sentry is enabled but sentry-sdk is not installed. Install with: uv sync --all-extras"
-LOG_PIPE_READER_TIMEOUT_TRIGGERED = (
-    "Pipe reader thread did not finish reading within {timeout}s. "
-    "Closing pipe to unblock. Task may fail if data was not fully read. "
-    "For large payloads, increase N8N_RUNNERS_MAX_PAYLOAD to scale timeout."
-)
+LOG_FORKSERVER_READY = "Forkserver ready in {duration}ms with {count} preloaded modules"
+LOG_FORKSERVER_RESTART = "Forkserver is not running, restarting..."
+LOG_PRELOAD_FAILED = "Failed to preload modules into forkserver: {modules}"
+LOG_LOOP_STALL = "Event loop stalled for {duration}ms"
+LOG_BROKER_RTT = "Broker round-trip time {rtt}ms, offering tasks for {validity}ms with a {buffer}ms latency buffer"
+LOG_SERDE_OFFLOADED = "Processed {size} message in the serde thread in {duration}ms"
 
 # RPC
 RPC_BROWSER_CONSOLE_LOG_METHOD = "logNodeOutput"
+# args to several `print()` calls in one call, if the broker advertises support
+RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD = "logNodeOutputBatch"
 
 # Rejection reasons
 TASK_REJECTED_REASON_OFFER_EXPIRED = (
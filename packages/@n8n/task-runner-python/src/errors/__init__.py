@@ -6,8 +6,10 @@ from .security_violation_error import SecurityViolationError
 from .task_cancelled_error import TaskCancelledError
 from .task_killed_error import TaskKilledError
 from .task_missing_error import TaskMissingError
+from .task_output_too_large_error import TaskOutputTooLargeError
 from .task_result_missing_error import TaskResultMissingError
 from .task_result_read_error import TaskResultReadError
+from .task_result_too_large_error import TaskResultTooLargeError
 from .task_subprocess_failed_error import TaskSubprocessFailedError
 from .task_runtime_error import TaskRuntimeError
 from .task_timeout_error import TaskTimeoutError
@@ -22,9 +24,11 @@ __all__ = [
     "TaskCancelledError",
     "TaskKilledError",
     "TaskMissingError",
+    "TaskOutputTooLargeError",
     "TaskSubprocessFailedError",
     "TaskResultMissingError",
     "TaskResultReadError",
+    "TaskResultTooLargeError",
     "TaskRuntimeError",
     "TaskTimeoutError",
     "WebsocketConnectionError",
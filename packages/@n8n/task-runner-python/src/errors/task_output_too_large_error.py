@@ -0,0 +1,11 @@
+class TaskOutputTooLargeError(Exception):
+    """Raised in the runner when a task subprocess sends more bytes through its
+    pipe than allowed, before they are read."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Task output exceeds the limit of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+        self.description = (
+            "Return fewer or smaller items, print less, "
+            "or increase N8N_RUNNERS_MAX_PAYLOAD."
+        )
@@ -0,0 +1,12 @@
+class TaskResultTooLargeError(Exception):
+    """Raised in the task subprocess when the result exceeds the max payload size,
+    before it is fully encoded."""
+
+    def __init__(self, max_size: int):
+        super().__init__(
+            f"Task result exceeds the max payload size of {max_size} bytes"
+        )
+        self.max_size = max_size
+        self.description = (
+            "Return fewer or smaller items, or increase N8N_RUNNERS_MAX_PAYLOAD."
+        )
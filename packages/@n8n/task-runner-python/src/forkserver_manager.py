@@ -0,0 +1,114 @@
+import logging
+import multiprocessing.forkserver
+import os
+import sys
+import time
+
+from src.constants import (
+    EXECUTOR_MODULE,
+    LOG_FORKSERVER_READY,
+    LOG_FORKSERVER_RESTART,
+    LOG_PRELOAD_FAILED,
+    PRELOADED_MODULES_MODULE,
+)
+from src.task_executor import MULTIPROCESSING_CONTEXT, PipeConnection
+
+logger = logging.getLogger(__name__)
+
+
+class ForkserverManager:
+    """Responsible for preparing the forkserver that task subprocesses are forked from.
+
+    The forkserver otherwise starts lazily on the first task. Warming it up
+    eagerly moves its launch and the import of preloaded modules, which every
+    task subprocess inherits copy-on-write, out of the first task's latency.
+    """
+
+    def __init__(self, preload_modules: set[str]):
+        self.preload_modules = sorted(preload_modules)
+        self.failed_modules: list[str] = []
+        self.warm_up_duration_ms: int | None = None
+
+    def configure(self) -> None:
+        """Set the modules to preload. Must be called before the forkserver starts.
+
+        The executor is imported first and `PRELOADED_MODULES_MODULE` last, to
+        record the modules that preloading added in between.
+        """
+
+        MULTIPROCESSING_CONTEXT.set_forkserver_preload(
+            [EXECUTOR_MODULE, *self.preload_modules, PRELOADED_MODULES_MODULE]
+        )
+
+    def warm_up(self) -> None:
+        """Start the forkserver and wait until it has imported the preloaded modules."""
+
+        start_time = time.perf_counter()
+
+        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
+        process = MULTIPROCESSING_CONTEXT.Process(
+            target=ForkserverManager._report_missing_modules,
+            args=(self.preload_modules, write_conn),
+        )
+
+        try:
+            process.start()
+            write_conn.close()
+            self.failed_modules = read_conn.recv()
+            process.join()
+        except (OSError, EOFError) as e:
+            logger.warning(f"Failed to warm up forkserver: {e}")
+            return
+        finally:
+            write_conn.close()
+            read_conn.close()
+
+        self.warm_up_duration_ms = int((time.perf_counter() - start_time) * 1000)
+
+        logger.info(
+            LOG_FORKSERVER_READY.format(
+                duration=self.warm_up_duration_ms,
+                count=len(self.preload_modules) - len(self.failed_modules),
+            )
+        )
+
+        if self.failed_modules:
+            logger.warning(
+                LOG_PRELOAD_FAILED.format(modules=", ".join(self.failed_modules))
+            )
+
+    def ensure_running(self) -> bool:
+        """Restart and warm up the forkserver if it has died. Returns whether it was restarted."""
+
+        if ForkserverManager.is_running():
+            return False
+
+        logger.warning(LOG_FORKSERVER_RESTART)
+        self.warm_up()
+
+        return True
+
+    @staticmethod
+    def is_running() -> bool:
+        # `multiprocessing` exposes no public liveness check for the forkserver
+        pid = multiprocessing.forkserver._forkserver._forkserver_pid
+
+        if pid is None:
+            return False
+
+        try:
+            # WNOWAIT leaves the exit status for `multiprocessing` to reap on restart
+            exited = os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+        except ChildProcessError:
+            return False
+
+        return exited is None
+
+    @staticmethod
+    def _report_missing_modules(modules: list[str], write_conn: PipeConnection):
+        """Runs in a forkserver child, so `sys.modules` reflects what the forkserver preloaded."""
+
+        try:
+            write_conn.send([module for module in modules if module not in sys.modules])
+        finally:
+            write_conn.close()
@@ -0,0 +1,220 @@
+import array
+import itertools
+import json
+from collections.abc import Callable
+from typing import Any
+
+# JSON encoding and decoding for pipe and websocket traffic. Encoding is
+# `json.dumps(value, default=str, ensure_ascii=False)`: unsupported values are
+# stringified and non-ASCII is kept. Decoding uses the fastest installed backend
+# that decodes like the stdlib. Input a backend rejects is decoded again with the
+# stdlib, so that its extensions, e.g. `NaN`, decode and errors are the stdlib's.
+#
+# orjson is not a backend: it encodes non-finite floats as `null` and enums by
+# value, and decodes integers beyond 64 bits as floats. The msgspec encoder
+# encodes sets, datetimes and dataclasses itself instead of stringifying them.
+
+type Decodable = str | bytes | bytearray | memoryview
+type Loads = Callable[[Decodable], Any]
+
+# longest string value that compact decoding shares between equal occurrences
+MAX_SHARED_STR_LENGTH = 64
+
+# checking for one JSON array without decoding it
+ARRAY_SCAN_CHUNK_SIZE = 256 * 1024  # bytes copied and scanned at once
+ARRAY_SCAN_PAIR_PASSES = 8  # of dropping empty brackets, before tracking depth
+_NON_STRUCTURAL_BYTES = bytes(b for b in range(256) if b not in b'[]{}"')
+_BRACKET_DEPTHS = bytes.maketrans(b"[]{}", b"\x01\xff\x01\xff")  # +1 and -1
+
+
+def _stdlib_loads(data: Decodable) -> Any:
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return json.loads(data)
+
+
+def _msgspec_loads() -> Loads:
+    import msgspec
+
+    decoder = msgspec.json.Decoder()
+
+    def loads(data: Decodable) -> Any:
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    return loads
+
+
+# in order of preference
+BACKENDS: dict[str, Callable[[], Loads]] = {
+    "msgspec": _msgspec_loads,
+    "stdlib": lambda: _stdlib_loads,
+}
+
+
+def load_backend(name: str) -> Loads:
+    """Raises ImportError if the backend is not installed."""
+
+    return BACKENDS[name]()
+
+
+def _select_backend() -> tuple[str, Loads]:
+    for name in BACKENDS:
+        try:
+            return name, load_backend(name)
+        except ImportError:
+            continue
+
+    raise AssertionError("stdlib backend is always available")
+
+
+backend_name, _loads = _select_backend()
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a value as single-line UTF-8 JSON."""
+
+    return json.dumps(value, default=str, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Decodable) -> Any:
+    """Decode JSON, raising ValueError if it is invalid."""
+
+    if _loads is _stdlib_loads:
+        return _stdlib_loads(data)
+
+    try:
+        return _loads(data)
+    except ValueError:
+        return _stdlib_loads(data)
+
+
+def loads_compact(data: Decodable) -> Any:
+    """Decode JSON like `loads`, but share equal short strings, for lists of many
+    similar objects. Keys are already shared by the decoder, this shares values
+    in objects and in arrays directly inside objects. Uses less memory, but
+    decodes slower, always with the stdlib."""
+
+    shared: dict[str, str] = {}
+    share = shared.setdefault
+
+    def share_values(pairs: list[tuple[str, Any]]) -> dict[str, Any]:
+        obj = {}
+        for key, value in pairs:
+            value_type = type(value)
+            if value_type is str:
+                if len(value) <= MAX_SHARED_STR_LENGTH:
+                    value = share(value, value)
+            elif value_type is list:
+                for i, element in enumerate(value):
+                    if type(element) is str and len(element) <= MAX_SHARED_STR_LENGTH:
+                        value[i] = share(element, element)
+            obj[key] = value
+        return obj
+
+    if isinstance(data, memoryview):
+        data = bytes(data)
+
+    return json.loads(data, object_pairs_hook=share_values)
+
+
+def is_array(data: memoryview) -> bool:
+    """Whether JSON-encoded `data` is one array, i.e. its first bracket closes at
+    its end, so that it can be spliced into a message or cut out of one without
+    decoding it. Brackets are matched at byte level, skipping those in strings;
+    the array's contents are not validated."""
+
+    scanner = ArrayScanner()
+    for offset in range(0, len(data), ARRAY_SCAN_CHUNK_SIZE):
+        scanner.feed(data[offset : offset + ARRAY_SCAN_CHUNK_SIZE])
+
+    return scanner.is_array()
+
+
+class ArrayScanner:
+    """Checks like `is_array` whether JSON-encoded data is one array, fed chunk by
+    chunk, so that the caller can do other work in between, e.g. serve the event
+    loop. Each chunk is scanned once, except for its last byte, held back as it may
+    end the array or be escaped by a backslash before it."""
+
+    def __init__(self):
+        self.is_started = False  # the opening bracket was fed
+        self.is_open = True  # the array has not closed before the end so far
+        self.in_string = False
+        self.depth = 0  # within the array
+        self.held_back = b""
+
+    def feed(self, data: memoryview | bytes) -> None:
+        if not self.is_open or not data:
+            return
+
+        if not self.is_started:
+            if data[0] != ord("["):
+                self.is_open = False
+                return
+            self.is_started = True
+            data = data[1:]
+
+        chunk = self.held_back + bytes(data)
+        held_back_length = ArrayScanner._get_held_back_length(chunk)
+        self.held_back = chunk[len(chunk) - held_back_length :]
+        self._scan(chunk[: len(chunk) - held_back_length])
+
+    def is_array(self) -> bool:
+        return (
+            self.is_started
+            and self.is_open
+            and not self.in_string
+            and self.depth == 0
+            and self.held_back == b"]"
+        )
+
+    @staticmethod
+    def _get_held_back_length(chunk: bytes) -> int:
+        """The last byte, with the backslash escaping it, if any."""
+
+        if not chunk:
+            return 0
+
+        split = len(chunk) - 1
+        run_start = split
+        while run_start > 0 and chunk[run_start - 1] == ord("\\"):
+            run_start -= 1
+
+        if (split - run_start) % 2:
+            split -= 1
+
+        return len(chunk) - split
+
+    def _scan(self, chunk: bytes) -> None:
+        if b"\\" in chunk:
+            # escaped backslashes, then escaped quotes, do not end strings
+            chunk = chunk.replace(b"\\\\", b"").replace(b'\\"', b"")
+
+        structure = chunk.translate(None, _NON_STRUCTURAL_BYTES)
+
+        if self.in_string:
+            structure = b'"' + structure
+
+        # adjacent quotes enclose no brackets, and the rest stay paired without them
+        parts = structure.replace(b'""', b"").split(b'"')
+        self.in_string = len(parts) % 2 == 0
+
+        brackets = b"".join(parts[::2])
+        for _ in range(ARRAY_SCAN_PAIR_PASSES):
+            reduced = brackets.replace(b"[]", b"").replace(b"{}", b"")
+            if len(reduced) == len(brackets):
+                break
+            brackets = reduced
+
+        if not brackets:
+            return
+
+        # within the array, brackets must balance without closing it
+        depths = array.array("b", brackets.translate(_BRACKET_DEPTHS))
+        if min(itertools.accumulate(depths, initial=self.depth)) < 0:
+            self.is_open = False
+
+        self.depth += sum(depths)
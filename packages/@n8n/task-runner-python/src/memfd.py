@@ -0,0 +1,84 @@
+import fcntl
+import mmap
+import os
+import socket
+
+from src.constants import MEMFD_NAME
+
+# Hand large payloads between the runner and task subprocesses in sealed memfds,
+# passed over the socket pair connecting them, instead of streaming or pickling them.
+
+
+def is_supported() -> bool:
+    return hasattr(os, "memfd_create")
+
+
+def create() -> int:
+    return os.memfd_create(MEMFD_NAME, os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+
+
+def write(memfd: int, data: bytes | bytearray | memoryview) -> None:
+    view = memoryview(data).cast("B")
+    total_written = 0
+    while total_written < len(view):
+        total_written += os.write(memfd, view[total_written:])
+
+
+def seal(memfd: int) -> None:
+    """Seal a memfd, so that a mapping of it cannot change or shrink."""
+
+    fcntl.fcntl(
+        memfd,
+        fcntl.F_ADD_SEALS,
+        fcntl.F_SEAL_SHRINK
+        | fcntl.F_SEAL_GROW
+        | fcntl.F_SEAL_WRITE
+        | fcntl.F_SEAL_SEAL,
+    )
+
+
+def create_sealed(*parts: bytes | bytearray | memoryview) -> int:
+    """Copy the parts, in order, into a new sealed memfd."""
+
+    memfd = create()
+
+    try:
+        for part in parts:
+            write(memfd, part)
+        seal(memfd)
+    except BaseException:
+        os.close(memfd)
+        raise
+
+    return memfd
+
+
+def send(sock_fd: int, memfd: int) -> None:
+    with socket.socket(fileno=os.dup(sock_fd)) as sock:
+        socket.send_fds(sock, [b"\0"], [memfd])
+
+
+def receive(sock_fd: int) -> int:
+    with socket.socket(fileno=os.dup(sock_fd)) as sock:
+        _, fds, _, _ = socket.recv_fds(sock, 1, 1)
+
+    if len(fds) != 1:
+        for fd in fds:
+            os.close(fd)
+        raise ValueError("Expected a memfd")
+
+    return fds[0]
+
+
+def map_readonly(memfd: int, size: int | None = None) -> mmap.mmap:
+    """Map a received memfd after checking that it is sealed and, if given, of the expected size."""
+
+    required_seals = fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_WRITE
+    if fcntl.fcntl(memfd, fcntl.F_GET_SEALS) & required_seals != required_seals:
+        raise ValueError("Memfd is not sealed")
+
+    actual_size = os.fstat(memfd).st_size
+    if actual_size <= 0 or (size is not None and actual_size != size):
+        raise ValueError("Memfd has unexpected size")
+
+    return mmap.mmap(memfd, actual_size, access=mmap.ACCESS_READ)
@@ -1,8 +1,10 @@
-import json
-from dataclasses import asdict
-from typing import cast
+from dataclasses import fields
+import mmap
+from collections.abc import Iterator
+from typing import cast, get_args
 
-from src.message_types.broker import NodeMode, TaskSettings
+from src import json_codec
+from src.message_types.broker import NodeMode, RawItems, TaskSettings
 from src.constants import (
     BROKER_INFO_REQUEST,
     BROKER_RUNNER_REGISTERED,
@@ -20,6 +22,7 @@ from src.message_types import (
     BrokerTaskSettings,
     BrokerTaskCancel,
     BrokerRpcResponse,
+    RunnerTaskDone,
 )
 
 
@@ -28,6 +31,12 @@ NODE_MODE_MAP = {
     "runOnceForEachItem": "per_item",
 }
 
+ITEMS_KEY = b'"items":'
+
+# The broker sends only a few short fields after the items array, so a longer
+# tail means the message is not laid out as expected and is decoded in full.
+MAX_ITEMS_TAIL_LENGTH = 64 * 1024
+
 
 def _get_node_mode(node_mode_str: str) -> NodeMode:
     if node_mode_str not in NODE_MODE_MAP:
@@ -43,6 +52,8 @@ def _parse_task_settings(d: dict) -> BrokerTaskSettings:
         code = settings_dict["code"]
         node_mode = _get_node_mode(settings_dict["nodeMode"])
         items = settings_dict["items"]
+        if not isinstance(items, RawItems):
+            items = json_codec.dumps(items)
 
         # optional
         continue_on_fail = settings_dict.get("continueOnFail", False)
@@ -68,6 +79,65 @@ def _parse_task_settings(d: dict) -> BrokerTaskSettings:
     )
 
 
+def _loads_keeping_items_raw(data: bytes | mmap.mmap) -> dict | None:
+    """Decode a task settings message except for its items, which are left as a
+    view into `data`. Returns None if the items cannot be located unambiguously.
+
+    The items array is located by replacing candidate spans with `null` and
+    decoding the rest of the message, which must then hold `null` for the items.
+    The span must also be one array, as a field after the items may end in `]`.
+    """
+
+    key_start = data.find(ITEMS_KEY)
+    if key_start == -1 or BROKER_TASK_SETTINGS.encode() not in data[:key_start]:
+        return None
+
+    items_start = key_start + len(ITEMS_KEY)
+    while data[items_start : items_start + 1].isspace():
+        items_start += 1
+
+    if data[items_start : items_start + 1] != b"[":
+        return None
+
+    head = data[:items_start] + b"null"
+    min_items_end = max(items_start, len(data) - MAX_ITEMS_TAIL_LENGTH)
+    items_end = len(data)
+
+    while (items_end := data.rfind(b"]", min_items_end, items_end)) != -1:
+        try:
+            message_dict = json_codec.loads(head + data[items_end + 1 :])
+        except ValueError:
+            continue
+
+        if not isinstance(message_dict, dict):
+            return None
+
+        settings_dict = message_dict.get("settings")
+
+        if (
+            message_dict.get("type") != BROKER_TASK_SETTINGS
+            or not isinstance(settings_dict, dict)
+            or "items" not in settings_dict
+            or settings_dict["items"] is not None
+        ):
+            return None
+
+        items = memoryview(data)[items_start : items_end + 1]
+
+        if not json_codec.is_array(items):
+            continue
+
+        settings_dict["items"] = items
+        return message_dict
+
+    return None
+
+
+def _snake_to_camel_case(snake_case_str: str) -> str:
+    parts = snake_case_str.split("_")
+    return parts[0] + "".join(word.capitalize() for word in parts[1:])
+
+
 def _parse_task_offer_accept(d: dict) -> BrokerTaskOfferAccept:
     try:
         task_id = d["taskId"]
@@ -88,6 +158,14 @@ def _parse_task_cancel(d: dict) -> BrokerTaskCancel:
     return BrokerTaskCancel(task_id=task_id, reason=reason)
 
 
+def _parse_runner_registered(d: dict) -> BrokerRunnerRegistered:
+    rpc_methods = d.get("rpcMethods", [])
+    if not isinstance(rpc_methods, list):
+        raise ValueError("Field 'rpcMethods' must be a list")
+
+    return BrokerRunnerRegistered(rpc_methods=rpc_methods)
+
+
 def _parse_rpc_response(d: dict) -> BrokerRpcResponse:
     try:
         call_id = d["callId"]
@@ -101,20 +179,39 @@ def _parse_rpc_response(d: dict) -> BrokerRpcResponse:
 
 MESSAGE_TYPE_MAP = {
     BROKER_INFO_REQUEST: lambda _: BrokerInfoRequest(),
-    BROKER_RUNNER_REGISTERED: lambda _: BrokerRunnerRegistered(),
+    BROKER_RUNNER_REGISTERED: _parse_runner_registered,
     BROKER_TASK_OFFER_ACCEPT: _parse_task_offer_accept,
     BROKER_TASK_SETTINGS: _parse_task_settings,
     BROKER_TASK_CANCEL: _parse_task_cancel,
     BROKER_RPC_RESPONSE: _parse_rpc_response,
 }
 
+# (field name, camelCase key) of every runner message type
+FIELD_TABLES = {
+    message_type: tuple(
+        (field.name, _snake_to_camel_case(field.name)) for field in fields(message_type)
+    )
+    for message_type in get_args(RunnerMessage)
+}
+
 
 class MessageSerde:
     """Responsible for deserializing incoming messages and serializing outgoing messages."""
 
     @staticmethod
-    def deserialize_broker_message(data: str) -> BrokerMessage:
-        message_dict = json.loads(data)
+    def deserialize_broker_message(data: str | bytes | mmap.mmap) -> BrokerMessage:
+        """`data` may be a mapping of a spooled message, which items are left in."""
+
+        message_dict = None
+
+        if not isinstance(data, str):
+            message_dict = _loads_keeping_items_raw(data)
+
+        if message_dict is None:
+            message_dict = json_codec.loads(
+                memoryview(data) if isinstance(data, mmap.mmap) else data
+            )
+
         message_type = message_dict.get("type")
 
         if message_type not in MESSAGE_TYPE_MAP:
@@ -123,14 +220,41 @@ class MessageSerde:
         return MESSAGE_TYPE_MAP[message_type](message_dict)
 
     @staticmethod
-    def serialize_runner_message(message: RunnerMessage) -> str:
-        data = asdict(message)
+    def serialize_runner_message(message: RunnerMessage) -> bytes:
+        if isinstance(message, RunnerTaskDone):
+            return MessageSerde._serialize_task_done(message)
+
+        # shallow, so that payload fields are encoded in place rather than copied
         camel_case_data = {
-            MessageSerde._snake_to_camel_case(k): v for k, v in data.items()
+            key: getattr(message, name) for name, key in FIELD_TABLES[type(message)]
         }
-        return json.dumps(camel_case_data)
+        return json_codec.dumps(camel_case_data)
+
+    @staticmethod
+    def serialize_task_done_in_fragments(
+        message: RunnerTaskDone, fragment_size: int
+    ) -> Iterator[bytes | memoryview]:
+        """Like `serialize_runner_message`, but as fragments of at most `fragment_size`
+        bytes of the result, which are views into it rather than copies."""
+
+        head, result, tail = MessageSerde._get_task_done_parts(message)
+        result_view = memoryview(result).cast("B")
+
+        yield head
+
+        for offset in range(0, result_view.nbytes, fragment_size):
+            yield result_view[offset : offset + fragment_size]
+
+        yield tail
+
+    @staticmethod
+    def _serialize_task_done(message: RunnerTaskDone) -> bytes:
+        """Splice the JSON-encoded result from the task subprocess into the
+        message as is, instead of decoding and re-encoding it."""
+
+        return b"".join(MessageSerde._get_task_done_parts(message))
 
     @staticmethod
-    def _snake_to_camel_case(snake_case_str: str) -> str:
-        parts = snake_case_str.split("_")
-        return parts[0] + "".join(word.capitalize() for word in parts[1:])
+    def _get_task_done_parts(message: RunnerTaskDone) -> tuple[bytes, RawItems, bytes]:
+        head = json_codec.dumps({"type": message.type, "taskId": message.task_id})
+        return head[:-1] + b', "data": {"result": ', message.result, b"}}"
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Literal, Any
 
 from src.constants import (
@@ -18,6 +18,8 @@ class BrokerInfoRequest:
 
 @dataclass
 class BrokerRunnerRegistered:
+    # optional RPC methods the broker supports, absent from older brokers
+    rpc_methods: list[str] = field(default_factory=list)
     type: Literal["broker:runnerregistered"] = BROKER_RUNNER_REGISTERED
 
 
@@ -31,6 +33,7 @@ class BrokerTaskOfferAccept:
 NodeMode = Literal["all_items", "per_item"]
 
 Items = list[dict[str, Any]]  # INodeExecutionData[]
+RawItems = bytes | bytearray | memoryview  # JSON-encoded `Items`, passed through as is
 
 
 @dataclass
@@ -38,11 +41,13 @@ class TaskSettings:
     code: str
     node_mode: NodeMode
     continue_on_fail: bool
-    items: Items
+    items: RawItems  # decoded only in the task subprocess
     workflow_name: str
     workflow_id: str
     node_name: str
     node_id: str
+    # sealed memfd holding the whole message, if it was too large to receive into memory
+    spool_memfd: int | None = None
 
 
 @dataclass
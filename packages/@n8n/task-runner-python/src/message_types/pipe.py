@@ -1,8 +1,10 @@
+from collections.abc import Callable
 from typing import Any, TypedDict
 
-from src.message_types.broker import Items
+from src.message_types.broker import RawItems
 
 PrintArgs = list[list[Any]]  # Args to all `print()` calls in a Python code task
+PrintCallback = Callable[[list[Any]], None]  # receives the args to one `print()` call
 
 
 class TaskErrorInfo(TypedDict):
@@ -13,7 +15,7 @@ class TaskErrorInfo(TypedDict):
 
 
 class PipeResultMessage(TypedDict):
-    result: Items
+    result: RawItems
     print_args: PrintArgs
 
 
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Literal, Any
 from ..constants import RUNNER_RPC_CALL
+from src.message_types.pipe import RawItems
 
 from src.constants import (
     RUNNER_INFO,
@@ -12,14 +13,14 @@ from src.constants import (
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerInfo:
     name: str
     types: list[str]
     type: Literal["runner:info"] = RUNNER_INFO
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskOffer:
     offer_id: str
     task_type: str
@@ -27,34 +28,34 @@ class RunnerTaskOffer:
     type: Literal["runner:taskoffer"] = RUNNER_TASK_OFFER
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskAccepted:
     task_id: str
     type: Literal["runner:taskaccepted"] = RUNNER_TASK_ACCEPTED
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskRejected:
     task_id: str
     reason: str
     type: Literal["runner:taskrejected"] = RUNNER_TASK_REJECTED
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskDone:
     task_id: str
-    data: dict[str, Any]
+    result: RawItems  # sent as `data.result`
     type: Literal["runner:taskdone"] = RUNNER_TASK_DONE
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerTaskError:
     task_id: str
     error: dict[str, Any]
     type: Literal["runner:taskerror"] = RUNNER_TASK_ERROR
 
 
-@dataclass
+@dataclass(slots=True)
 class RunnerRpcCall:
     call_id: str
     task_id: str
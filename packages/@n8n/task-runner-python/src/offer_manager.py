@@ -0,0 +1,239 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from src.config.offer_config import OfferConfig
+from src.constants import (
+    BROKER_RTT_SAMPLES,
+    OFFER_ACCEPT_LATENCY_SAMPLES,
+    OFFER_VALIDITY_HEADROOM,
+    OFFER_VALIDITY_MAX_JITTER_RATIO,
+    TASK_TYPE_PYTHON,
+)
+from src.message_types import RunnerTaskOffer
+from src.nanoid import nanoid
+
+type SendOffer = Callable[[RunnerTaskOffer], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+def get_percentile(samples: deque[float], percentile: float) -> float | None:
+    """Sample at `percentile` (0-100), or None if there are no samples."""
+
+    if not samples:
+        return None
+
+    ordered = sorted(samples)
+    index = round(percentile / 100 * (len(ordered) - 1))
+
+    return ordered[index]
+
+
+def clamp(value: int, min_value: int, max_value: int) -> int:
+    return max(min_value, min(value, max_value))
+
+
+@dataclass
+class TaskOffer:
+    offer_id: str
+    sent_at: float  # `time.monotonic()` timestamps
+    valid_until: float
+
+    @property
+    def has_expired(self) -> bool:
+        return time.monotonic() > self.valid_until
+
+
+class OfferManager:
+    """Keeps as many task offers open with the broker as `get_wanted_offers` asks for.
+
+    Open offers are kept in a min-heap by expiry, so the manager sleeps until the
+    next offer expires, or until `replenish` is called because a slot was freed,
+    e.g. by a task finishing, being cancelled or being rejected.
+
+    Tracks the latency from sending an offer to its acceptance, over the last
+    `OFFER_ACCEPT_LATENCY_SAMPLES` accepted offers, and how many offers expired.
+
+    Offer validity and the latency buffer adapt to the broker, within the bounds
+    in `OfferConfig`. Offers are valid for `OFFER_VALIDITY_HEADROOM` times the p95
+    offer-to-accept latency, so they are renewed sooner where they are accepted
+    quickly. The latency buffer, for an accept sent just before the broker's end
+    of validity to arrive, is the p99 broker round-trip time reported through
+    `add_broker_rtt`.
+    """
+
+    def __init__(
+        self,
+        get_wanted_offers: Callable[[], int],
+        send_offer: SendOffer,
+        config: OfferConfig,
+    ):
+        self.get_wanted_offers = get_wanted_offers
+        self.send_offer = send_offer
+        self.config = config
+        self.open_offers: dict[str, TaskOffer] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._should_replenish = asyncio.Event()
+        self._offers_coroutine: asyncio.Task | None = None
+        self.accept_latencies: deque[float] = deque(
+            maxlen=OFFER_ACCEPT_LATENCY_SAMPLES
+        )  # seconds
+        self.broker_rtts: deque[float] = deque(maxlen=BROKER_RTT_SAMPLES)  # seconds
+        self.accepted_count = 0
+        self.expired_count = 0
+        self.offer_validity_ms = config.validity_max
+        self.latency_buffer_ms = config.latency_buffer_min
+
+    @property
+    def expired_ratio(self) -> float:
+        """Share of offers that expired, of those accepted or expired."""
+
+        resolved_count = self.accepted_count + self.expired_count
+        return self.expired_count / resolved_count if resolved_count else 0.0
+
+    def start(self) -> None:
+        self._should_replenish.set()
+        self._offers_coroutine = asyncio.create_task(self._send_offers_loop())
+
+    async def stop(self) -> None:
+        """Stop sending offers and forget open ones, which the broker no longer holds."""
+
+        if self._offers_coroutine and not self._offers_coroutine.done():
+            self._offers_coroutine.cancel()
+            try:
+                await self._offers_coroutine
+            except asyncio.CancelledError:
+                pass
+
+        self._offers_coroutine = None
+        self.open_offers.clear()
+        self._expiry_heap.clear()
+
+    def replenish(self) -> None:
+        """Send offers for freed slots now, rather than when the next offer expires."""
+
+        self._should_replenish.set()
+
+    def accept(self, offer_id: str) -> bool:
+        """Take an open offer the broker accepted, returning False if it is unknown
+        or has expired."""
+
+        offer = self.open_offers.pop(offer_id, None)
+
+        if offer is None:
+            return False
+
+        if offer.has_expired:
+            self.expired_count += 1
+            return False
+
+        self.accepted_count += 1
+        self.accept_latencies.append(time.monotonic() - offer.sent_at)
+        self._adapt_offer_validity()
+
+        return True
+
+    def add_broker_rtt(self, rtt: float) -> None:
+        """Record a measured broker round-trip time in seconds."""
+
+        self.broker_rtts.append(rtt)
+        self._adapt_latency_buffer()
+
+    def get_accept_latency(self, percentile: float) -> float | None:
+        """Offer-to-accept latency in seconds at `percentile` (0-100) of recent
+        accepted offers, or None if none were accepted."""
+
+        return get_percentile(self.accept_latencies, percentile)
+
+    def get_broker_rtt(self, percentile: float) -> float | None:
+        """Broker round-trip time in seconds at `percentile` (0-100) of recent
+        measurements, or None if none were measured."""
+
+        return get_percentile(self.broker_rtts, percentile)
+
+    def _adapt_offer_validity(self) -> None:
+        latency = self.get_accept_latency(95)
+        assert latency is not None  # called on accept
+
+        self.offer_validity_ms = clamp(
+            int(latency * OFFER_VALIDITY_HEADROOM * 1000),
+            self.config.validity_min,
+            self.config.validity_max,
+        )
+
+    def _adapt_latency_buffer(self) -> None:
+        rtt = self.get_broker_rtt(99)
+        assert rtt is not None  # called on measurement
+
+        self.latency_buffer_ms = clamp(
+            int(rtt * 1000),
+            self.config.latency_buffer_min,
+            self.config.latency_buffer_max,
+        )
+
+    async def _send_offers_loop(self) -> None:
+        while True:
+            try:
+                await self._wait_until_due()
+                self._expire_offers()
+                await self._send_offers()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error sending offers: {e}", exc_info=True)
+
+    async def _wait_until_due(self) -> None:
+        timeout = None
+        if self._expiry_heap:
+            timeout = max(0.0, self._expiry_heap[0][0] - time.monotonic())
+
+        try:
+            await asyncio.wait_for(self._should_replenish.wait(), timeout)
+        except TimeoutError:
+            pass
+
+        self._should_replenish.clear()
+
+    def _expire_offers(self) -> None:
+        now = time.monotonic()
+
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            _, offer_id = heapq.heappop(self._expiry_heap)
+
+            # accepted offers are left in the heap until they would have expired
+            if self.open_offers.pop(offer_id, None) is not None:
+                self.expired_count += 1
+
+    async def _send_offers(self) -> None:
+        offers_to_send = self.get_wanted_offers() - len(self.open_offers)
+
+        if offers_to_send <= 0:
+            return
+
+        messages = []
+        max_jitter_ms = int(self.offer_validity_ms * OFFER_VALIDITY_MAX_JITTER_RATIO)
+
+        for _ in range(offers_to_send):
+            offer_id = nanoid()
+            valid_for_ms = self.offer_validity_ms + random.randint(0, max_jitter_ms)
+            sent_at = time.monotonic()
+            valid_until = sent_at + (valid_for_ms + self.latency_buffer_ms) / 1000
+
+            self.open_offers[offer_id] = TaskOffer(offer_id, sent_at, valid_until)
+            heapq.heappush(self._expiry_heap, (valid_until, offer_id))
+
+            messages.append(
+                RunnerTaskOffer(
+                    offer_id=offer_id,
+                    task_type=TASK_TYPE_PYTHON,
+                    valid_for=valid_for_ms,
+                )
+            )
+
+        await asyncio.gather(*(self.send_offer(message) for message in messages))
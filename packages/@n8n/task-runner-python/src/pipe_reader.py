@@ -1,66 +1,280 @@
-import json
+import asyncio
 import os
-import threading
+import time
+from dataclasses import dataclass, field
 from typing import cast
 
-from multiprocessing.connection import Connection
-
 from src.errors import (
     InvalidPipeMsgContentError,
     InvalidPipeMsgLengthError,
+    TaskOutputTooLargeError,
+)
+from src import json_codec, memfd as memfd_utils
+from src.message_types.pipe import PipeMessage, PrintArgs, PrintCallback
+from src.constants import (
+    PIPE_MSG_KIND_FINAL,
+    PIPE_MSG_KIND_PRINT,
+    PIPE_MSG_PREFIX_LENGTH,
+    PIPE_MSG_RESULT_SEPARATOR,
+    PIPE_READ_MAX_BYTES_PER_WAKEUP,
 )
-from src.message_types.pipe import PipeMessage
-from src.constants import PIPE_MSG_PREFIX_LENGTH
 
-type PipeConnection = Connection
+PIPE_MSG_HEADER_LENGTH = 1 + PIPE_MSG_PREFIX_LENGTH
+
+
+@dataclass
+class PipeRead:
+    """State of reading one task's messages from its pipe."""
+
+    fd: int
+    on_print: PrintCallback | None
+    done: asyncio.Future[tuple[PipeMessage, int]]
+    header: bytearray = field(default_factory=lambda: bytearray(PIPE_MSG_HEADER_LENGTH))
+    kind: bytes = b""
+    payload: bytearray | None = None  # allocated once the header is read
+    offset: int = 0  # into the header, or into the payload if allocated
+    streamed_print_args: PrintArgs = field(default_factory=list)
+    envelope: dict | None = None  # of a final message with its result in a memfd
+    result_memfd_size: int = 0
+    message_size: int = 0  # of the final message, in bytes
+    bytes_read: int = 0  # of all messages, as announced by their length prefixes
+    message_started_at: float | None = None
+    transfer_seconds: float = 0.0
+
+
+class PipeReader:
+    """Reads the messages of all running tasks from their pipes on the event loop.
+
+    While a task runs, its pipe is registered with the loop's selector, i.e. epoll
+    on Linux, and its messages are assembled as bytes arrive. Each message is read
+    into a buffer allocated once from its length prefix, and a task's read completes
+    once its final message has arrived.
+
+    `max_bytes_per_task` limits the bytes a task may send, checked against each
+    message's length prefix before the message is read. Bytes read and the time
+    spent transferring them are totalled over completed reads, for throughput.
+    """
+
+    def __init__(self, max_bytes_per_task: int | None = None):
+        self.max_bytes_per_task = max_bytes_per_task
+        self.bytes_read = 0
+        self.transfer_seconds = 0.0
 
+    @property
+    def throughput(self) -> float:
+        """Bytes per second while transferring messages."""
 
-class PipeReader(threading.Thread):
-    """Background thread that reads result from pipe."""
+        if not self.transfer_seconds:
+            return 0.0
 
-    def __init__(self, read_fd: int, read_conn: PipeConnection):
-        super().__init__()
-        self.read_fd = read_fd
-        self.read_conn = read_conn
-        self.pipe_message: PipeMessage | None = None
-        self.message_size: int | None = None  # bytes
-        self.error: Exception | None = None
+        return self.bytes_read / self.transfer_seconds
+
+    async def read_message(
+        self,
+        fd: int,
+        on_print: PrintCallback | None = None,
+    ) -> tuple[PipeMessage, int]:
+        """Read a task's messages from the pipe up to its final message, returning
+        that with its size in bytes.
+
+        Each message is a one-byte kind and a length prefix. Print messages carry
+        the args to one `print()` call and are passed to `on_print` as they arrive,
+        or else prepended to the final message's `print_args`.
+
+        A result message is a JSON envelope, a separator and the JSON-encoded result.
+        Only the envelope is decoded, the result is returned as a view over the raw bytes.
+        Large results instead follow the envelope as a memfd, which is mapped read-only.
+
+        `fd` must be non-blocking. Callers bound the read with e.g. `asyncio.timeout`.
+        """
+
+        loop = asyncio.get_running_loop()
+        pipe_read = PipeRead(fd=fd, on_print=on_print, done=loop.create_future())
+
+        loop.add_reader(fd, self._on_readable, pipe_read)
 
-    def run(self):
         try:
-            length_bytes = PipeReader._read_exact_bytes(
-                self.read_fd, PIPE_MSG_PREFIX_LENGTH
-            )
-            length_int = int.from_bytes(length_bytes, "big")
-            if length_int <= 0:
-                raise InvalidPipeMsgLengthError(length_int)
-            self.message_size = length_int
-            data = PipeReader._read_exact_bytes(self.read_fd, length_int)
-            parsed_msg = json.loads(data.decode("utf-8"))
-            self.pipe_message = self._validate_pipe_message(parsed_msg)
-        except Exception as e:
-            self.error = e
+            message = await pipe_read.done
         finally:
-            self.read_conn.close()
+            loop.remove_reader(fd)
 
-    @staticmethod
-    def _read_exact_bytes(fd: int, n: int) -> bytes:
-        """Read exactly n bytes from file descriptor.
+        self.bytes_read += pipe_read.bytes_read
+        self.transfer_seconds += pipe_read.transfer_seconds
 
-        Uses os.read() instead of Connection.recv() because recv() pickles.
-        Preallocates bytearray to avoid repeated reallocation.
+        pipe_message, _ = message
+        if "result" in pipe_message and not await self._is_json_array(
+            pipe_message["result"]
+        ):
+            raise InvalidPipeMsgContentError("'result' must be a list")
+
+        return message
+
+    def _on_readable(self, pipe_read: PipeRead) -> None:
+        if pipe_read.done.done():
+            return
+
+        try:
+            message = self._read_available(pipe_read)
+        except Exception as e:
+            pipe_read.done.set_exception(e)
+            return
+
+        if message is not None:
+            pipe_read.done.set_result(message)
+
+    def _read_available(self, pipe_read: PipeRead) -> tuple[PipeMessage, int] | None:
+        """Read what the pipe holds, returning the final message once it is complete.
+
+        Reads at most `PIPE_READ_MAX_BYTES_PER_WAKEUP`, so that other pipes are
+        served in between, and never past the current message, so that a memfd
+        passed after it is not discarded.
         """
-        result = bytearray(n)
-        offset = 0
-        while offset < n:
-            chunk = os.read(fd, n - offset)
-            if not chunk:
+
+        bytes_read = 0
+
+        while bytes_read < PIPE_READ_MAX_BYTES_PER_WAKEUP:
+            if pipe_read.envelope is not None:
+                return self._receive_result_memfd(pipe_read)
+
+            buffer = (
+                pipe_read.header if pipe_read.payload is None else pipe_read.payload
+            )
+
+            try:
+                # into the buffer, rather than into a new chunk to copy over
+                n = os.readv(pipe_read.fd, [memoryview(buffer)[pipe_read.offset :]])
+            except BlockingIOError:
+                return None
+
+            if n == 0:
                 raise EOFError("Pipe closed before reading all data")
-            result[offset : offset + len(chunk)] = chunk
-            offset += len(chunk)
-        return bytes(result)
 
-    def _validate_pipe_message(self, msg) -> PipeMessage:
+            if pipe_read.message_started_at is None:
+                pipe_read.message_started_at = time.monotonic()
+
+            pipe_read.offset += n
+            bytes_read += n
+
+            if pipe_read.offset < len(buffer):
+                continue
+
+            pipe_read.offset = 0
+
+            if pipe_read.payload is None:
+                self._start_message(pipe_read)
+            elif (message := self._finish_message(pipe_read)) is not None:
+                return message
+
+        return None
+
+    def _start_message(self, pipe_read: PipeRead) -> None:
+        pipe_read.kind = bytes(pipe_read.header[:1])
+        length = int.from_bytes(pipe_read.header[1:], "big")
+
+        if length <= 0:
+            raise InvalidPipeMsgLengthError(length)
+
+        self._count_bytes(pipe_read, PIPE_MSG_HEADER_LENGTH + length)
+        pipe_read.payload = bytearray(length)
+
+    def _finish_message(self, pipe_read: PipeRead) -> tuple[PipeMessage, int] | None:
+        data = pipe_read.payload
+        assert data is not None and pipe_read.message_started_at is not None
+        pipe_read.payload = None
+        pipe_read.transfer_seconds += time.monotonic() - pipe_read.message_started_at
+        pipe_read.message_started_at = None
+
+        if pipe_read.kind == PIPE_MSG_KIND_FINAL:
+            pipe_read.message_size = len(data)
+            return self._parse_final_message(pipe_read, data)
+
+        if pipe_read.kind != PIPE_MSG_KIND_PRINT:
+            raise InvalidPipeMsgContentError(f"Unknown message kind {pipe_read.kind!r}")
+
+        print_args_per_call = json_codec.loads(data)
+        if not isinstance(print_args_per_call, list):
+            raise InvalidPipeMsgContentError("Print message must be a list")
+
+        if pipe_read.on_print is None:
+            pipe_read.streamed_print_args.append(print_args_per_call)
+        else:
+            pipe_read.on_print(print_args_per_call)
+
+        return None
+
+    def _parse_final_message(
+        self, pipe_read: PipeRead, data: bytearray
+    ) -> tuple[PipeMessage, int] | None:
+        envelope_end = data.find(PIPE_MSG_RESULT_SEPARATOR)
+
+        if envelope_end != -1:
+            parsed_msg = json_codec.loads(data[:envelope_end])
+            if isinstance(parsed_msg, dict):
+                parsed_msg["result"] = memoryview(data)[envelope_end + 1 :]
+            return PipeReader._complete(pipe_read, parsed_msg)
+
+        parsed_msg = json_codec.loads(data)
+
+        if not isinstance(parsed_msg, dict) or "result_memfd_size" not in parsed_msg:
+            return PipeReader._complete(pipe_read, parsed_msg)
+
+        size = parsed_msg.pop("result_memfd_size")
+        if not isinstance(size, int):
+            raise InvalidPipeMsgContentError("'result_memfd_size' must be an int")
+
+        self._count_bytes(pipe_read, size)
+        pipe_read.envelope = parsed_msg
+        pipe_read.result_memfd_size = size
+        pipe_read.message_size += size
+
+        return self._receive_result_memfd(pipe_read)
+
+    def _receive_result_memfd(
+        self, pipe_read: PipeRead
+    ) -> tuple[PipeMessage, int] | None:
+        try:
+            memfd = memfd_utils.receive(pipe_read.fd)
+        except BlockingIOError:
+            return None
+        except ValueError as e:
+            raise InvalidPipeMsgContentError(str(e))
+
+        try:
+            mapping = memfd_utils.map_readonly(memfd, pipe_read.result_memfd_size)
+        except ValueError as e:
+            raise InvalidPipeMsgContentError(str(e))
+        finally:
+            os.close(memfd)
+
+        envelope = pipe_read.envelope
+        assert envelope is not None
+        pipe_read.envelope = None
+        envelope["result"] = memoryview(mapping)
+
+        return PipeReader._complete(pipe_read, envelope)
+
+    def _count_bytes(self, pipe_read: PipeRead, n: int) -> None:
+        pipe_read.bytes_read += n
+
+        if (
+            self.max_bytes_per_task is not None
+            and pipe_read.bytes_read > self.max_bytes_per_task
+        ):
+            raise TaskOutputTooLargeError(self.max_bytes_per_task)
+
+    @staticmethod
+    def _complete(pipe_read: PipeRead, parsed_msg) -> tuple[PipeMessage, int]:
+        pipe_message = PipeReader._validate_pipe_message(parsed_msg)
+
+        if pipe_read.streamed_print_args:
+            pipe_message["print_args"] = (
+                pipe_read.streamed_print_args + pipe_message["print_args"]
+            )
+
+        return pipe_message, pipe_read.message_size
+
+    @staticmethod
+    def _validate_pipe_message(msg) -> PipeMessage:
         if not isinstance(msg, dict):
             raise InvalidPipeMsgContentError(f"Expected dict, got {type(msg).__name__}")
 
@@ -79,10 +293,25 @@ class PipeReader(threading.Thread):
         if has_result and has_error:
             raise InvalidPipeMsgContentError("Msg has both 'result' and 'error' keys")
 
-        if has_result and not isinstance(msg["result"], list):
-            raise InvalidPipeMsgContentError("'result' must be a list")
-
         if has_error and not isinstance(msg["error"], dict):
             raise InvalidPipeMsgContentError("'error' must be a dict")
 
         return cast(PipeMessage, msg)
+
+    @staticmethod
+    async def _is_json_array(raw) -> bool:
+        """Whether the result, passed through undecoded to be spliced into
+        `runner:taskdone`, is one JSON array. Checked in chunks with the event loop
+        served in between, as a large result takes seconds to scan."""
+
+        if not isinstance(raw, memoryview):
+            return False
+
+        scanner = json_codec.ArrayScanner()
+        chunk_size = json_codec.ARRAY_SCAN_CHUNK_SIZE
+
+        for offset in range(0, len(raw), chunk_size):
+            scanner.feed(raw[offset : offset + chunk_size])
+            await asyncio.sleep(0)
+
+        return scanner.is_array()
@@ -0,0 +1,10 @@
+import sys
+
+from src.task_executor import MODULES_BEFORE_PRELOAD
+
+# Imported by the forkserver after the modules to preload, to record which modules
+# preloading added, including dependencies of preloaded packages. Task subprocesses
+# keep these when sanitizing `sys.modules`, so that a lazy import of a dependency
+# finds the module the preloaded package already holds, rather than a second copy.
+
+PRELOADED_MODULES = frozenset(sys.modules) - MODULES_BEFORE_PRELOAD
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from src.constants import PRINT_BATCH_INTERVAL, PRINT_BATCH_MAX_CALLS
+from src.message_types.pipe import PrintArgs
+
+type SendBatch = Callable[[PrintArgs], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class PrintForwarder:
+    """Forwards a task's `print()` output while the task runs, in batches of
+    calls collected for up to `PRINT_BATCH_INTERVAL` seconds or until
+    `PRINT_BATCH_MAX_CALLS` calls are pending.
+
+    Must be created and used on the event loop thread.
+    """
+
+    def __init__(self, send_batch: SendBatch):
+        self.send_batch = send_batch
+        self._pending: PrintArgs = []
+        self._has_pending = asyncio.Event()
+        self._is_full = asyncio.Event()
+        self._is_closed = False
+        self._forward_coroutine = asyncio.create_task(self._forward_loop())
+
+    def add(self, print_args_per_call: list[Any]) -> None:
+        self._pending.append(print_args_per_call)
+        self._has_pending.set()
+        if len(self._pending) >= PRINT_BATCH_MAX_CALLS:
+            self._is_full.set()
+
+    async def close(self) -> None:
+        """Stop forwarding, after sending all pending output."""
+
+        self._is_closed = True
+        self._has_pending.set()
+        self._is_full.set()
+        await self._forward_coroutine
+
+    async def _forward_loop(self) -> None:
+        while not self._is_closed or self._pending:
+            await self._has_pending.wait()
+
+            if not self._is_closed:
+                try:
+                    await asyncio.wait_for(self._is_full.wait(), PRINT_BATCH_INTERVAL)
+                except TimeoutError:
+                    pass
+
+            await self._flush()
+
+    async def _flush(self) -> None:
+        batch = self._pending
+        self._pending = []
+        self._has_pending.clear()
+        self._is_full.clear()
+
+        if not batch:
+            return
+
+        try:
+            await self.send_batch(batch)
+        except Exception as e:
+            logger.warning(f"Failed to forward print output: {e}", exc_info=True)
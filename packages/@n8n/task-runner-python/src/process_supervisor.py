@@ -0,0 +1,70 @@
+import asyncio
+from multiprocessing.context import ForkServerProcess
+
+from src.constants import PROCESS_STOP_GRACE_PERIOD
+
+
+class ProcessSupervisor:
+    """Waits for subprocesses and their pipes on the event loop, so that running
+    tasks hold no threads, and timeouts are loop timers.
+
+    Subprocesses are children of the forkserver rather than of the runner, so
+    their exit is awaited on the sentinel the forkserver reports it through.
+    """
+
+    @staticmethod
+    async def wait_readable(fd: int, timeout: float | None = None) -> bool:
+        """Wait until `fd` is readable, returning False on timeout."""
+
+        loop = asyncio.get_running_loop()
+        is_readable = loop.create_future()
+
+        def on_readable():
+            if not is_readable.done():
+                is_readable.set_result(None)
+
+        loop.add_reader(fd, on_readable)
+
+        try:
+            async with asyncio.timeout(timeout):
+                await is_readable
+            return True
+        except TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+    @staticmethod
+    async def wait_for_exit(
+        process: ForkServerProcess, timeout: float | None = None
+    ) -> bool:
+        """Wait for a started subprocess to exit, returning False on timeout."""
+
+        if not process.is_alive():
+            return True
+
+        if not await ProcessSupervisor.wait_readable(process.sentinel, timeout):
+            return False
+
+        process.join()  # collects the exit code, which has arrived
+
+        return True
+
+    @staticmethod
+    async def stop_process(process: ForkServerProcess | None) -> None:
+        """Stop a running subprocess, gracefully else force-killing."""
+
+        if process is None or not process.is_alive():
+            return
+
+        try:
+            process.terminate()
+
+            if not await ProcessSupervisor.wait_for_exit(
+                process, PROCESS_STOP_GRACE_PERIOD
+            ):
+                process.kill()
+                await ProcessSupervisor.wait_for_exit(process)
+        except (ProcessLookupError, ConnectionError, BrokenPipeError):
+            # subprocess is dead or unreachable
+            pass
@@ -1,12 +1,20 @@
 import ast
 import hashlib
+import marshal
+import textwrap
 from collections import OrderedDict
 
 from src.errors import SecurityViolationError
 from src.import_validation import validate_module_import
 from src.config.security_config import SecurityConfig
+from src.message_types.broker import NodeMode
 from src.constants import (
     MAX_VALIDATION_CACHE_SIZE,
+    MAX_CODE_CACHE_SIZE,
+    EXECUTOR_USER_OUTPUT_KEY,
+    EXECUTOR_USER_FUNCTION_NAME,
+    EXECUTOR_ALL_ITEMS_FILENAME,
+    EXECUTOR_PER_ITEM_FILENAME,
     ERROR_RELATIVE_IMPORT,
     ERROR_DANGEROUS_NAME,
     ERROR_DANGEROUS_ATTRIBUTE,
@@ -20,6 +28,10 @@ CacheKey = tuple[str, tuple]  # (code_hash, allowlists_tuple)
 CachedViolations = list[str]
 ValidationCache = OrderedDict[CacheKey, CachedViolations]
 
+CodeCacheKey = tuple[str, NodeMode]  # (code_hash, node_mode)
+MarshalledCode = bytes
+CodeCache = OrderedDict[CodeCacheKey, MarshalledCode]
+
 
 class SecurityValidator(ast.NodeVisitor):
     """AST visitor that enforces import allowlists and blocks dangerous attribute access."""
@@ -157,6 +169,7 @@ class SecurityValidator(ast.NodeVisitor):
 
 class TaskAnalyzer:
     _cache: ValidationCache = OrderedDict()
+    _code_cache: CodeCache = OrderedDict()
 
     def __init__(self, security_config: SecurityConfig):
         self._security_config = security_config
@@ -195,14 +208,58 @@ class TaskAnalyzer:
         if security_validator.violations:
             self._raise_security_error(security_validator.violations)
 
+    def compile(self, code: str, node_mode: NodeMode) -> MarshalledCode:
+        """Wrap and compile user code for execution, returning the code object in marshalled form.
+
+        Task subprocesses `marshal.loads` the result, so they skip wrapping and compiling.
+        """
+
+        cache_key = (self._hash_code(code), node_mode)
+        cached_code = self._code_cache.get(cache_key)
+
+        if cached_code is not None:
+            self._code_cache.move_to_end(cache_key)
+            return cached_code
+
+        filename = (
+            EXECUTOR_ALL_ITEMS_FILENAME
+            if node_mode == "all_items"
+            else EXECUTOR_PER_ITEM_FILENAME
+        )
+        compiled_code = compile(self._wrap_code(code, node_mode), filename, "exec")
+        marshalled_code = marshal.dumps(compiled_code)
+
+        if len(self._code_cache) >= MAX_CODE_CACHE_SIZE:
+            self._code_cache.popitem(last=False)  # LRU
+
+        self._code_cache[cache_key] = marshalled_code
+
+        return marshalled_code
+
+    @staticmethod
+    def _wrap_code(raw_code: str, node_mode: NodeMode) -> str:
+        """Wrap user code in a function. In all-items mode the module also calls
+        the function once, while in per-item mode the executor calls it per item."""
+
+        indented_code = textwrap.indent(raw_code, "    ")
+        function_def = f"def {EXECUTOR_USER_FUNCTION_NAME}():\n{indented_code}\n"
+
+        if node_mode == "per_item":
+            return function_def
+
+        return f"{function_def}\n{EXECUTOR_USER_OUTPUT_KEY} = {EXECUTOR_USER_FUNCTION_NAME}()"
+
     def _raise_security_error(self, violations: CachedViolations) -> None:
         raise SecurityViolationError(
             message="Security violations detected", description="\n".join(violations)
         )
 
     def _to_cache_key(self, code: str) -> CacheKey:
-        code_hash = hashlib.sha256(code.encode()).hexdigest()
-        return (code_hash, self._allowlists)
+        return (self._hash_code(code), self._allowlists)
+
+    @staticmethod
+    def _hash_code(code: str) -> str:
+        return hashlib.sha256(code.encode()).hexdigest()
 
     def _set_in_cache(self, cache_key: CacheKey, violations: CachedViolations) -> None:
         if len(self._cache) >= MAX_VALIDATION_CACHE_SIZE:
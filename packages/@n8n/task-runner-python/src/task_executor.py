@@ -1,42 +1,59 @@
+import asyncio
 import multiprocessing
 import traceback
-import textwrap
 import json
+import marshal
 import io
 import os
+import resource
 import sys
 import logging
+from collections import deque
+from collections.abc import Callable
+from types import CodeType
+from typing import Any
 
 from src.errors import (
     TaskCancelledError,
     TaskKilledError,
+    TaskOutputTooLargeError,
     TaskResultMissingError,
     TaskResultReadError,
+    TaskResultTooLargeError,
     TaskRuntimeError,
     TaskTimeoutError,
     TaskSubprocessFailedError,
     SecurityViolationError,
 )
+from src import json_codec, memfd as memfd_utils
 from src.import_validation import validate_module_import
+from src.config.subprocess_config import SubprocessConfig
 from src.config.security_config import SecurityConfig
 
 from src.message_types.broker import NodeMode, Items
 from src.message_types.pipe import (
-    PipeResultMessage,
+    PipeMessage,
     PipeErrorMessage,
+    RawItems,
     TaskErrorInfo,
     PrintArgs,
+    PrintCallback,
 )
 from src.pipe_reader import PipeReader
+from src.process_supervisor import ProcessSupervisor
 from src.constants import (
     EXECUTOR_CIRCULAR_REFERENCE_KEY,
     EXECUTOR_USER_OUTPUT_KEY,
-    EXECUTOR_ALL_ITEMS_FILENAME,
-    EXECUTOR_PER_ITEM_FILENAME,
+    EXECUTOR_USER_FUNCTION_NAME,
     SIGTERM_EXIT_CODE,
     SIGKILL_EXIT_CODE,
+    PIPE_MSG_KIND_FINAL,
+    PIPE_MSG_KIND_PRINT,
     PIPE_MSG_PREFIX_LENGTH,
-    LOG_PIPE_READER_TIMEOUT_TRIGGERED,
+    PIPE_MSG_RESULT_SEPARATOR,
+    PIPE_MSG_MEMFD_THRESHOLD,
+    PRELOADED_MODULES_MODULE,
+    RESULT_ENCODE_BATCH_SIZE,
 )
 
 from multiprocessing.context import ForkServerProcess
@@ -45,59 +62,221 @@ from multiprocessing.connection import Connection
 logger = logging.getLogger(__name__)
 
 MULTIPROCESSING_CONTEXT = multiprocessing.get_context("forkserver")
-MAX_PRINT_ARGS_ALLOWED = 100
-
 type PipeConnection = Connection
 
+# the executor is preloaded into the forkserver ahead of the modules to preload
+MODULES_BEFORE_PRELOAD = frozenset(sys.modules)
+type ModuleSnapshot = dict[str, tuple[Any, dict[str, Any] | None]]
+
+
+class PrintCapture:
+    """Replaces `print()` in user code. Formats the args to each call once and
+    writes them to the pipe as it happens, so the runner can forward them while
+    the task is still running.
+
+    Output is limited to `print_max_bytes` of formatted args. The first
+    `print_records_kept` calls are written as they happen, within half of the
+    budget. Once either is used up, only the last `print_records_kept` calls
+    are kept, within the rest of the budget, and written after a truncation
+    notice when the task ends. Args of calls that cannot be kept are measured
+    without being formatted where possible: string args always, other args
+    only until the call is known not to fit, so the notice may give only a
+    lower bound of the bytes dropped.
+    """
+
+    def __init__(self, write_fd: int, subprocess_config: SubprocessConfig):
+        self.write_fd = write_fd
+        self.max_bytes = subprocess_config.print_max_bytes
+        self.records_kept = subprocess_config.print_records_kept
+        self.head_count = 0
+        self.head_bytes = 0
+        self.is_head_open = True
+        self.tail: deque[tuple[list[str], int]] = deque()
+        self.tail_bytes = 0
+        self.dropped_count = 0
+        self.dropped_bytes = 0
+        self.is_dropped_bytes_exact = True
+
+    def __call__(self, *args):
+        if self.is_head_open:
+            formatted = TaskExecutor._format_print_args(*args)
+            size = TaskExecutor._get_print_args_size(formatted)
+
+            if (
+                self.head_count < self.records_kept
+                and self.head_bytes + size <= self.max_bytes // 2
+            ):
+                self.head_count += 1
+                self.head_bytes += size
+                self._write(formatted)
+                print("[user code]", *args)
+                return
+
+            self.is_head_open = False
+
+            if self.records_kept == 0 or size > self._tail_budget():
+                self._drop(size, is_exact=True)
+                return
+        elif self.records_kept == 0:
+            # nothing is kept after the head, so only string args are measured
+            _, size, is_exact = self._format_within(args, budget=-1)
+            self._drop(size, is_exact)
+            return
+        else:
+            formatted, size, is_exact = self._format_within(args, self._tail_budget())
+
+            if formatted is None:
+                self._drop(size, is_exact)
+                return
+
+        self.tail.append((formatted, size))
+        self.tail_bytes += size
+
+        while (
+            len(self.tail) > self.records_kept or self.tail_bytes > self._tail_budget()
+        ):
+            _, evicted_size = self.tail.popleft()
+            self.tail_bytes -= evicted_size
+            self._drop(evicted_size, is_exact=True)
+
+    def flush(self) -> None:
+        """Write the truncation notice, if any, and the last calls kept."""
+
+        if self.dropped_count:
+            at_least = "" if self.is_dropped_bytes_exact else "at least "
+            self._write(
+                [
+                    (
+                        f"[Output truncated - {self.dropped_count} more print "
+                        f"statements ({at_least}{self.dropped_bytes} bytes)]"
+                    )
+                ]
+            )
+
+        for formatted, _ in self.tail:
+            self._write(formatted)
+
+        self.tail.clear()
+        self.tail_bytes = 0
+        self.dropped_count = 0
+        self.dropped_bytes = 0
+        self.is_dropped_bytes_exact = True
+
+    def _tail_budget(self) -> int:
+        return self.max_bytes - self.head_bytes
+
+    def _drop(self, size: int, is_exact: bool) -> None:
+        self.dropped_count += 1
+        self.dropped_bytes += size
+        if not is_exact:
+            self.is_dropped_bytes_exact = False
+
+    @staticmethod
+    def _format_within(args: tuple, budget: int) -> tuple[list[str] | None, int, bool]:
+        """Format args only if they fit in `budget` bytes. String args are measured
+        first, other args are formatted one by one until the budget is exceeded.
+
+        Returns the formatted args, or None if they do not fit, their size, and
+        whether the size is exact, i.e. whether no arg was left unmeasured.
+        """
+
+        size = sum(
+            TaskExecutor._get_str_print_arg_size(arg)
+            for arg in args
+            if isinstance(arg, str)
+        )
+        formatted_args: dict[int, str] = {}
+
+        for index, arg in enumerate(args):
+            if isinstance(arg, str):
+                continue
+            if size > budget:
+                return None, size, False
+            formatted_args[index] = TaskExecutor._format_print_args(arg)[0]
+            size += TaskExecutor._get_str_size(formatted_args[index])
+
+        if size > budget:
+            return None, size, True
+
+        formatted = [
+            formatted_args[index]
+            if index in formatted_args
+            else TaskExecutor._format_print_args(arg)[0]
+            for index, arg in enumerate(args)
+        ]
+
+        return formatted, size, True
+
+    def _write(self, formatted: list[str]) -> None:
+        TaskExecutor._write_message(
+            self.write_fd, json_codec.dumps(formatted), kind=PIPE_MSG_KIND_PRINT
+        )
+
 
 class TaskExecutor:
     """Responsible for executing Python code tasks in isolated subprocesses."""
 
     @staticmethod
     def create_process(
-        code: str,
+        code: bytes,
         node_mode: NodeMode,
-        items: Items,
+        items: RawItems,
         security_config: SecurityConfig,
+        subprocess_config: SubprocessConfig,
+        item_offset: int = 0,
+        items_memfd: int | None = None,
     ) -> tuple[ForkServerProcess, PipeConnection, PipeConnection]:
-        """Create a subprocess for executing a Python code task and a pipe for communication."""
+        """Create a subprocess for executing a Python code task and a pipe for communication.
 
-        fn = (
-            TaskExecutor._all_items
-            if node_mode == "all_items"
-            else TaskExecutor._per_item
-        )
+        `code` is the marshalled code object produced by `TaskAnalyzer.compile`.
+        `items` is the JSON-encoded items, decoded only in the subprocess.
+        `item_offset` is the index of the first item, when `items` is a shard.
+        `items_memfd` from `spill_items` replaces `items` and is closed here.
+        """
+
+        # event loop in runner process reads, subprocess writes. A socket pair rather
+        # than a pipe, so that memfds can be passed to and from the subprocess.
+        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=True)
+        os.set_blocking(read_conn.fileno(), False)
 
-        # thread in runner process reads, subprocess writes
-        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=False)
+        if items_memfd is not None:
+            TaskExecutor.send_items_memfd(read_conn, items_memfd)
+            items = None
+        else:
+            items = bytes(items)  # views into the broker message cannot be pickled
 
         process = MULTIPROCESSING_CONTEXT.Process(
-            target=fn,
+            target=TaskExecutor._run_task_process,
             args=(
                 code,
+                node_mode,
                 items,
+                item_offset,
                 write_conn,
                 security_config,
+                subprocess_config,
             ),
         )
 
         return process, read_conn, write_conn
 
     @staticmethod
-    def execute_process(
+    async def execute_process(
+        pipe_reader: PipeReader,
         process: ForkServerProcess,
         read_conn: PipeConnection,
         write_conn: PipeConnection,
         task_timeout: int,
-        pipe_reader_timeout: float,
         continue_on_fail: bool,
-    ) -> tuple[Items, PrintArgs, int]:
-        """Execute a subprocess for a Python code task."""
+        on_print: PrintCallback | None = None,
+    ) -> tuple[RawItems, PrintArgs, int]:
+        """Execute a subprocess for a Python code task.
 
-        print_args: PrintArgs = []
+        `on_print` is called for each `print()` call as it happens. Otherwise,
+        and for output the subprocess truncated, print args are returned.
+        """
 
-        pipe_reader = PipeReader(read_conn.fileno(), read_conn)
-        pipe_reader.start()
+        print_args: PrintArgs = []
 
         try:
             try:
@@ -107,175 +286,318 @@ class TaskExecutor:
             finally:
                 write_conn.close()
 
-            process.join(timeout=task_timeout)
-
-            if process.is_alive():
-                TaskExecutor.stop_process(process)
+            try:
+                async with asyncio.timeout(task_timeout):
+                    try:
+                        pipe_message, message_size = await pipe_reader.read_message(
+                            read_conn.fileno(), on_print
+                        )
+                    except TaskOutputTooLargeError:
+                        await ProcessSupervisor.stop_process(process)
+                        raise
+                    except Exception:
+                        # the exit code, e.g. of a cancelled task, explains a failed read
+                        await ProcessSupervisor.wait_for_exit(process)
+                        raise
+                    await ProcessSupervisor.wait_for_exit(process)
+            except TimeoutError:
+                await ProcessSupervisor.stop_process(process)
                 raise TaskTimeoutError(task_timeout)
+            except asyncio.CancelledError:
+                await ProcessSupervisor.stop_process(process)
+                raise
+            except TaskOutputTooLargeError:
+                raise
+            except EOFError:
+                TaskExecutor.raise_for_exit_code(process)
+                raise TaskResultMissingError()
+            except Exception as e:
+                TaskExecutor.raise_for_exit_code(process)
+                raise TaskResultReadError(e)
 
-            if process.exitcode == SIGTERM_EXIT_CODE:
-                raise TaskCancelledError()
+            TaskExecutor.raise_for_exit_code(process)
 
-            if process.exitcode == SIGKILL_EXIT_CODE:
-                raise TaskKilledError()
+            print_args = pipe_message.get("print_args", [])
+            result = TaskExecutor.unpack_pipe_message(pipe_message)
 
-            if process.exitcode != 0:
-                assert process.exitcode is not None
-                raise TaskSubprocessFailedError(process.exitcode)
+            return result, print_args, message_size
 
-            pipe_reader.join(timeout=pipe_reader_timeout)
+        except Exception as e:
+            if continue_on_fail:
+                return TaskExecutor.error_result(e), print_args, 0
+            raise
 
-            if pipe_reader.is_alive():
-                logger.warning(
-                    LOG_PIPE_READER_TIMEOUT_TRIGGERED.format(
-                        timeout=pipe_reader_timeout
-                    )
-                )
-                try:
-                    read_conn.close()
-                except Exception:
-                    pass
+        finally:
+            read_conn.close()
 
-            if pipe_reader.error:
-                raise TaskResultReadError(pipe_reader.error)
+    @staticmethod
+    def spill_items(items: RawItems, threshold: int) -> int | None:
+        """Copy JSON-encoded items into a memfd if they are at least `threshold` bytes,
+        so the subprocess maps them instead of unpickling them."""
 
-            if pipe_reader.pipe_message is None:
-                raise TaskResultMissingError()
+        if threshold == 0 or len(items) < threshold or not memfd_utils.is_supported():
+            return None
 
-            returned = pipe_reader.pipe_message
+        return memfd_utils.create_sealed(items)
 
-            if "error" in returned:
-                raise TaskRuntimeError(returned["error"])
+    @staticmethod
+    def send_items_memfd(conn: PipeConnection, items_memfd: int) -> None:
+        try:
+            memfd_utils.send(conn.fileno(), items_memfd)
+        finally:
+            os.close(items_memfd)
 
-            if "result" not in returned:
-                raise TaskResultMissingError()
+    @staticmethod
+    def error_result(e: Exception) -> bytes:
+        """JSON-encoded result of a failed task that continues on fail."""
 
-            result = returned["result"]
-            print_args = returned.get("print_args", [])
-            assert pipe_reader.message_size is not None
-            result_size_bytes = pipe_reader.message_size
+        return json_codec.dumps([{"json": {"error": str(e)}}])
 
-            return result, print_args, result_size_bytes
+    @staticmethod
+    def raise_for_exit_code(process: ForkServerProcess):
+        """Raise the error matching the exit code of a finished subprocess, if any."""
 
-        except Exception as e:
-            if continue_on_fail:
-                return [{"json": {"error": str(e)}}], print_args, 0
-            raise
+        if process.exitcode == SIGTERM_EXIT_CODE:
+            raise TaskCancelledError()
+
+        if process.exitcode == SIGKILL_EXIT_CODE:
+            raise TaskKilledError()
+
+        if process.exitcode != 0:
+            assert process.exitcode is not None
+            raise TaskSubprocessFailedError(process.exitcode)
 
     @staticmethod
-    def stop_process(process: ForkServerProcess | None):
-        """Stop a running subprocess, gracefully else force-killing."""
+    def unpack_pipe_message(pipe_message: PipeMessage) -> RawItems:
+        """Extract the task result from a pipe message, raising if the task failed."""
 
-        if process is None or not process.is_alive():
-            return
+        if "error" in pipe_message:
+            raise TaskRuntimeError(pipe_message["error"])
 
-        try:
-            process.terminate()
-            process.join(timeout=1)  # 1s grace period
+        if "result" not in pipe_message:
+            raise TaskResultMissingError()
 
-            if process.is_alive():
-                process.kill()
-                process.join()
-        except (ProcessLookupError, ConnectionError, BrokenPipeError):
-            # subprocess is dead or unreachable
-            pass
+        return pipe_message["result"]
+
+    # ========== subprocess entrypoints ==========
 
     @staticmethod
-    def _all_items(
-        raw_code: str,
-        items: Items,
+    def _run_task_process(
+        code: bytes,
+        node_mode: NodeMode,
+        items: bytes | None,
+        item_offset: int,
         write_conn,
         security_config: SecurityConfig,
+        subprocess_config: SubprocessConfig,
     ):
-        """Execute a Python code task in all-items mode."""
+        """Entrypoint of a subprocess that executes a single task and exits."""
+
+        try:
+            TaskExecutor._enter_sandbox(security_config)
+            builtins = TaskExecutor._filter_builtins(security_config)
+            TaskExecutor._run_task(
+                code,
+                node_mode,
+                items,
+                item_offset,
+                write_conn.fileno(),
+                builtins,
+                subprocess_config,
+            )
+        finally:
+            write_conn.close()
 
+    @staticmethod
+    def _run_worker_process(
+        task_conn,
+        write_conn,
+        security_config: SecurityConfig,
+        subprocess_config: SubprocessConfig,
+    ):
+        """Entrypoint of a pooled subprocess that executes tasks until told to stop.
+
+        Reports its peak RSS over `task_conn` once ready, then receives
+        `(code, node_mode, items, item_offset)` over `task_conn`, writes each task's pipe
+        message to `write_conn` and reports its peak RSS again. Loaded modules and
+        their attributes are restored after each task.
+        """
+
+        try:
+            TaskExecutor._enter_sandbox(security_config)
+            builtins = TaskExecutor._filter_builtins(security_config)
+            modules = TaskExecutor._snapshot_modules()
+            task_conn.send(TaskExecutor._get_peak_rss())
+
+            while True:
+                try:
+                    task = task_conn.recv()
+                except EOFError:
+                    break
+
+                if task is None:
+                    break
+
+                code, node_mode, items, item_offset = task
+                TaskExecutor._run_task(
+                    code,
+                    node_mode,
+                    items,
+                    item_offset,
+                    write_conn.fileno(),
+                    dict(builtins),
+                    subprocess_config,
+                )
+                TaskExecutor._restore_modules(modules)
+                task_conn.send(TaskExecutor._get_peak_rss())
+        finally:
+            write_conn.close()
+            task_conn.close()
+
+    @staticmethod
+    def _enter_sandbox(security_config: SecurityConfig):
         if security_config.runner_env_deny:
             os.environ.clear()
 
         TaskExecutor._sanitize_sys_modules(security_config)
 
-        print_args: PrintArgs = []
+    @staticmethod
+    def _run_task(
+        code: bytes,
+        node_mode: NodeMode,
+        items_json: bytes | None,
+        item_offset: int,
+        write_fd: int,
+        builtins: dict[str, Any],
+        subprocess_config: SubprocessConfig,
+    ):
+        """Execute a Python code task and write its result or error to the pipe.
+
+        `items_json` is None if the runner spilled the items to a memfd.
+        """
+
+        print_capture = PrintCapture(write_fd, subprocess_config)
         sys.stderr = stderr_capture = io.StringIO()
+        loads = (
+            json_codec.loads_compact
+            if subprocess_config.compact_decode
+            else json_codec.loads
+        )
+
+        try:
+            if items_json is None:
+                items = TaskExecutor._receive_items(write_fd, loads)
+            else:
+                items = loads(items_json)
+            compiled_code = marshal.loads(code)
+            if node_mode == "all_items":
+                result = TaskExecutor._all_items(
+                    compiled_code, items, print_capture, builtins
+                )
+            else:
+                result = TaskExecutor._per_item(
+                    compiled_code, items, print_capture, builtins, item_offset
+                )
+            print_capture.flush()
+            TaskExecutor._put_result(
+                write_fd, result, max_size=subprocess_config.max_result_size
+            )
+        except BaseException as e:
+            print_capture.flush()
+            TaskExecutor._put_error(write_fd, e, stderr_capture.getvalue())
+
+    @staticmethod
+    def _receive_items(
+        sock_fd: int, loads: Callable[[memoryview], Any] = json_codec.loads
+    ) -> Items:
+        """Receive items spilled to a memfd, or the whole task settings message
+        the runner spooled to a memfd, and decode the items from it."""
+
+        memfd = memfd_utils.receive(sock_fd)
 
         try:
-            wrapped_code = TaskExecutor._wrap_code(raw_code)
-            compiled_code = compile(wrapped_code, EXECUTOR_ALL_ITEMS_FILENAME, "exec")
+            with (
+                memfd_utils.map_readonly(memfd) as mapping,
+                memoryview(mapping) as view,
+            ):
+                decoded = loads(view)
+        finally:
+            os.close(memfd)
 
-            globals = {
-                "__builtins__": TaskExecutor._filter_builtins(security_config),
-                "_items": items,
-                "print": TaskExecutor._create_custom_print(print_args),
-            }
+        if isinstance(decoded, dict):
+            return decoded["settings"]["items"]
 
-            exec(compiled_code, globals)
+        return decoded
 
-            result = globals[EXECUTOR_USER_OUTPUT_KEY]
-            TaskExecutor._put_result(write_conn.fileno(), result, print_args)
+    @staticmethod
+    def _get_peak_rss() -> int:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        return peak_rss if sys.platform == "darwin" else peak_rss * 1024
 
-        except BaseException as e:
-            TaskExecutor._put_error(
-                write_conn.fileno(), e, stderr_capture.getvalue(), print_args
-            )
+    # ========== execution modes ==========
 
     @staticmethod
-    def _per_item(
-        raw_code: str,
+    def _all_items(
+        compiled_code: CodeType,
         items: Items,
-        write_conn,
-        security_config: SecurityConfig,
-    ):
-        """Execute a Python code task in per-item mode."""
-
-        if security_config.runner_env_deny:
-            os.environ.clear()
+        custom_print: Callable[..., None],
+        builtins: dict[str, Any],
+    ) -> Items:
+        """Execute a Python code task in all-items mode."""
 
-        TaskExecutor._sanitize_sys_modules(security_config)
+        globals = {
+            "__builtins__": builtins,
+            "_items": items,
+            "print": custom_print,
+        }
 
-        print_args: PrintArgs = []
-        sys.stderr = stderr_capture = io.StringIO()
+        exec(compiled_code, globals)
 
-        try:
-            wrapped_code = TaskExecutor._wrap_code(raw_code)
-            compiled_code = compile(wrapped_code, EXECUTOR_PER_ITEM_FILENAME, "exec")
+        return globals[EXECUTOR_USER_OUTPUT_KEY]
 
-            filtered_builtins = TaskExecutor._filter_builtins(security_config)
-            custom_print = TaskExecutor._create_custom_print(print_args)
+    @staticmethod
+    def _per_item(
+        compiled_code: CodeType,
+        items: Items,
+        custom_print: Callable[..., None],
+        builtins: dict[str, Any],
+        item_offset: int = 0,
+    ) -> Items:
+        """Execute a Python code task in per-item mode."""
 
-            result: Items = []
-            for index, item in enumerate(items):
-                globals = {
-                    "__builtins__": filtered_builtins,
-                    "_item": item,
-                    "print": custom_print,
-                }
+        globals = {
+            "__builtins__": builtins,
+            "_item": None,
+            "print": custom_print,
+        }
 
-                exec(compiled_code, globals)
+        exec(compiled_code, globals)  # only defines the user function
 
-                user_output = globals[EXECUTOR_USER_OUTPUT_KEY]
+        user_function = globals[EXECUTOR_USER_FUNCTION_NAME]
 
-                if user_output is None:
-                    continue
+        result: Items = []
+        for index, item in enumerate(items):
+            globals["_item"] = item
 
-                json_data = TaskExecutor._extract_json_data_per_item(user_output)
+            user_output = user_function()
 
-                output_item = {"json": json_data, "pairedItem": {"item": index}}
+            if user_output is None:
+                continue
 
-                if isinstance(user_output, dict) and "binary" in user_output:
-                    output_item["binary"] = user_output["binary"]
+            json_data = TaskExecutor._extract_json_data_per_item(user_output)
 
-                result.append(output_item)
+            output_item = {
+                "json": json_data,
+                "pairedItem": {"item": item_offset + index},
+            }
 
-            TaskExecutor._put_result(write_conn.fileno(), result, print_args)
+            if isinstance(user_output, dict) and "binary" in user_output:
+                output_item["binary"] = user_output["binary"]
 
-        except BaseException as e:
-            TaskExecutor._put_error(
-                write_conn.fileno(), e, stderr_capture.getvalue(), print_args
-            )
+            result.append(output_item)
 
-    @staticmethod
-    def _wrap_code(raw_code: str) -> str:
-        indented_code = textwrap.indent(raw_code, "    ")
-        return f"def _user_function():\n{indented_code}\n\n{EXECUTOR_USER_OUTPUT_KEY} = _user_function()"
+        return result
 
     @staticmethod
     def _extract_json_data_per_item(user_output):
@@ -291,23 +613,85 @@ class TaskExecutor:
         return user_output
 
     @staticmethod
-    def _put_result(write_fd: int, result: Items, print_args: PrintArgs):
-        message: PipeResultMessage = {
-            "result": result,
-            "print_args": TaskExecutor._truncate_print_args(print_args),
-        }
+    def _put_result(
+        write_fd: int,
+        result: Items,
+        print_args: PrintArgs | None = None,
+        max_size: int | None = None,
+    ):
+        """Write the result after a separate envelope, so the runner can pass it
+        through to the broker without decoding it.
+
+        Raises TaskResultTooLargeError once the encoded result exceeds `max_size`.
+        """
 
-        data = json.dumps(message, default=str, ensure_ascii=False).encode("utf-8")
-        length_bytes = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+        envelope = {"print_args": print_args or []}
+        result_parts, result_size = TaskExecutor._encode_result(result, max_size)
+
+        if result_size >= PIPE_MSG_MEMFD_THRESHOLD and memfd_utils.is_supported():
+            TaskExecutor._put_result_in_memfd(
+                write_fd, envelope, result_parts, result_size
+            )
+            return
+
+        TaskExecutor._write_message(
+            write_fd,
+            json_codec.dumps(envelope),
+            PIPE_MSG_RESULT_SEPARATOR,
+            *result_parts,
+        )
+
+    @staticmethod
+    def _encode_result(
+        result: Items, max_size: int | None
+    ) -> tuple[list[bytes | memoryview], int]:
+        """Encode the result in batches of items, checking its size after each,
+        so that an oversized result is rejected before it is fully encoded."""
+
+        if not isinstance(result, list):
+            encoded = json_codec.dumps(result)
+            if max_size is not None and len(encoded) > max_size:
+                raise TaskResultTooLargeError(max_size)
+            return [encoded], len(encoded)
+
+        parts: list[bytes | memoryview] = [b"["]
+        size = 2  # brackets
+
+        for start in range(0, len(result), RESULT_ENCODE_BATCH_SIZE):
+            batch = result[start : start + RESULT_ENCODE_BATCH_SIZE]
+            batch_items = memoryview(json_codec.dumps(batch))[1:-1]  # no brackets
+
+            if len(parts) > 1:
+                parts.append(b",")
+                size += 1
+            parts.append(batch_items)
+            size += len(batch_items)
+
+            if max_size is not None and size > max_size:
+                raise TaskResultTooLargeError(max_size)
+
+        parts.append(b"]")
+
+        return parts, size
+
+    @staticmethod
+    def _put_result_in_memfd(
+        write_fd: int,
+        envelope: dict,
+        result_parts: list[bytes | memoryview],
+        result_size: int,
+    ):
+        """Pass the result in a memfd after the envelope, so the runner maps it
+        instead of reading it through the socket in small chunks."""
+
+        memfd = memfd_utils.create_sealed(*result_parts)
 
         try:
-            TaskExecutor._write_bytes(write_fd, length_bytes)
-            TaskExecutor._write_bytes(write_fd, data)
+            envelope["result_memfd_size"] = result_size
+            TaskExecutor._write_message(write_fd, json_codec.dumps(envelope))
+            memfd_utils.send(write_fd, memfd)
         finally:
-            try:
-                os.close(write_fd)
-            except Exception:
-                pass
+            os.close(memfd)
 
     @staticmethod
     def _put_error(
@@ -330,55 +714,22 @@ class TaskExecutor:
 
         message: PipeErrorMessage = {
             "error": task_error_info,
-            "print_args": TaskExecutor._truncate_print_args(print_args),
+            "print_args": print_args,
         }
 
-        data = json.dumps(message, default=str, ensure_ascii=False).encode("utf-8")
-        length_bytes = len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        try:
-            TaskExecutor._write_bytes(write_fd, length_bytes)
-            TaskExecutor._write_bytes(write_fd, data)
-        finally:
-            try:
-                os.close(write_fd)
-            except Exception:
-                pass
+        TaskExecutor._write_message(write_fd, json_codec.dumps(message))
 
     # ========== print() ==========
 
-    @staticmethod
-    def _create_custom_print(print_args: PrintArgs):
-        def custom_print(*args):
-            serializable_args = []
-
-            for arg in args:
-                try:
-                    json.dumps(arg, default=str, ensure_ascii=False)
-                    serializable_args.append(arg)
-                except Exception as _:
-                    # Ensure args are serializable so they are transmissible
-                    # through the multiprocessing queue and via websockets.
-                    serializable_args.append(
-                        {
-                            EXECUTOR_CIRCULAR_REFERENCE_KEY: repr(arg),
-                            "__type__": type(arg).__name__,
-                        }
-                    )
-
-            formatted = TaskExecutor._format_print_args(*serializable_args)
-            print_args.append(formatted)
-            print("[user code]", *args)
-
-        return custom_print
-
     @staticmethod
     def _format_print_args(*args) -> list[str]:
         """
         Takes the args passed to a `print()` call in user code and converts them
         to string representations suitable for display in a browser console.
 
-        Expects all args to be serializable.
+        Args that cannot be encoded as JSON, e.g. circular references, are shown
+        as a placeholder, so that they are transmissible through the pipe and
+        via websockets.
         """
 
         formatted = []
@@ -394,25 +745,29 @@ class TaskExecutor:
                 formatted.append(f"[Circular {arg.get('__type__', 'Object')}]")
 
             else:
-                formatted.append(json.dumps(arg, default=str, ensure_ascii=False))
+                try:
+                    # stdlib, for its spacing in the browser console
+                    formatted.append(json.dumps(arg, default=str, ensure_ascii=False))
+                except Exception:
+                    formatted.append(f"[Circular {type(arg).__name__}]")
 
         return formatted
 
     @staticmethod
-    def _truncate_print_args(print_args: PrintArgs) -> PrintArgs:
-        """Truncate print_args to prevent pipe buffer overflow."""
+    def _get_print_args_size(formatted: list[str]) -> int:
+        """UTF-8 size in bytes of formatted print args."""
 
-        if not print_args or len(print_args) <= MAX_PRINT_ARGS_ALLOWED:
-            return print_args
+        return sum(TaskExecutor._get_str_size(arg) for arg in formatted)
 
-        truncated = print_args[:MAX_PRINT_ARGS_ALLOWED]
-        truncated.append(
-            [
-                f"[Output truncated - {len(print_args) - MAX_PRINT_ARGS_ALLOWED} more print statements]"
-            ]
-        )
+    @staticmethod
+    def _get_str_print_arg_size(arg: str) -> int:
+        """Size of a string print arg once formatted, without formatting it."""
+
+        return TaskExecutor._get_str_size(arg) + 2  # quotes
 
-        return truncated
+    @staticmethod
+    def _get_str_size(s: str) -> int:
+        return len(s) if s.isascii() else len(s.encode("utf-8", "surrogatepass"))
 
     # ========== security ==========
 
@@ -459,18 +814,55 @@ class TaskExecutor:
         else:
             safe_modules.update(security_config.external_allow)
 
+        # keep what preloaded modules imported, which they may import again lazily
+        preloaded_module = sys.modules.get(PRELOADED_MODULES_MODULE)
+        preloaded_modules = (
+            preloaded_module.PRELOADED_MODULES if preloaded_module else frozenset()
+        )
+
         # keep modules marked as safe and submodules of those
         safe_prefixes = [safe + "." for safe in safe_modules]
         modules_to_remove = [
             name
             for name in sys.modules.keys()
             if name not in safe_modules
+            and name not in preloaded_modules
             and not any(name.startswith(prefix) for prefix in safe_prefixes)
         ]
 
         for module_name in modules_to_remove:
             del sys.modules[module_name]
 
+    @staticmethod
+    def _snapshot_modules() -> ModuleSnapshot:
+        """Record loaded modules and their attributes, for a pooled worker to
+        restore after each task."""
+
+        return {
+            name: (module, dict(vars(module)) if hasattr(module, "__dict__") else None)
+            for name, module in sys.modules.items()
+        }
+
+    @staticmethod
+    def _restore_modules(snapshot: ModuleSnapshot) -> None:
+        """Forget modules a task imported and reset the attributes of modules
+        loaded before it, e.g. values stashed on or functions patched into them.
+        Objects that attributes refer to are not restored."""
+
+        for name in [name for name in sys.modules if name not in snapshot]:
+            del sys.modules[name]
+
+        for name, (module, attrs) in snapshot.items():
+            sys.modules[name] = module
+
+            if attrs is None:
+                continue
+
+            module_dict = module.__dict__
+            module_dict.update(attrs)
+            for key in [key for key in module_dict if key not in attrs]:
+                del module_dict[key]
+
     @staticmethod
     def _create_safe_import(security_config: SecurityConfig):
         original_import = __builtins__["__import__"]
@@ -491,11 +883,24 @@ class TaskExecutor:
 
     # ========== pipe I/O ==========
 
+    @staticmethod
+    def _write_message(write_fd: int, *parts: bytes, kind: bytes = PIPE_MSG_KIND_FINAL):
+        """Write the parts as one message, prefixed with its kind and length,
+        without joining them."""
+
+        length = sum(len(part) for part in parts)
+        header = kind + length.to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
+
+        TaskExecutor._write_bytes(write_fd, header)
+        for part in parts:
+            TaskExecutor._write_bytes(write_fd, part)
+
     @staticmethod
     def _write_bytes(fd: int, data: bytes):
+        view = memoryview(data)
         total_written = 0
         while total_written < len(data):
-            written = os.write(fd, data[total_written:])
+            written = os.write(fd, view[total_written:])
             if written == 0:
                 raise OSError("Write failed")
             total_written += written
@@ -1,13 +1,17 @@
 import asyncio
 import logging
+import math
+import mmap
+import os
 import time
-from typing import Callable, Awaitable
-from dataclasses import dataclass
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Awaitable
 from urllib.parse import urlparse
 import websockets
 from websockets.exceptions import InvalidStatus
 from websockets.asyncio.client import ClientConnection
-import random
 from src.errors import TaskCancelledError
 
 
@@ -15,9 +19,12 @@ from src.config.task_runner_config import TaskRunnerConfig
 from src.errors import (
     NoIdleTimeoutHandlerError,
     TaskMissingError,
+    TaskRuntimeError,
     WebsocketConnectionError,
 )
 from src.message_types.broker import TaskSettings
+from src.message_types.pipe import PrintArgs, PrintCallback, RawItems
+from src import json_codec, memfd as memfd_utils
 from src.nanoid import nanoid
 
 from src.constants import (
@@ -25,16 +32,23 @@ from src.constants import (
     TASK_REJECTED_REASON_AT_CAPACITY,
     TASK_REJECTED_REASON_OFFER_EXPIRED,
     TASK_TYPE_PYTHON,
-    OFFER_INTERVAL,
-    OFFER_VALIDITY,
-    OFFER_VALIDITY_MAX_JITTER,
-    OFFER_VALIDITY_LATENCY_BUFFER,
     TASK_BROKER_WS_PATH,
+    FORKSERVER_CHECK_INTERVAL,
+    BROKER_RTT_POLL_INTERVAL,
+    LOG_BROKER_RTT,
+    SERDE_OFFLOAD_THRESHOLD,
+    LOOP_STALL_CHECK_INTERVAL,
+    LOOP_STALL_WARNING_THRESHOLD,
+    LOG_LOOP_STALL,
+    LOG_SERDE_OFFLOADED,
+    RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD,
     RPC_BROWSER_CONSOLE_LOG_METHOD,
     LOG_TASK_COMPLETE,
     LOG_TASK_CANCEL,
     LOG_TASK_CANCEL_UNKNOWN,
     LOG_TASK_CANCEL_WAITING,
+    LOG_TASK_CANCEL_PREFETCHED,
+    LOG_TASK_PREFETCHED,
 )
 from src.message_types import (
     BrokerMessage,
@@ -46,7 +60,6 @@ from src.message_types import (
     BrokerTaskCancel,
     BrokerRpcResponse,
     RunnerInfo,
-    RunnerTaskOffer,
     RunnerTaskAccepted,
     RunnerTaskRejected,
     RunnerTaskDone,
@@ -54,20 +67,20 @@ from src.message_types import (
     RunnerRpcCall,
 )
 from src.message_serde import MessageSerde
+from src.offer_manager import OfferManager
+from src.print_forwarder import PrintForwarder
 from src.task_state import TaskState, TaskStatus
 from src.task_executor import TaskExecutor
+from src.process_supervisor import ProcessSupervisor
+from src.pipe_reader import PipeReader
 from src.task_analyzer import TaskAnalyzer
+from src.forkserver_manager import ForkserverManager
+from src.worker_pool import WorkerPool
+from src.config.offer_config import OfferConfig
+from src.config.subprocess_config import SubprocessConfig
 from src.config.security_config import SecurityConfig
 
-
-@dataclass
-class TaskOffer:
-    offer_id: str
-    valid_until: float
-
-    @property
-    def has_expired(self) -> bool:
-        return time.time() > self.valid_until
+type Shard = tuple[int, RawItems]  # index of the first item, JSON-encoded items
 
 
 class TaskRunner:
@@ -81,12 +94,32 @@ class TaskRunner:
 
         self.websocket_connection: ClientConnection | None = None
         self.can_send_offers = False
+        self.can_batch_print_args = False
 
-        self.open_offers: dict[str, TaskOffer] = {}
         self.running_tasks: dict[str, TaskState] = {}
-
-        self.offers_coroutine: asyncio.Task | None = None
+        # accepted tasks with settings, in order, waiting for a free slot
+        self.prefetched_tasks: deque[TaskState] = deque()
+
+        self.offer_manager = OfferManager(
+            self._get_wanted_offers,
+            self._send_message,
+            OfferConfig(
+                validity_min=config.offer_validity_min,
+                validity_max=config.offer_validity_max,
+                latency_buffer_min=config.offer_latency_buffer_min,
+                latency_buffer_max=config.offer_latency_buffer_max,
+            ),
+        )
+        self.broker_rtt_coroutine: asyncio.Task | None = None
+        self.forkserver_coroutine: asyncio.Task | None = None
+        self.is_forkserver_ready = False
         self.serde = MessageSerde()
+        # a single thread, so that offloaded messages are processed in order
+        self.serde_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="serde"
+        )
+        self.max_loop_stall_ms = 0
+        self.loop_stall_coroutine: asyncio.Task | None = None
         self.executor = TaskExecutor()
         self.security_config = SecurityConfig(
             stdlib_allow=config.stdlib_allow,
@@ -94,7 +127,31 @@ class TaskRunner:
             builtins_deny=config.builtins_deny,
             runner_env_deny=config.env_deny,
         )
+        self.subprocess_config = SubprocessConfig(
+            print_max_bytes=config.print_max_bytes,
+            print_records_kept=config.print_records_kept,
+            max_result_size=config.max_payload_size,
+            compact_decode=config.items_compact_decode,
+        )
+        # a result up to the max payload, and print output with room for its framing
+        self.pipe_reader = PipeReader(
+            max_bytes_per_task=config.max_payload_size + 2 * config.print_max_bytes
+        )
         self.analyzer = TaskAnalyzer(self.security_config)
+        self.forkserver_manager = ForkserverManager(config.preload)
+        self.forkserver_manager.configure()
+        self.worker_pool = (
+            WorkerPool(
+                size=config.max_concurrency,
+                security_config=self.security_config,
+                subprocess_config=self.subprocess_config,
+                pipe_reader=self.pipe_reader,
+                max_tasks=config.worker_pool_max_tasks,
+                max_rss=config.worker_pool_max_rss,
+            )
+            if config.worker_pool_enabled
+            else None
+        )
         self.logger = logging.getLogger(__name__)
 
         self.idle_coroutine: asyncio.Task | None = None
@@ -112,10 +169,31 @@ class TaskRunner:
     def running_tasks_count(self) -> int:
         return len(self.running_tasks)
 
+    @property
+    def occupied_slots_count(self) -> int:
+        return sum(task_state.slots for task_state in self.running_tasks.values())
+
+    @property
+    def executing_slots_count(self) -> int:
+        return sum(
+            task_state.slots
+            for task_state in self.running_tasks.values()
+            if task_state.status in (TaskStatus.RUNNING, TaskStatus.ABORTING)
+        )
+
     async def start(self) -> None:
         if self.config.is_auto_shutdown_enabled and not self.on_idle_timeout:
             raise NoIdleTimeoutHandlerError(self.config.auto_shutdown_timeout)
 
+        await asyncio.to_thread(self.forkserver_manager.warm_up)
+
+        if self.worker_pool:
+            await self.worker_pool.start()
+
+        self.is_forkserver_ready = True
+        self.forkserver_coroutine = asyncio.create_task(self._monitor_forkserver_loop())
+        self.loop_stall_coroutine = asyncio.create_task(self._monitor_loop_stalls())
+
         headers = {"Authorization": f"Bearer {self.config.grant_token}"}
 
         while not self.is_shutting_down:
@@ -141,7 +219,9 @@ class TaskRunner:
             if not self.is_shutting_down:
                 self.websocket_connection = None
                 self.can_send_offers = False
-                await self._cancel_coroutine(self.offers_coroutine)
+                self.can_batch_print_args = False
+                await self.offer_manager.stop()
+                await self._cancel_coroutine(self.broker_rtt_coroutine)
                 await self._cancel_coroutine(self.idle_coroutine)
                 await asyncio.sleep(5)
 
@@ -159,16 +239,24 @@ class TaskRunner:
         self.is_shutting_down = True
         self.can_send_offers = False
 
-        await self._cancel_coroutine(self.offers_coroutine)
+        await self.offer_manager.stop()
+        await self._cancel_coroutine(self.broker_rtt_coroutine)
         await self._cancel_coroutine(self.idle_coroutine)
+        await self._cancel_coroutine(self.forkserver_coroutine)
+        await self._cancel_coroutine(self.loop_stall_coroutine)
 
         await self._wait_for_tasks()
         await self._terminate_tasks()
 
+        if self.worker_pool:
+            await self.worker_pool.stop()
+
         if self.websocket_connection:
             await self.websocket_connection.close()
             self.logger.info("Disconnected from broker")
 
+        self.serde_executor.shutdown(wait=False)
+
         self.logger.info("Runner stopped")
 
     async def _wait_for_tasks(self):
@@ -195,10 +283,13 @@ class TaskRunner:
 
         self.logger.warning(f"Terminating {self.running_tasks_count} tasks...")
 
+        while self.prefetched_tasks:
+            self._cancel_prefetched_task(self.prefetched_tasks[0])
+
         tasks_to_terminate = [
-            asyncio.to_thread(self.executor.stop_process, task_state.process)
+            ProcessSupervisor.stop_process(process)
             for task_state in self.running_tasks.values()
-            if task_state.process
+            for process in task_state.processes
         ]
 
         if tasks_to_terminate:
@@ -214,21 +305,30 @@ class TaskRunner:
         if self.websocket_connection is None:
             raise WebsocketConnectionError(self.task_broker_uri)
 
-        async for raw_message in self.websocket_connection:
+        while True:
             try:
-                message = self.serde.deserialize_broker_message(raw_message)
-                await self._handle_message(message)
+                raw_message, spool_memfd = await self._receive_message()
             except websockets.ConnectionClosedOK:
                 break
+
+            try:
+                message = await self._deserialize_message(raw_message)
+                if isinstance(message, BrokerTaskSettings):
+                    # the task owns the spool from here on
+                    message.settings.spool_memfd, spool_memfd = spool_memfd, None
+                await self._handle_message(message)
             except Exception as e:
                 self.logger.error(f"Error handling message: {e}")
+            finally:
+                if spool_memfd is not None:
+                    os.close(spool_memfd)
 
     async def _handle_message(self, message: BrokerMessage) -> None:
         match message:
             case BrokerInfoRequest():
                 await self._handle_info_request()
             case BrokerRunnerRegistered():
-                await self._handle_runner_registered()
+                await self._handle_runner_registered(message)
             case BrokerTaskOfferAccept():
                 await self._handle_task_offer_accept(message)
             case BrokerTaskSettings():
@@ -244,16 +344,20 @@ class TaskRunner:
         response = RunnerInfo(name=self.name, types=[TASK_TYPE_PYTHON])
         await self._send_message(response)
 
-    async def _handle_runner_registered(self) -> None:
+    async def _handle_runner_registered(self, message: BrokerRunnerRegistered) -> None:
+        self.can_batch_print_args = (
+            RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD in message.rpc_methods
+        )
+        await self._ensure_forkserver_running()
         self.can_send_offers = True
-        self.offers_coroutine = asyncio.create_task(self._send_offers_loop())
+        self.offer_manager.start()
+        self.broker_rtt_coroutine = asyncio.create_task(self._measure_broker_rtt())
         self.logger.info("Registered with broker")
         self._reset_idle_timer()
 
     async def _handle_task_offer_accept(self, message: BrokerTaskOfferAccept) -> None:
-        offer = self.open_offers.get(message.offer_id)
-
-        if offer is None or offer.has_expired:
+        if not self.offer_manager.accept(message.offer_id):
+            self.offer_manager.replenish()
             response = RunnerTaskRejected(
                 task_id=message.task_id,
                 reason=TASK_REJECTED_REASON_OFFER_EXPIRED,
@@ -261,7 +365,9 @@ class TaskRunner:
             await self._send_message(response)
             return
 
-        if self.running_tasks_count >= self.config.max_concurrency:
+        capacity = self.config.max_concurrency + self.config.prefetch_depth
+        if self.occupied_slots_count >= capacity:
+            self.offer_manager.replenish()
             response = RunnerTaskRejected(
                 task_id=message.task_id,
                 reason=TASK_REJECTED_REASON_AT_CAPACITY,
@@ -269,8 +375,6 @@ class TaskRunner:
             await self._send_message(response)
             return
 
-        del self.open_offers[message.offer_id]
-
         task_state = TaskState(message.task_id)
         self.running_tasks[message.task_id] = task_state
 
@@ -282,9 +386,11 @@ class TaskRunner:
     async def _handle_task_settings(self, message: BrokerTaskSettings) -> None:
         task_state = self.running_tasks.get(message.task_id)
         if task_state is None:
+            self._close_spool(message.settings)
             raise TaskMissingError(message.task_id)
 
         if task_state.status != TaskStatus.WAITING_FOR_SETTINGS:
+            self._close_spool(message.settings)
             self.logger.warning(
                 f"Received settings for task but it is already {task_state.status}. Discarding message."
             )
@@ -295,9 +401,18 @@ class TaskRunner:
         task_state.node_name = message.settings.node_name
         task_state.node_id = message.settings.node_id
 
-        task_state.status = TaskStatus.RUNNING
+        if self.prefetched_tasks or (
+            self.executing_slots_count >= self.config.max_concurrency
+        ):
+            task_state.status = TaskStatus.PREFETCHED
+            task_state.slot_granted = asyncio.get_running_loop().create_future()
+            self.prefetched_tasks.append(task_state)
+            self.logger.info(LOG_TASK_PREFETCHED.format(task_id=message.task_id))
+        else:
+            task_state.status = TaskStatus.RUNNING
+            self.logger.info(f"Received task {message.task_id}")
+
         asyncio.create_task(self._execute_task(message.task_id, message.settings))
-        self.logger.info(f"Received task {message.task_id}")
 
     async def _execute_task(self, task_id: str, task_settings: TaskSettings) -> None:
         start_time = time.time()
@@ -310,31 +425,61 @@ class TaskRunner:
 
             self.analyzer.validate(task_settings.code)
 
-            process, read_conn, write_conn = self.executor.create_process(
-                code=task_settings.code,
-                node_mode=task_settings.node_mode,
-                items=task_settings.items,
-                security_config=self.security_config,
-            )
+            try:
+                code = self.analyzer.compile(
+                    task_settings.code, task_settings.node_mode
+                )
+            except (SyntaxError, ValueError) as e:
+                # fails as user code, as when compiled in the subprocess
+                if not task_settings.continue_on_fail:
+                    raise TaskRuntimeError(
+                        {
+                            "message": str(e),
+                            "description": "",
+                            "stack": traceback.format_exc(),
+                            "stderr": "",
+                        }
+                    )
+                result = self.executor.error_result(e)
+                await self._send_message(RunnerTaskDone(task_id=task_id, result=result))
+                return
 
-            task_state.process = process
+            await self._wait_for_slot(task_state)
+            shards = await self._get_shards(task_settings)
+            self._raise_if_cancelled(task_state)
 
-            result, print_args, result_size_bytes = await asyncio.to_thread(
-                self.executor.execute_process,
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=self.config.task_timeout,
-                pipe_reader_timeout=self.config.pipe_reader_timeout,
-                continue_on_fail=task_settings.continue_on_fail,
+            print_forwarder = PrintForwarder(
+                lambda batch: self._send_print_args(task_id, batch)
             )
+            task_state.print_forwarder = print_forwarder
 
-            for print_args_per_call in print_args:
-                await self._send_rpc_message(
-                    task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args_per_call
-                )
+            try:
+                if len(shards) > 1:
+                    (
+                        result,
+                        print_args,
+                        result_size_bytes,
+                    ) = await self._execute_in_shards(
+                        task_state, task_settings, code, shards
+                    )
+                else:
+                    result, print_args, result_size_bytes = await self._execute_items(
+                        task_state,
+                        task_settings,
+                        code,
+                        task_settings.items,
+                        item_offset=0,
+                        continue_on_fail=task_settings.continue_on_fail,
+                    )
+
+                # output not streamed, i.e. the truncation notice
+                for print_args_per_call in print_args:
+                    print_forwarder.add(print_args_per_call)
+            finally:
+                # output streamed so far goes out before the result or error
+                await print_forwarder.close()
 
-            response = RunnerTaskDone(task_id=task_id, data={"result": result})
+            response = RunnerTaskDone(task_id=task_id, result=result)
             await self._send_message(response)
 
             self.logger.info(
@@ -366,9 +511,152 @@ class TaskRunner:
             await self._send_message(response)
 
         finally:
-            self.running_tasks.pop(task_id, None)
+            self._close_spool(task_settings)
+            task_state = self.running_tasks.pop(task_id, None)
+            if task_state is not None:
+                self._dequeue_prefetched_task(task_state)
+            self._start_prefetched_tasks()
+            self.offer_manager.replenish()
             self._reset_idle_timer()
 
+    # ========== Prefetch ==========
+
+    async def _wait_for_slot(self, task_state: TaskState) -> None:
+        """Hold a prefetched task until a slot is free. The task timeout starts once
+        the task executes, so waiting ends only with a slot or a cancellation."""
+
+        if task_state.slot_granted is None:
+            return
+
+        try:
+            await task_state.slot_granted
+        finally:
+            self._dequeue_prefetched_task(task_state)
+
+        self._raise_if_cancelled(task_state)
+
+    def _start_prefetched_tasks(self) -> None:
+        """Start prefetched tasks in the order received, while slots are free."""
+
+        while (
+            self.prefetched_tasks
+            and self.executing_slots_count < self.config.max_concurrency
+        ):
+            task_state = self.prefetched_tasks.popleft()
+            task_state.status = TaskStatus.RUNNING
+            assert task_state.slot_granted is not None  # set while prefetched
+            task_state.slot_granted.set_result(None)
+
+    def _cancel_prefetched_task(self, task_state: TaskState) -> None:
+        """Wake a prefetched task to fail as cancelled, without starting it."""
+
+        self.prefetched_tasks.remove(task_state)
+        task_state.status = TaskStatus.ABORTING
+        assert task_state.slot_granted is not None  # set while prefetched
+        task_state.slot_granted.set_result(None)
+
+    def _dequeue_prefetched_task(self, task_state: TaskState) -> None:
+        """Take a task that stopped waiting for a slot, e.g. on timeout or failed
+        validation, out of the ready queue."""
+
+        if task_state.status == TaskStatus.PREFETCHED:
+            self.prefetched_tasks.remove(task_state)
+            task_state.status = TaskStatus.ABORTING
+
+    async def _execute_items(
+        self,
+        task_state: TaskState,
+        task_settings: TaskSettings,
+        code: bytes,
+        items: RawItems,
+        item_offset: int,
+        continue_on_fail: bool,
+        stream_prints: bool = True,
+    ) -> tuple[RawItems, PrintArgs, int]:
+        """Run items in a subprocess. With `stream_prints`, `print()` output goes to
+        the task's forwarder as it happens, else it is returned with the result."""
+
+        # a shard may start after the task was cancelled
+        self._raise_if_cancelled(task_state)
+
+        if items is task_settings.items and task_settings.spool_memfd is not None:
+            # the subprocess decodes the items from the spooled message
+            items_memfd = os.dup(task_settings.spool_memfd)
+        else:
+            items_memfd = self.executor.spill_items(
+                items, self.config.items_spill_threshold
+            )
+
+        on_print = self._create_print_callback(task_state) if stream_prints else None
+
+        if self.worker_pool:
+            try:
+                worker = await self.worker_pool.acquire(task_settings.workflow_id)
+            except Exception:
+                if items_memfd is not None:
+                    os.close(items_memfd)
+                raise
+
+            if task_state.status == TaskStatus.ABORTING:
+                # cancelled while the worker was acquired, so never sent the task
+                if items_memfd is not None:
+                    os.close(items_memfd)
+                await self.worker_pool.release(worker)
+                raise TaskCancelledError()
+
+            task_state.processes.append(worker.process)
+
+            return await self.worker_pool.execute_task(
+                worker=worker,
+                code=code,
+                node_mode=task_settings.node_mode,
+                items=items,
+                task_timeout=self.config.task_timeout,
+                continue_on_fail=continue_on_fail,
+                item_offset=item_offset,
+                items_memfd=items_memfd,
+                on_print=on_print,
+            )
+
+        process, read_conn, write_conn = self.executor.create_process(
+            code=code,
+            node_mode=task_settings.node_mode,
+            items=items,
+            security_config=self.security_config,
+            subprocess_config=self.subprocess_config,
+            item_offset=item_offset,
+            items_memfd=items_memfd,
+        )
+
+        task_state.processes.append(process)
+
+        return await self.executor.execute_process(
+            pipe_reader=self.pipe_reader,
+            process=process,
+            read_conn=read_conn,
+            write_conn=write_conn,
+            task_timeout=self.config.task_timeout,
+            continue_on_fail=continue_on_fail,
+            on_print=on_print,
+        )
+
+    @staticmethod
+    def _raise_if_cancelled(task_state: TaskState) -> None:
+        """Fail a task that was cancelled while awaiting, as no subprocess of it
+        was running to be stopped."""
+
+        if task_state.status == TaskStatus.ABORTING:
+            raise TaskCancelledError()
+
+    def _create_print_callback(self, task_state: TaskState) -> PrintCallback | None:
+        """Hand `print()` output, read on the event loop, to the task's forwarder."""
+
+        print_forwarder = task_state.print_forwarder
+        if print_forwarder is None:
+            return None
+
+        return print_forwarder.add
+
     async def _handle_task_cancel(self, message: BrokerTaskCancel) -> None:
         task_id = message.task_id
         task_state = self.running_tasks.get(task_id)
@@ -380,16 +668,41 @@ class TaskRunner:
         if task_state.status == TaskStatus.WAITING_FOR_SETTINGS:
             self.running_tasks.pop(task_id, None)
             self.logger.info(LOG_TASK_CANCEL_WAITING.format(task_id=task_id))
-            await self._send_offers()
+            self.offer_manager.replenish()
+            return
+
+        if task_state.status == TaskStatus.PREFETCHED:
+            self._cancel_prefetched_task(task_state)
+            self.logger.info(LOG_TASK_CANCEL_PREFETCHED.format(task_id=task_id))
             return
 
         if task_state.status == TaskStatus.RUNNING:
             task_state.status = TaskStatus.ABORTING
-            await asyncio.to_thread(self.executor.stop_process, task_state.process)
+            await asyncio.gather(
+                *(
+                    ProcessSupervisor.stop_process(process)
+                    for process in task_state.processes
+                )
+            )
             self.logger.info(
                 LOG_TASK_CANCEL.format(task_id=task_id, **task_state.context())
             )
 
+    async def _send_print_args(self, task_id: str, print_args: PrintArgs) -> None:
+        """Send the args to `print()` calls in one RPC call, or one per `print()`
+        call if the broker does not support batches."""
+
+        if self.can_batch_print_args:
+            await self._send_rpc_message(
+                task_id, RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD, print_args
+            )
+            return
+
+        for print_args_per_call in print_args:
+            await self._send_rpc_message(
+                task_id, RPC_BROWSER_CONSOLE_LOG_METHOD, print_args_per_call
+            )
+
     async def _send_rpc_message(self, task_id: str, method_name: str, params: list):
         message = RunnerRpcCall(
             call_id=nanoid(), task_id=task_id, name=method_name, params=params
@@ -401,8 +714,224 @@ class TaskRunner:
         if self.websocket_connection is None:
             raise WebsocketConnectionError(self.task_broker_uri)
 
+        chunk_size = self.config.result_chunk_size
+
+        if isinstance(message, RunnerTaskDone) and len(message.result) > chunk_size:
+            # fragmented, so that the result is never copied in full, and sent
+            # with the event loop yielded between fragments
+            fragments = self.serde.serialize_task_done_in_fragments(message, chunk_size)
+            await self.websocket_connection.send(fragments, text=True)
+            return
+
         serialized = self.serde.serialize_runner_message(message)
-        await self.websocket_connection.send(serialized)
+        await self.websocket_connection.send(serialized, text=True)
+
+    # ========== Spooling ==========
+
+    async def _receive_message(self) -> tuple[bytes | mmap.mmap, int | None]:
+        """Receive a message fragment by fragment, spooling it to a memfd once it
+        reaches the spool threshold, instead of reassembling it in memory.
+
+        This bounds peak memory only for fragmented messages. A message sent in a
+        single frame is held in full by the websocket connection before it can be
+        spooled, so memory briefly peaks at twice its size, until the frame is
+        released once copied. The task then holds only the memfd.
+
+        Returns the message, as a read-only mapping if spooled, and the sealed
+        memfd it was spooled to, if any, which the caller must close.
+        """
+
+        if self.websocket_connection is None:
+            raise WebsocketConnectionError(self.task_broker_uri)
+
+        threshold = self.config.message_spool_threshold
+        fragments: list[bytes] = []
+        size = 0
+        spool_memfd: int | None = None
+
+        try:
+            # undecoded, so that task settings items can stay raw JSON
+            async for fragment in self.websocket_connection.recv_streaming(
+                decode=False
+            ):
+                size += len(fragment)
+
+                if spool_memfd is not None:
+                    await asyncio.to_thread(memfd_utils.write, spool_memfd, fragment)
+                    continue
+
+                fragments.append(fragment)
+
+                if threshold and size >= threshold and memfd_utils.is_supported():
+                    spool_memfd = memfd_utils.create()
+                    await asyncio.to_thread(
+                        self._write_fragments, spool_memfd, fragments
+                    )
+                    fragments = []
+
+            if spool_memfd is None:
+                return b"".join(fragments), None
+
+            memfd_utils.seal(spool_memfd)
+            return memfd_utils.map_readonly(spool_memfd, size), spool_memfd
+
+        except BaseException:
+            if spool_memfd is not None:
+                os.close(spool_memfd)
+            raise
+
+    @staticmethod
+    def _write_fragments(memfd: int, fragments: list[bytes]) -> None:
+        for fragment in fragments:
+            memfd_utils.write(memfd, fragment)
+
+    def _close_spool(self, task_settings: TaskSettings) -> None:
+        if task_settings.spool_memfd is not None:
+            os.close(task_settings.spool_memfd)
+            task_settings.spool_memfd = None
+
+    # ========== Serde ==========
+
+    async def _deserialize_message(
+        self, raw_message: bytes | mmap.mmap
+    ) -> BrokerMessage:
+        if len(raw_message) < SERDE_OFFLOAD_THRESHOLD:
+            return self.serde.deserialize_broker_message(raw_message)
+
+        return await self._offload_serde(
+            self.serde.deserialize_broker_message, raw_message, len(raw_message)
+        )
+
+    async def _offload_serde(self, func: Callable[[Any], Any], arg: Any, size: int):
+        """Run a (de)serialization in the serde thread. The event loop is served
+        only while the thread yields the GIL, e.g. between the chunks in which raw
+        items are scanned, not while a message is decoded in full. The loop stall
+        monitor records how long the loop actually waited."""
+
+        def timed_func():
+            start_time = time.perf_counter()
+            result = func(arg)
+            return result, int((time.perf_counter() - start_time) * 1000)
+
+        loop = asyncio.get_running_loop()
+        result, duration_ms = await loop.run_in_executor(
+            self.serde_executor, timed_func
+        )
+
+        self.logger.debug(
+            LOG_SERDE_OFFLOADED.format(
+                size=self._get_result_size(size), duration=duration_ms
+            )
+        )
+
+        return result
+
+    # ========== Sharding ==========
+
+    async def _get_shards(self, task_settings: TaskSettings) -> list[Shard]:
+        """Split a per-item task into shards to run across subprocesses, limited by
+        free slots and cores. Items are decoded here only if the task may be sharded."""
+
+        unsharded = [(0, task_settings.items)]
+        threshold = self.config.per_item_shard_threshold
+
+        # every item takes at least three bytes, as in `{},`
+        if (
+            threshold == 0
+            or task_settings.node_mode != "per_item"
+            or len(task_settings.items) < threshold * 3
+        ):
+            return unsharded
+
+        # the task already holds one slot
+        free_slots = self.config.max_concurrency - self.occupied_slots_count
+        max_shards = min(1 + free_slots, os.process_cpu_count() or 1)
+
+        if max_shards <= 1:
+            return unsharded
+
+        shards = await asyncio.to_thread(
+            self._split_items, task_settings.items, max_shards, threshold
+        )
+
+        return shards or unsharded
+
+    @staticmethod
+    def _split_items(items: RawItems, max_shards: int, threshold: int) -> list[Shard]:
+        """Re-encode items as up to `max_shards` contiguous shards, keyed by the
+        index of their first item. Returns no shards below `threshold` items."""
+
+        decoded = json_codec.loads(items)
+
+        if len(decoded) < threshold:
+            return []
+
+        shard_size = math.ceil(len(decoded) / min(max_shards, len(decoded)))
+
+        return [
+            (offset, json_codec.dumps(decoded[offset : offset + shard_size]))
+            for offset in range(0, len(decoded), shard_size)
+        ]
+
+    async def _execute_in_shards(
+        self,
+        task_state: TaskState,
+        task_settings: TaskSettings,
+        code: bytes,
+        shards: list[Shard],
+    ) -> tuple[RawItems, PrintArgs, int]:
+        """Run the shards of a per-item task in parallel subprocesses and merge
+        their results in item order. Fails as a whole if any shard fails.
+
+        Only the first shard streams its `print()` output. The others return
+        theirs, to follow it in item order rather than interleave with it."""
+
+        task_state.slots = len(shards)
+
+        try:
+            shard_results = await asyncio.gather(
+                *(
+                    self._execute_items(
+                        task_state,
+                        task_settings,
+                        code,
+                        shard_items,
+                        item_offset=offset,
+                        continue_on_fail=False,
+                        stream_prints=index == 0,
+                    )
+                    for index, (offset, shard_items) in enumerate(shards)
+                )
+            )
+        except Exception as e:
+            await asyncio.gather(
+                *(
+                    ProcessSupervisor.stop_process(process)
+                    for process in task_state.processes
+                )
+            )
+            if task_settings.continue_on_fail and not isinstance(e, TaskCancelledError):
+                return self.executor.error_result(e), [], 0
+            raise
+
+        # splice the JSON arrays of all shards into one, without decoding them
+        result_parts: list[RawItems] = [b"["]
+        print_args: PrintArgs = []
+        result_size_bytes = 0
+
+        for shard_result, shard_print_args, shard_size_bytes in shard_results:
+            shard_items = memoryview(shard_result)[1:-1]
+            if shard_items.nbytes > 0:
+                if len(result_parts) > 1:
+                    result_parts.append(b", ")
+                result_parts.append(shard_items)
+            print_args.extend(shard_print_args)
+            result_size_bytes += shard_size_bytes
+
+        result_parts.append(b"]")
+        result = b"".join(result_parts)
+
+        return result, print_args, result_size_bytes
 
     # ========== Formatting ==========
 
@@ -427,49 +956,92 @@ class TaskRunner:
 
     # ========== Offers ==========
 
-    async def _send_offers_loop(self) -> None:
-        while self.can_send_offers:
+    def _get_wanted_offers(self) -> int:
+        if not self.can_send_offers or not self.is_forkserver_ready:
+            return 0
+
+        capacity = self.config.max_concurrency + self.config.prefetch_depth
+
+        return capacity - self.occupied_slots_count
+
+    async def _measure_broker_rtt(self) -> None:
+        """Track the broker's round-trip time, as measured by the keepalive pings of
+        the websocket connection, so that offers allow for it."""
+
+        last_rtt = 0.0  # latency before the first pong
+
+        while not self.is_shutting_down:
             try:
-                await self._send_offers()
-                await asyncio.sleep(OFFER_INTERVAL)
+                await asyncio.sleep(BROKER_RTT_POLL_INTERVAL)
+
+                if self.websocket_connection is None:
+                    break
+
+                # unchanged until the next pong, so a ping that times out,
+                # closing the connection, adds no sample
+                rtt = self.websocket_connection.latency
+                if rtt == last_rtt:
+                    continue
+
+                last_rtt = rtt
+                self.offer_manager.add_broker_rtt(rtt)
+                self.logger.debug(
+                    LOG_BROKER_RTT.format(
+                        rtt=int(rtt * 1000),
+                        validity=self.offer_manager.offer_validity_ms,
+                        buffer=self.offer_manager.latency_buffer_ms,
+                    )
+                )
             except asyncio.CancelledError:
                 break
             except Exception as e:
-                self.logger.error(f"Error sending offers: {e}")
+                self.logger.warning(f"Error measuring broker round-trip time: {e}")
 
-    async def _send_offers(self) -> None:
-        if not self.can_send_offers:
-            return
+    # ========== Forkserver ==========
 
-        expired_offer_ids = [
-            offer_id
-            for offer_id, offer in self.open_offers.items()
-            if offer.has_expired
-        ]
+    async def _monitor_forkserver_loop(self) -> None:
+        while not self.is_shutting_down:
+            try:
+                await asyncio.sleep(FORKSERVER_CHECK_INTERVAL)
+                await self._ensure_forkserver_running()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.logger.error(f"Error checking forkserver: {e}")
 
-        for offer_id in expired_offer_ids:
-            self.open_offers.pop(offer_id, None)
+    async def _ensure_forkserver_running(self) -> None:
+        """Restart a dead forkserver before the next task needs it, holding back offers meanwhile."""
 
-        offers_to_send = self.config.max_concurrency - (
-            len(self.open_offers) + self.running_tasks_count
-        )
+        if self.forkserver_manager.is_running():
+            return
 
-        for _ in range(offers_to_send):
-            offer_id = nanoid()
+        self.is_forkserver_ready = False
+        try:
+            await asyncio.to_thread(self.forkserver_manager.ensure_running)
+        finally:
+            self.is_forkserver_ready = True
+            self.offer_manager.replenish()
 
-            valid_for_ms = OFFER_VALIDITY + random.randint(0, OFFER_VALIDITY_MAX_JITTER)
+    # ========== Loop stalls ==========
 
-            valid_until = (
-                time.time() + (valid_for_ms / 1000) + OFFER_VALIDITY_LATENCY_BUFFER
-            )
+    async def _monitor_loop_stalls(self) -> None:
+        """Track how late the event loop wakes up, i.e. how long it was blocked."""
 
-            self.open_offers[offer_id] = TaskOffer(offer_id, valid_until)
+        loop = asyncio.get_running_loop()
 
-            message = RunnerTaskOffer(
-                offer_id=offer_id, task_type=TASK_TYPE_PYTHON, valid_for=valid_for_ms
-            )
+        while not self.is_shutting_down:
+            start_time = loop.time()
+            try:
+                await asyncio.sleep(LOOP_STALL_CHECK_INTERVAL)
+            except asyncio.CancelledError:
+                break
+
+            stall = loop.time() - start_time - LOOP_STALL_CHECK_INTERVAL
+            stall_ms = int(stall * 1000)
+            self.max_loop_stall_ms = max(self.max_loop_stall_ms, stall_ms)
 
-            await self._send_message(message)
+            if stall >= LOOP_STALL_WARNING_THRESHOLD:
+                self.logger.warning(LOG_LOOP_STALL.format(duration=stall_ms))
 
     # ========== Inactivity ==========
 
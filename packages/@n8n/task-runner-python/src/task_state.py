@@ -1,10 +1,14 @@
+import asyncio
 from enum import Enum
 from dataclasses import dataclass
 from multiprocessing.context import ForkServerProcess
 
+from src.print_forwarder import PrintForwarder
+
 
 class TaskStatus(Enum):
     WAITING_FOR_SETTINGS = "waiting_for_settings"
+    PREFETCHED = "prefetched"
     RUNNING = "running"
     ABORTING = "aborting"
 
@@ -13,7 +17,10 @@ class TaskStatus(Enum):
 class TaskState:
     task_id: str
     status: TaskStatus
-    process: ForkServerProcess | None = None
+    processes: list[ForkServerProcess]
+    slots: int = 1  # concurrency slots held, more than one when sharded
+    print_forwarder: PrintForwarder | None = None
+    slot_granted: asyncio.Future[None] | None = None  # set while prefetched
     workflow_name: str | None = None
     workflow_id: str | None = None
     node_name: str | None = None
@@ -22,7 +29,10 @@ class TaskState:
     def __init__(self, task_id: str):
         self.task_id = task_id
         self.status = TaskStatus.WAITING_FOR_SETTINGS
-        self.process = None
+        self.processes = []
+        self.slots = 1
+        self.print_forwarder = None
+        self.slot_granted = None
         self.workflow_name = None
         self.workflow_id = None
         self.node_name = None
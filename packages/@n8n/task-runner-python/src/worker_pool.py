@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from multiprocessing.context import ForkServerProcess
+
+from src import memfd as memfd_utils
+from src.config.security_config import SecurityConfig
+from src.config.subprocess_config import SubprocessConfig
+from src.constants import (
+    WORKER_POOL_READY_TIMEOUT,
+    WORKER_POOL_RETIRE_TIMEOUT,
+    WORKER_POOL_RSS_REPORT_TIMEOUT,
+)
+from src.errors import (
+    TaskOutputTooLargeError,
+    TaskResultMissingError,
+    TaskResultReadError,
+    TaskSubprocessFailedError,
+    TaskTimeoutError,
+)
+from src.message_types.broker import NodeMode
+from src.message_types.pipe import PrintArgs, PrintCallback, RawItems
+from src.pipe_reader import PipeReader
+from src.process_supervisor import ProcessSupervisor
+from src.task_executor import MULTIPROCESSING_CONTEXT, PipeConnection, TaskExecutor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolWorker:
+    process: ForkServerProcess
+    task_conn: (
+        PipeConnection  # runner sends tasks, worker reports readiness and peak RSS
+    )
+    read_conn: PipeConnection  # worker writes pipe messages
+    workflow_id: str | None = None  # of the tasks it runs, None until the first
+    tasks_run: int = 0
+    retire: bool = False
+
+
+class WorkerPool:
+    """Keeps sandboxed subprocesses alive across tasks, so that tasks skip the
+    per-task fork and sandbox setup.
+
+    A worker is recycled after `max_tasks` tasks, once its peak RSS exceeds
+    `max_rss` bytes (0 to disable), or after any error, timeout or cancellation.
+
+    Workers restore module state after each task, but a task can still leave
+    data in objects that modules refer to. So a worker only runs tasks of the
+    workflow it first ran a task of.
+
+    Must be used on the event loop thread, where workers are awaited without
+    blocking it.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        security_config: SecurityConfig,
+        subprocess_config: SubprocessConfig,
+        pipe_reader: PipeReader,
+        max_tasks: int,
+        max_rss: int,
+    ):
+        self.size = size
+        self.security_config = security_config
+        self.subprocess_config = subprocess_config
+        self.pipe_reader = pipe_reader
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self._idle_workers: list[PoolWorker] = []
+        self._is_stopped = False
+
+    async def start(self) -> None:
+        """Spawn workers up to pool size, so the first tasks find them warm."""
+
+        self._is_stopped = False
+        missing = self.size - len(self._idle_workers)
+
+        workers = [self._spawn_worker() for _ in range(missing)]
+        is_ready = await asyncio.gather(
+            *(self._wait_until_ready(worker) for worker in workers)
+        )
+
+        for worker, worker_is_ready in zip(workers, is_ready):
+            if worker_is_ready:
+                self._idle_workers.append(worker)
+            else:
+                await self._retire_worker(worker)
+
+        logger.info(f"Worker pool started with {self.size} workers")
+
+    async def stop(self) -> None:
+        self._is_stopped = True
+        workers = self._idle_workers
+        self._idle_workers = []
+
+        await asyncio.gather(*(self._retire_worker(worker) for worker in workers))
+
+    async def acquire(self, workflow_id: str) -> PoolWorker:
+        """Take an idle worker for a task of `workflow_id`, spawning a new one if
+        none is available. A new worker replaces an idle one of another workflow."""
+
+        while worker := self._take_idle_worker(workflow_id):
+            if worker.process.is_alive():
+                worker.workflow_id = workflow_id
+                return worker
+
+            await self._retire_worker(worker)
+
+        worker = self._spawn_worker()
+        worker.workflow_id = workflow_id
+
+        # least recently used, to keep the pool at its size
+        stale_workers = self._idle_workers[:1]
+        del self._idle_workers[:1]
+
+        is_ready, *_ = await asyncio.gather(
+            self._wait_until_ready(worker),
+            *(self._retire_worker(stale_worker) for stale_worker in stale_workers),
+        )
+
+        if not is_ready:
+            await self._retire_worker(worker)
+            raise TaskSubprocessFailedError(
+                -1 if worker.process.exitcode is None else worker.process.exitcode
+            )
+
+        return worker
+
+    def _take_idle_worker(self, workflow_id: str) -> PoolWorker | None:
+        """Take the most recently released idle worker of `workflow_id`, else one
+        that has not run a task yet."""
+
+        for wanted_workflow_id in (workflow_id, None):
+            for worker in reversed(self._idle_workers):
+                if worker.workflow_id == wanted_workflow_id:
+                    self._idle_workers.remove(worker)
+                    return worker
+
+        return None
+
+    async def execute_task(
+        self,
+        worker: PoolWorker,
+        code: bytes,
+        node_mode: NodeMode,
+        items: RawItems,
+        task_timeout: int,
+        continue_on_fail: bool,
+        item_offset: int = 0,
+        items_memfd: int | None = None,
+        on_print: PrintCallback | None = None,
+    ) -> tuple[RawItems, PrintArgs, int]:
+        """Execute a Python code task on a pooled worker, then release the worker.
+
+        `items_memfd` from `TaskExecutor.spill_items` replaces `items` and is closed here.
+        Other items are also handed over in a memfd, so that sending them to the
+        worker cannot block. `on_print` is called for each `print()` call as it happens.
+        """
+
+        print_args: PrintArgs = []
+
+        try:
+            try:
+                if items_memfd is None and memfd_utils.is_supported():
+                    items_memfd = memfd_utils.create_sealed(items)
+
+                if items_memfd is not None:
+                    TaskExecutor.send_items_memfd(worker.read_conn, items_memfd)
+                    items = None
+                else:
+                    items = bytes(items)  # views cannot be pickled
+                worker.task_conn.send((code, node_mode, items, item_offset))
+            except (OSError, ValueError) as e:
+                worker.retire = True
+                raise TaskSubprocessFailedError(-1, e) from e
+
+            worker.tasks_run += 1
+
+            try:
+                async with asyncio.timeout(task_timeout):
+                    pipe_message, message_size = await self.pipe_reader.read_message(
+                        worker.read_conn.fileno(), on_print
+                    )
+            except TimeoutError:
+                worker.retire = True
+                await ProcessSupervisor.stop_process(worker.process)
+                raise TaskTimeoutError(task_timeout)
+            except asyncio.CancelledError:
+                worker.retire = True  # still running the task
+                raise
+            except TaskOutputTooLargeError:
+                worker.retire = True
+                await ProcessSupervisor.stop_process(worker.process)
+                raise
+            except EOFError:
+                worker.retire = True
+                await ProcessSupervisor.wait_for_exit(worker.process)
+                TaskExecutor.raise_for_exit_code(worker.process)
+                raise TaskResultMissingError()
+            except Exception as e:
+                worker.retire = True
+                raise TaskResultReadError(e) from e
+
+            await self._check_recycle(worker)
+
+            print_args = pipe_message.get("print_args", [])
+
+            if "error" in pipe_message:
+                worker.retire = True
+
+            result = TaskExecutor.unpack_pipe_message(pipe_message)
+
+            return result, print_args, message_size
+
+        except Exception as e:
+            if continue_on_fail:
+                return TaskExecutor.error_result(e), print_args, 0
+            raise
+
+        finally:
+            await self.release(worker)
+
+    async def _check_recycle(self, worker: PoolWorker) -> None:
+        if worker.tasks_run >= self.max_tasks:
+            worker.retire = True
+
+        if not await ProcessSupervisor.wait_readable(
+            worker.task_conn.fileno(), WORKER_POOL_RSS_REPORT_TIMEOUT
+        ):
+            worker.retire = True
+            return
+
+        peak_rss = worker.task_conn.recv()
+        if self.max_rss and peak_rss > self.max_rss:
+            worker.retire = True
+
+    async def _wait_until_ready(self, worker: PoolWorker) -> bool:
+        """Wait for a spawned worker to finish entering the sandbox."""
+
+        try:
+            if not await ProcessSupervisor.wait_readable(
+                worker.task_conn.fileno(), WORKER_POOL_READY_TIMEOUT
+            ):
+                return False
+            worker.task_conn.recv()
+            return True
+        except (OSError, EOFError):
+            return False
+
+    async def release(self, worker: PoolWorker) -> None:
+        """Return a worker to the pool, or retire it if it cannot run another task."""
+
+        if not worker.retire and not self._is_stopped and worker.process.is_alive():
+            self._idle_workers.append(worker)
+            return
+
+        await self._retire_worker(worker)
+
+    def _spawn_worker(self) -> PoolWorker:
+        task_conn, worker_task_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=True)
+        read_conn, write_conn = MULTIPROCESSING_CONTEXT.Pipe(duplex=True)
+        os.set_blocking(read_conn.fileno(), False)
+
+        process = MULTIPROCESSING_CONTEXT.Process(
+            target=TaskExecutor._run_worker_process,
+            args=(
+                worker_task_conn,
+                write_conn,
+                self.security_config,
+                self.subprocess_config,
+            ),
+        )
+
+        try:
+            process.start()
+        except Exception as e:
+            task_conn.close()
+            read_conn.close()
+            raise TaskSubprocessFailedError(-1, e) from e
+        finally:
+            worker_task_conn.close()
+            write_conn.close()
+
+        return PoolWorker(process=process, task_conn=task_conn, read_conn=read_conn)
+
+    async def _retire_worker(self, worker: PoolWorker) -> None:
+        try:
+            if worker.process.is_alive():
+                worker.task_conn.send(None)
+                await ProcessSupervisor.wait_for_exit(
+                    worker.process, WORKER_POOL_RETIRE_TIMEOUT
+                )
+        except (OSError, ValueError):
+            pass  # worker already gone
+
+        await ProcessSupervisor.stop_process(worker.process)
+
+        worker.task_conn.close()
+        worker.read_conn.close()
@@ -1,10 +1,10 @@
 import asyncio
-import json
 from collections.abc import Callable
 from dataclasses import dataclass
 from typing import Any
 
 from aiohttp import web, web_ws
+from src import json_codec
 from src.nanoid import nanoid
 
 from tests.fixtures.test_constants import (
@@ -23,7 +23,8 @@ class ActiveTask:
 
 
 class LocalTaskBroker:
-    def __init__(self):
+    def __init__(self, rpc_methods: list[str] | None = None):
+        self.rpc_methods = rpc_methods
         self.port: int | None = None
         self.app = web.Application()
         self.runner: web.AppRunner | None = None
@@ -34,6 +35,7 @@ class LocalTaskBroker:
         self.active_tasks: dict[TaskId, ActiveTask] = {}
         self.task_settings: dict[TaskId, TaskSettings] = {}
         self.rpc_messages: dict[TaskId, list[dict]] = {}
+        self.used_offer_ids: set[str] = set()
         self.app.router.add_get(LOCAL_TASK_BROKER_WS_PATH, self.websocket_handler)
 
     async def start(self) -> None:
@@ -74,7 +76,7 @@ class LocalTaskBroker:
 
             async for message in ws:
                 if message.type == web_ws.WSMsgType.TEXT:
-                    json_message = json.loads(message.data)
+                    json_message = json_codec.loads(message.data)
                     self.received_messages.append(json_message)
                     await self._handle_message(connection_id, json_message)
         finally:
@@ -92,14 +94,15 @@ class LocalTaskBroker:
     async def _message_sender(self, connection_id: str, ws: web_ws.WebSocketResponse):
         while True:
             message = await self.pending_messages[connection_id].get()
-            await ws.send_str(json.dumps(message))
+            await ws.send_str(json_codec.dumps(message).decode())
 
     async def _handle_message(self, connection_id: str, message: WebsocketMessage):
         match message.get("type"):
             case "runner:info":
-                await self.send_to_connection(
-                    connection_id, {"type": "broker:runnerregistered"}
-                )
+                registered: WebsocketMessage = {"type": "broker:runnerregistered"}
+                if self.rpc_methods is not None:
+                    registered["rpcMethods"] = self.rpc_methods
+                await self.send_to_connection(connection_id, registered)
 
             case "runner:taskoffer":
                 pass  # Handled by send_task() which waits for them
@@ -142,9 +145,14 @@ class LocalTaskBroker:
         self.active_tasks[task_id] = ActiveTask(task_settings)
         self.task_settings[task_id] = task_settings
 
-        offer = await self.wait_for_msg("runner:taskoffer", timeout=2.0)
+        offer = await self.wait_for_msg(
+            "runner:taskoffer",
+            timeout=2.0,
+            predicate=lambda msg: msg.get("offerId") not in self.used_offer_ids,
+        )
 
         if offer:
+            self.used_offer_ids.add(offer["offerId"])
             accept = {
                 "type": "broker:taskofferaccept",
                 "taskId": task_id,
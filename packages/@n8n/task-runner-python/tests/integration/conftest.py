@@ -1,4 +1,8 @@
 import pytest_asyncio
+from src.constants import (
+    RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD,
+    RPC_BROWSER_CONSOLE_LOG_METHOD,
+)
 from src.message_types.broker import Items
 from src.message_serde import NODE_MODE_MAP
 
@@ -19,6 +23,14 @@ async def broker():
     await broker.stop()
 
 
+@pytest_asyncio.fixture
+async def broker_with_print_batching():
+    broker = LocalTaskBroker(rpc_methods=[RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD])
+    await broker.start()
+    yield broker
+    await broker.stop()
+
+
 @pytest_asyncio.fixture
 async def manager(broker):
     manager = TaskRunnerManager(task_broker_url=broker.get_url())
@@ -68,6 +80,53 @@ async def manager_with_env_access_allowed(broker):
     await manager.stop()
 
 
+@pytest_asyncio.fixture
+async def manager_with_worker_pool(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_WORKER_POOL_ENABLED": "true",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_with_small_result_chunks(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_RESULT_CHUNK_SIZE": "1024",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_with_message_spool(broker):
+    manager = TaskRunnerManager(
+        task_broker_url=broker.get_url(),
+        custom_env={
+            "N8N_RUNNERS_MESSAGE_SPOOL_THRESHOLD": "1024",
+        },
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+@pytest_asyncio.fixture
+async def manager_with_print_batching(broker_with_print_batching):
+    manager = TaskRunnerManager(task_broker_url=broker_with_print_batching.get_url())
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
 def create_task_settings(
     code: str,
     node_mode: str,
@@ -103,6 +162,8 @@ async def wait_for_task_error(
 def get_browser_console_msgs(broker: LocalTaskBroker, task_id: str) -> list[list[str]]:
     console_msgs = []
     for msg in broker.get_task_rpc_messages(task_id):
-        if msg.get("method") == "logNodeOutput":
+        if msg.get("method") == RPC_BROWSER_CONSOLE_LOG_METHOD:
             console_msgs.append(msg.get("params", []))
+        elif msg.get("method") == RPC_BROWSER_CONSOLE_LOG_BATCH_METHOD:
+            console_msgs.extend(msg.get("params", []))
     return console_msgs
@@ -435,3 +435,85 @@ async def test_env_accessible_when_allowed_per_item(
     for item in result["data"]["result"]:
         assert item["json"]["has_path"] is True
         assert item["json"]["env_count"] > 0
+
+
+# ========== worker pool ===========
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_consecutive_tasks(broker, manager_with_worker_pool):
+    for value in (1, 2):
+        task_id = nanoid()
+        items = [{"json": {"value": value}}]
+        code = "return {'doubled': _item['json']['value'] * 2}"
+        task_settings = create_task_settings(
+            code=code, node_mode="per_item", items=items
+        )
+        await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+        done_msg = await wait_for_task_done(broker, task_id)
+
+        assert done_msg["data"]["result"] == [
+            {"json": {"doubled": value * 2}, "pairedItem": {"item": 0}}
+        ]
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_recovers_after_cancel(broker, manager_with_worker_pool):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        import time
+        time.sleep(5)
+        return []
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+    await asyncio.sleep(0.3)
+    await broker.cancel_task(task_id, reason="Cancelled during execution")
+
+    error_msg = await wait_for_task_error(broker, task_id)
+    assert error_msg["taskId"] == task_id
+
+    task_id = nanoid()
+    task_settings = create_task_settings(
+        code="return [{'json': {'ok': True}}]", node_mode="all_items"
+    )
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [{"json": {"ok": True}}]
+
+
+# ========== results ===========
+
+
+@pytest.mark.asyncio
+async def test_large_result_is_sent_in_fragments(
+    broker, manager_with_small_result_chunks
+):
+    task_id = nanoid()
+    code = "return [{'json': {'index': i, 'text': '☃' * 100}} for i in range(500)]"
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [
+        {"json": {"index": i, "text": "☃" * 100}} for i in range(500)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_large_task_settings_are_spooled(broker, manager_with_message_spool):
+    task_id = nanoid()
+    items = [{"json": {"index": i, "text": "☃" * 100}} for i in range(100)]
+    code = "return [{'json': {'count': len(_items), 'last': _items[-1]['json']}}]"
+    task_settings = create_task_settings(code=code, node_mode="all_items", items=items)
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [
+        {"json": {"count": 100, "last": {"index": 99, "text": "☃" * 100}}}
+    ]
@@ -1,3 +1,4 @@
+import asyncio
 import textwrap
 
 import pytest
@@ -114,3 +115,59 @@ async def test_print_edge_cases(broker, manager):
     expected = ["世界", "🌍", "🚀", "你好", "[]", "{}"]
     for item in expected:
         assert item in all_output, f"Expected '{item}' not found in console output"
+
+
+@pytest.mark.asyncio
+async def test_print_is_forwarded_while_task_runs(broker, manager_with_stdlib_wildcard):
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        import time
+        print("started")
+        time.sleep(1)
+        return [{"printed": "ok"}]
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    for _ in range(10):
+        if get_browser_console_msgs(broker, task_id):
+            break
+        await asyncio.sleep(0.1)
+
+    assert get_browser_console_msgs(broker, task_id) == [["'started'"]]
+    assert not broker.get_messages_of_type("runner:taskdone")
+
+    done_msg = await wait_for_task_done(broker, task_id)
+
+    assert done_msg["data"]["result"] == [{"printed": "ok"}]
+    assert get_browser_console_msgs(broker, task_id) == [["'started'"]]
+
+
+@pytest.mark.asyncio
+async def test_prints_are_batched_when_broker_supports_it(
+    broker_with_print_batching, manager_with_print_batching
+):
+    broker = broker_with_print_batching
+    task_id = nanoid()
+    code = textwrap.dedent("""
+        for i in range(105):
+            print(i)
+        return [{"printed": "ok"}]
+    """)
+    task_settings = create_task_settings(code=code, node_mode="all_items")
+    await broker.send_task(task_id=task_id, task_settings=task_settings)
+
+    done_msg = await wait_for_task_done(broker, task_id, timeout=5.0)
+
+    assert done_msg["data"]["result"] == [{"printed": "ok"}]
+
+    rpc_msgs = broker.get_task_rpc_messages(task_id)
+    assert {msg["method"] for msg in rpc_msgs} == {"logNodeOutputBatch"}
+    assert len(rpc_msgs) < 10
+
+    msgs = get_browser_console_msgs(broker, task_id)
+    assert msgs == (
+        [[str(i)] for i in range(50)]
+        + [["[Output truncated - 5 more print statements (10 bytes)]"]]
+        + [[str(i)] for i in range(55, 105)]
+    )
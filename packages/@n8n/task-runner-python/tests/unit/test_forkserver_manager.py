@@ -0,0 +1,146 @@
+import json
+import multiprocessing.forkserver
+import os
+import signal
+import sys
+
+import pytest
+
+from src.config.security_config import SecurityConfig
+from src.config.subprocess_config import SubprocessConfig
+from src.config.task_runner_config import parse_preload
+from src.errors import ConfigurationError
+from src.forkserver_manager import ForkserverManager
+from src.pipe_reader import PipeReader
+from src.task_analyzer import TaskAnalyzer
+from src.task_executor import MULTIPROCESSING_CONTEXT, TaskExecutor
+
+
+@pytest.fixture
+def fresh_forkserver():
+    # preload only applies to a forkserver started after it is configured
+    multiprocessing.forkserver._forkserver._stop()
+    yield
+    multiprocessing.forkserver._forkserver._stop()
+    MULTIPROCESSING_CONTEXT.set_forkserver_preload(["__main__"])
+
+
+class TestForkserverPreload:
+    def test_preload_reports_modules_that_failed_to_import(self, fresh_forkserver):
+        manager = ForkserverManager({"json", "nonexistent_module_xyz"})
+        manager.configure()
+
+        manager.warm_up()
+
+        assert manager.failed_modules == ["nonexistent_module_xyz"]
+
+    def test_preload_does_not_import_modules_into_runner(self, fresh_forkserver):
+        manager = ForkserverManager({"tomllib"})
+        sys.modules.pop("tomllib", None)
+        manager.configure()
+
+        manager.warm_up()
+
+        assert manager.failed_modules == []
+        assert "tomllib" not in sys.modules
+
+    @pytest.mark.asyncio
+    async def test_keeps_dependencies_of_preloaded_packages(
+        self, fresh_forkserver, tmp_path, monkeypatch
+    ):
+        (tmp_path / "pkgdep.py").write_text("")
+        (tmp_path / "pkga.py").write_text(
+            "import pkgdep as dep\n"
+            "def lazy_dep():\n"
+            "    import pkgdep\n"
+            "    return pkgdep\n"
+        )
+        # the forkserver imports preloaded modules from its own path
+        monkeypatch.setenv(
+            "PYTHONPATH",
+            os.pathsep.join([str(tmp_path), os.environ.get("PYTHONPATH", "")]),
+        )
+        manager = ForkserverManager({"pkga"})
+        manager.configure()
+        manager.warm_up()
+
+        assert manager.failed_modules == []
+
+        security_config = SecurityConfig(
+            stdlib_allow=set(),
+            external_allow={"pkga"},
+            builtins_deny=set(),
+            runner_env_deny=True,
+        )
+        code = TaskAnalyzer(security_config).compile(
+            "import pkga\nreturn [{'json': {'same': pkga.lazy_dep() is pkga.dep}}]",
+            "all_items",
+        )
+        process, read_conn, write_conn = TaskExecutor.create_process(
+            code=code,
+            node_mode="all_items",
+            items=b"[]",
+            security_config=security_config,
+            subprocess_config=SubprocessConfig(
+                print_max_bytes=1024,
+                print_records_kept=10,
+                max_result_size=1024 * 1024,
+                compact_decode=False,
+            ),
+        )
+        result, _, _ = await TaskExecutor.execute_process(
+            pipe_reader=PipeReader(),
+            process=process,
+            read_conn=read_conn,
+            write_conn=write_conn,
+            task_timeout=5,
+            continue_on_fail=False,
+        )
+
+        assert json.loads(bytes(result)) == [{"json": {"same": True}}]
+
+
+class TestForkserverRestart:
+    def test_is_running_after_warm_up(self, fresh_forkserver):
+        manager = ForkserverManager(set())
+        manager.configure()
+
+        manager.warm_up()
+
+        assert ForkserverManager.is_running()
+        assert manager.warm_up_duration_ms is not None
+
+    def test_ensure_running_restarts_dead_forkserver(self, fresh_forkserver):
+        manager = ForkserverManager(set())
+        manager.configure()
+        manager.warm_up()
+        dead_pid = multiprocessing.forkserver._forkserver._forkserver_pid
+        os.kill(dead_pid, signal.SIGKILL)
+        os.waitid(os.P_PID, dead_pid, os.WEXITED | os.WNOWAIT)
+
+        assert not ForkserverManager.is_running()
+        assert manager.ensure_running() is True
+        assert ForkserverManager.is_running()
+        assert multiprocessing.forkserver._forkserver._forkserver_pid != dead_pid
+
+    def test_ensure_running_leaves_live_forkserver_alone(self, fresh_forkserver):
+        manager = ForkserverManager(set())
+        manager.configure()
+        manager.warm_up()
+
+        assert manager.ensure_running() is False
+
+
+class TestParsePreload:
+    def test_defaults_to_allowlists_without_wildcard(self):
+        assert parse_preload(None, {"json", "math"}, {"*"}) == {"json", "math"}
+
+    def test_empty_setting_disables_preload(self):
+        assert parse_preload("", {"json"}, {"pandas"}) == set()
+
+    def test_explicit_setting_overrides_allowlists(self):
+        assert parse_preload("numpy, pandas", {"json"}, set()) == {"numpy", "pandas"}
+
+    def test_wildcard_is_rejected(self):
+        with pytest.raises(ConfigurationError):
+            parse_preload("*", set(), set())
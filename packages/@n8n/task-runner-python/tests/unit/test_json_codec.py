@@ -0,0 +1,113 @@
+import datetime
+import enum
+import json
+import math
+from dataclasses import dataclass
+from unittest.mock import patch
+
+import pytest
+
+from src import json_codec
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+VALUE = {
+    "text": "☃ naïve",
+    "nested": [{"n": 1, "f": 1.5, "b": True, "none": None}],
+    "date": datetime.datetime(2024, 1, 2, 3, 4, 5),
+    "point": Point(1, 2),
+    "set": {1},
+    "enum": Color.RED,
+    "floats": [math.nan, math.inf, -math.inf],
+    "big": 2**70,
+    1: "int key",
+    None: "null key",
+}
+
+DECODE_CASES = [
+    '{"a": ["☃", 1], "b": {"c": null}}',
+    "[NaN, Infinity, -Infinity, 1e400]",
+    "[123456789012345678901234567890, -18446744073709551616]",
+    '{"a": 1, "a": 2}',
+    '["\\ud800", "\\u00e9"]',
+    "[-0, 1.0, 1e-400]",
+]
+
+
+def installed_backends() -> list[str]:
+    names = []
+    for name in json_codec.BACKENDS:
+        try:
+            json_codec.load_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+class TestDumps:
+    def test_matches_stdlib(self):
+        encoded = json_codec.dumps(VALUE)
+
+        assert isinstance(encoded, bytes)
+        assert b"\n" not in encoded
+        assert "☃ naïve".encode() in encoded
+        assert encoded.decode() == json.dumps(VALUE, default=str, ensure_ascii=False)
+
+
+class TestLoads:
+    @pytest.mark.parametrize("name", installed_backends())
+    @pytest.mark.parametrize("data", DECODE_CASES)
+    def test_backends_decode_like_stdlib(self, name, data):
+        with patch.object(json_codec, "_loads", json_codec.load_backend(name)):
+            decoded = json_codec.loads(data.encode())
+
+        # repr, as NaN is not equal to itself
+        assert repr(decoded) == repr(json.loads(data))
+
+    @pytest.mark.parametrize("name", installed_backends())
+    def test_backends_decode_all_input_types(self, name):
+        backend_loads = json_codec.load_backend(name)
+        data = '{"a": ["☃", 1]}'
+
+        for raw in (data, data.encode(), bytearray(data.encode())):
+            assert backend_loads(raw) == {"a": ["☃", 1]}
+        assert backend_loads(memoryview(data.encode())[:]) == {"a": ["☃", 1]}
+
+    @pytest.mark.parametrize("name", installed_backends())
+    def test_backends_raise_value_error_on_invalid_json(self, name):
+        with (
+            patch.object(json_codec, "_loads", json_codec.load_backend(name)),
+            pytest.raises(json.JSONDecodeError),
+        ):
+            json_codec.loads(b'{"a": ')
+
+
+class TestLoadsCompact:
+    def test_decodes_like_loads(self):
+        data = json.dumps([VALUE, {"a": ["x", 1, {"b": "y"}], "c": None}], default=str)
+
+        assert json_codec.loads_compact(data) == json_codec.loads(data)
+        assert json_codec.loads_compact(memoryview(data.encode())) == json.loads(data)
+
+    def test_shares_equal_short_strings(self):
+        long_text = "z" * (json_codec.MAX_SHARED_STR_LENGTH + 1)
+        items = [
+            {"json": {"status": "active", "tags": ["lead"], "text": long_text}}
+            for _ in range(3)
+        ]
+
+        first, second, _ = json_codec.loads_compact(json.dumps(items))
+
+        assert first["json"]["status"] is second["json"]["status"]
+        assert first["json"]["tags"][0] is second["json"]["tags"][0]
+        assert first["json"]["text"] is not second["json"]["text"]
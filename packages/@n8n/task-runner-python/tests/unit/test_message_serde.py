@@ -0,0 +1,153 @@
+import json
+
+from src.message_serde import MessageSerde
+from src.message_types import (
+    BrokerRunnerRegistered,
+    BrokerTaskSettings,
+    RunnerRpcCall,
+    RunnerTaskDone,
+    RunnerTaskOffer,
+)
+
+
+def create_task_settings_message(items, **extra_settings) -> bytes:
+    return json.dumps(
+        {
+            "type": "broker:tasksettings",
+            "taskId": "task-1",
+            "settings": {
+                "code": "return _items",
+                "nodeMode": "runOnceForAllItems",
+                "continueOnFail": False,
+                "items": items,
+                "nodeId": "node-1",
+                "nodeName": "Code [1]",
+                "workflowId": "wf-1",
+                "workflowName": "Workflow ]",
+                **extra_settings,
+            },
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+class TestDeserializeBrokerMessage:
+    def test_task_settings_items_stay_raw(self):
+        items = [{"json": {"a": "]", "b": [1, [2]]}}, {"json": {}}]
+        data = create_task_settings_message(items)
+
+        message = MessageSerde.deserialize_broker_message(data)
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert isinstance(message.settings.items, memoryview)
+        assert json.loads(bytes(message.settings.items)) == items
+        assert message.settings.node_name == "Code [1]"
+        assert message.settings.workflow_name == "Workflow ]"
+
+    def test_task_settings_items_with_nested_items_keys_stay_raw(self):
+        items = [{"json": {"items": [1]}}]
+        data = create_task_settings_message(items, extra={"items": [2]})
+
+        message = MessageSerde.deserialize_broker_message(data)
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert json.loads(bytes(message.settings.items)) == items
+
+    def test_task_settings_with_array_field_after_items_stay_raw(self):
+        items = [{"json": {"a": 1}}, [2]]
+        data = create_task_settings_message(items, extra=[3, ["]"]])
+
+        message = MessageSerde.deserialize_broker_message(data)
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert json.loads(bytes(message.settings.items)) == items
+        assert message.settings.node_name == "Code [1]"
+
+    def test_task_settings_with_unexpected_layout_are_decoded_in_full(self):
+        items = [{"json": {"a": 1}}]
+        message_dict = json.loads(create_task_settings_message(items))
+        data = json.dumps({"settings": message_dict.pop("settings"), **message_dict})
+
+        message = MessageSerde.deserialize_broker_message(data.encode())
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert json.loads(bytes(message.settings.items)) == items
+
+    def test_task_settings_from_str_are_encoded(self):
+        items = [{"json": {"a": 1}}]
+        data = create_task_settings_message(items).decode()
+
+        message = MessageSerde.deserialize_broker_message(data)
+
+        assert isinstance(message, BrokerTaskSettings)
+        assert json.loads(bytes(message.settings.items)) == items
+
+    def test_runner_registered_with_and_without_rpc_methods(self):
+        legacy = MessageSerde.deserialize_broker_message(
+            b'{"type": "broker:runnerregistered"}'
+        )
+        current = MessageSerde.deserialize_broker_message(
+            b'{"type": "broker:runnerregistered", "rpcMethods": ["logNodeOutputBatch"]}'
+        )
+
+        assert legacy == BrokerRunnerRegistered(rpc_methods=[])
+        assert current == BrokerRunnerRegistered(rpc_methods=["logNodeOutputBatch"])
+
+
+class TestSerializeRunnerMessage:
+    def test_task_done_splices_raw_result(self):
+        raw_result = memoryview(b'[{"json": {"a": "\\u2603 \\"q\\""}}]')
+
+        serialized = MessageSerde.serialize_runner_message(
+            RunnerTaskDone(task_id='task-"1"', result=raw_result)
+        )
+
+        assert isinstance(serialized, bytes)
+        assert json.loads(serialized) == {
+            "type": "runner:taskdone",
+            "taskId": 'task-"1"',
+            "data": {"result": [{"json": {"a": '☃ "q"'}}]},
+        }
+
+    def test_other_messages_are_camel_cased_json(self):
+        serialized = MessageSerde.serialize_runner_message(
+            RunnerTaskOffer(offer_id="o1", task_type="python", valid_for=5000)
+        )
+
+        assert json.loads(serialized) == {
+            "type": "runner:taskoffer",
+            "offerId": "o1",
+            "taskType": "python",
+            "validFor": 5000,
+        }
+
+    def test_payload_fields_are_encoded_as_is(self):
+        params = [["'hi'", {"nested": [1, 2]}]]
+
+        serialized = MessageSerde.serialize_runner_message(
+            RunnerRpcCall(call_id="c1", task_id="t1", name="log", params=params)
+        )
+
+        assert isinstance(serialized, bytes)
+        assert json.loads(serialized) == {
+            "type": "runner:rpc",
+            "callId": "c1",
+            "taskId": "t1",
+            "name": "log",
+            "params": params,
+        }
+
+    def test_task_done_fragments_are_views_into_result(self):
+        raw_result = b'[{"json": {"a": "' + b"x" * 100 + b'"}}]'
+
+        fragments = list(
+            MessageSerde.serialize_task_done_in_fragments(
+                RunnerTaskDone(task_id="t1", result=raw_result), fragment_size=32
+            )
+        )
+
+        assert all(len(fragment) <= 32 for fragment in fragments[1:-1])
+        assert all(isinstance(fragment, memoryview) for fragment in fragments[1:-1])
+        assert b"".join(fragments) == MessageSerde.serialize_runner_message(
+            RunnerTaskDone(task_id="t1", result=raw_result)
+        )
@@ -0,0 +1,154 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.config.offer_config import OfferConfig
+from src.offer_manager import OfferManager
+
+
+class Slots:
+    def __init__(self, free: int):
+        self.free = free
+        self.offers = []
+
+    async def send_offer(self, offer):
+        self.offers.append(offer)
+
+    def create_manager(self, config: OfferConfig | None = None) -> OfferManager:
+        config = config or OfferConfig(
+            validity_min=1000,
+            validity_max=5000,
+            latency_buffer_min=100,
+            latency_buffer_max=2000,
+        )
+        return OfferManager(lambda: self.free, self.send_offer, config)
+
+
+class TestOfferManager:
+    @pytest.mark.asyncio
+    async def test_offers_free_slots_at_once(self):
+        slots = Slots(free=3)
+        manager = slots.create_manager()
+
+        manager.start()
+        await asyncio.sleep(0.01)
+        await manager.stop()
+
+        assert len(slots.offers) == 3
+        assert len({offer.offer_id for offer in slots.offers}) == 3
+
+    @pytest.mark.asyncio
+    async def test_replenishes_when_slot_is_freed(self):
+        slots = Slots(free=1)
+        manager = slots.create_manager()
+        manager.start()
+        await asyncio.sleep(0.01)
+
+        assert manager.accept(slots.offers[0].offer_id)
+        slots.free = 0
+        await asyncio.sleep(0.01)
+
+        assert len(slots.offers) == 1
+
+        slots.free = 1
+        manager.replenish()
+        await asyncio.sleep(0.01)
+        await manager.stop()
+
+        assert len(slots.offers) == 2
+
+    @pytest.mark.asyncio
+    async def test_replaces_offers_when_they_expire(self):
+        slots = Slots(free=1)
+
+        config = OfferConfig(
+            validity_min=20, validity_max=20, latency_buffer_min=0, latency_buffer_max=0
+        )
+
+        with patch("src.offer_manager.OFFER_VALIDITY_MAX_JITTER_RATIO", 0):
+            manager = slots.create_manager(config)
+            manager.start()
+            await asyncio.sleep(0.1)
+            await manager.stop()
+
+        assert len(slots.offers) >= 3
+        assert manager.expired_count == len(slots.offers) - 1
+        assert manager.expired_ratio == 1.0
+
+    @pytest.mark.asyncio
+    async def test_rejects_unknown_and_expired_offers(self):
+        slots = Slots(free=1)
+        manager = slots.create_manager()
+        manager.start()
+        await asyncio.sleep(0.01)
+
+        offer_id = slots.offers[0].offer_id
+        manager.open_offers[offer_id].valid_until = 0
+
+        assert not manager.accept("unknown")
+        assert not manager.accept(offer_id)
+        await manager.stop()
+
+        assert manager.accepted_count == 0
+        assert manager.expired_count == 1
+
+    @pytest.mark.asyncio
+    async def test_tracks_offer_to_accept_latency(self):
+        slots = Slots(free=2)
+        manager = slots.create_manager()
+        manager.start()
+        await asyncio.sleep(0.01)
+
+        assert manager.get_accept_latency(50) is None
+
+        manager.accept(slots.offers[0].offer_id)
+        await asyncio.sleep(0.05)
+        manager.accept(slots.offers[1].offer_id)
+        await manager.stop()
+
+        assert manager.accepted_count == 2
+        assert manager.expired_ratio == 0.0
+        assert manager.get_accept_latency(0) < 0.05 <= manager.get_accept_latency(100)
+
+    @pytest.mark.asyncio
+    async def test_offer_validity_follows_accept_latency(self):
+        slots = Slots(free=2)
+        manager = slots.create_manager()
+
+        assert manager.offer_validity_ms == 5000
+
+        manager.start()
+        await asyncio.sleep(0.01)
+        manager.accept(slots.offers[0].offer_id)
+        await asyncio.sleep(0.01)
+
+        assert manager.offer_validity_ms == 1000  # clamped to the min
+
+        manager.open_offers[slots.offers[1].offer_id].sent_at -= 1.5
+        manager.accept(slots.offers[1].offer_id)
+        await manager.stop()
+
+        assert 3000 <= manager.offer_validity_ms < 3100
+
+        manager.start()
+        await asyncio.sleep(0.01)
+        await manager.stop()
+
+        assert slots.offers[-1].valid_for >= 3000
+
+    def test_latency_buffer_follows_broker_rtt(self):
+        manager = Slots(free=0).create_manager()
+
+        assert manager.latency_buffer_ms == 100
+        assert manager.get_broker_rtt(99) is None
+
+        manager.add_broker_rtt(0.01)
+        assert manager.latency_buffer_ms == 100  # clamped to the min
+
+        manager.add_broker_rtt(0.5)
+        assert manager.latency_buffer_ms == 500
+        assert manager.get_broker_rtt(0) == 0.01
+
+        manager.add_broker_rtt(10.0)
+        assert manager.latency_buffer_ms == 2000  # clamped to the max
@@ -0,0 +1,68 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.print_forwarder import PrintForwarder
+
+
+class TestPrintForwarder:
+    @pytest.mark.asyncio
+    async def test_forwards_calls_in_one_batch_per_interval(self):
+        batches = []
+
+        async def send_batch(batch):
+            batches.append(batch)
+
+        with patch("src.print_forwarder.PRINT_BATCH_INTERVAL", 0.05):
+            forwarder = PrintForwarder(send_batch)
+            forwarder.add(["'a'"])
+            forwarder.add(["'b'"])
+            await asyncio.sleep(0.2)
+
+            assert batches == [[["'a'"], ["'b'"]]]
+
+            forwarder.add(["'c'"])
+            await forwarder.close()
+
+        assert batches == [[["'a'"], ["'b'"]], [["'c'"]]]
+
+    @pytest.mark.asyncio
+    async def test_forwards_full_batch_without_waiting(self):
+        batches = []
+
+        async def send_batch(batch):
+            batches.append(batch)
+
+        with (
+            patch("src.print_forwarder.PRINT_BATCH_INTERVAL", 60),
+            patch("src.print_forwarder.PRINT_BATCH_MAX_CALLS", 2),
+        ):
+            forwarder = PrintForwarder(send_batch)
+            forwarder.add(["'a'"])
+            forwarder.add(["'b'"])
+            await asyncio.sleep(0.05)
+
+            assert batches == [[["'a'"], ["'b'"]]]
+
+            await forwarder.close()
+
+        assert len(batches) == 1
+
+    @pytest.mark.asyncio
+    async def test_send_failure_does_not_stop_forwarding(self):
+        batches = []
+
+        async def send_batch(batch):
+            batches.append(batch)
+            if len(batches) == 1:
+                raise ConnectionError("closed")
+
+        with patch("src.print_forwarder.PRINT_BATCH_MAX_CALLS", 1):
+            forwarder = PrintForwarder(send_batch)
+            forwarder.add(["'a'"])
+            await asyncio.sleep(0.05)
+            forwarder.add(["'b'"])
+            await forwarder.close()
+
+        assert batches == [[["'a'"]], [["'b'"]]]
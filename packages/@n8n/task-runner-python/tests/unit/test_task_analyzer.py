@@ -1,9 +1,19 @@
+import marshal
+from collections import OrderedDict
+from unittest.mock import patch
+
 import pytest
 
 from src.errors.security_violation_error import SecurityViolationError
 from src.task_analyzer import TaskAnalyzer
 from src.config.security_config import SecurityConfig
-from src.constants import BLOCKED_ATTRIBUTES, BLOCKED_NAMES
+from src.constants import (
+    BLOCKED_ATTRIBUTES,
+    BLOCKED_NAMES,
+    EXECUTOR_ALL_ITEMS_FILENAME,
+    EXECUTOR_PER_ITEM_FILENAME,
+    EXECUTOR_USER_OUTPUT_KEY,
+)
 
 
 class TestTaskAnalyzer:
@@ -195,3 +205,57 @@ class TestAllowAll(TestTaskAnalyzer):
 
         for code in unsafe_allowed_code:
             analyzer.validate(code)
+
+
+class TestCompile(TestTaskAnalyzer):
+    def test_compiles_wrapped_code(self, analyzer: TaskAnalyzer) -> None:
+        compiled_code = marshal.loads(analyzer.compile("return 42", "all_items"))
+        globals = {}
+
+        exec(compiled_code, globals)
+
+        assert globals[EXECUTOR_USER_OUTPUT_KEY] == 42
+        assert compiled_code.co_filename == EXECUTOR_ALL_ITEMS_FILENAME
+
+    def test_compiles_per_node_mode(self, analyzer: TaskAnalyzer) -> None:
+        all_items = marshal.loads(analyzer.compile("return 1", "all_items"))
+        per_item = marshal.loads(analyzer.compile("return 1", "per_item"))
+
+        assert all_items.co_filename == EXECUTOR_ALL_ITEMS_FILENAME
+        assert per_item.co_filename == EXECUTOR_PER_ITEM_FILENAME
+
+    def test_reuses_cached_code(self, analyzer: TaskAnalyzer) -> None:
+        code = "return 'cached'"
+
+        with patch("src.task_analyzer.compile", wraps=compile) as mock_compile:
+            first = analyzer.compile(code, "all_items")
+            second = analyzer.compile(code, "all_items")
+
+        assert first is second
+        assert mock_compile.call_count == 1
+
+    def test_evicts_least_recently_used(self, analyzer: TaskAnalyzer) -> None:
+        code_cache = OrderedDict()
+
+        with (
+            patch("src.task_analyzer.MAX_CODE_CACHE_SIZE", 2),
+            patch.object(TaskAnalyzer, "_code_cache", code_cache),
+        ):
+            analyzer.compile("return 'a'", "all_items")
+            analyzer.compile("return 'b'", "all_items")
+            analyzer.compile("return 'a'", "all_items")
+            analyzer.compile("return 'c'", "all_items")
+
+        assert list(code_cache) == [
+            (TaskAnalyzer._hash_code("return 'a'"), "all_items"),
+            (TaskAnalyzer._hash_code("return 'c'"), "all_items"),
+        ]
+
+    def test_syntax_error_is_raised_and_not_cached(
+        self, analyzer: TaskAnalyzer
+    ) -> None:
+        with pytest.raises(SyntaxError):
+            analyzer.compile("return (", "all_items")
+
+        cache_key = (TaskAnalyzer._hash_code("return ("), "all_items")
+        assert cache_key not in TaskAnalyzer._code_cache
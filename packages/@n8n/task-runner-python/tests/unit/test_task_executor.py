@@ -1,20 +1,59 @@
+import asyncio
+import builtins
 import pytest
 import json
+import marshal
+import os
+import socket
+import time
 from unittest.mock import MagicMock, patch
 
-from src.task_executor import TaskExecutor
+from src.config.security_config import SecurityConfig
+from src.task_analyzer import TaskAnalyzer
+from src.config.subprocess_config import SubprocessConfig
+from src.task_executor import PrintCapture, TaskExecutor
 from src.pipe_reader import PipeReader
-from src.errors import TaskCancelledError, TaskKilledError, TaskSubprocessFailedError
-from src.constants import SIGTERM_EXIT_CODE, SIGKILL_EXIT_CODE, PIPE_MSG_PREFIX_LENGTH
+from src import json_codec
+from src.errors import (
+    InvalidPipeMsgContentError,
+    TaskOutputTooLargeError,
+    TaskResultTooLargeError,
+    TaskCancelledError,
+    TaskKilledError,
+    TaskSubprocessFailedError,
+)
+from src.constants import (
+    SIGTERM_EXIT_CODE,
+    SIGKILL_EXIT_CODE,
+    PIPE_MSG_KIND_FINAL,
+    PIPE_MSG_KIND_PRINT,
+    PIPE_MSG_PREFIX_LENGTH,
+    PIPE_MSG_RESULT_SEPARATOR,
+    PIPE_MSG_MEMFD_THRESHOLD,
+)
 from src.message_types.pipe import (
-    PipeResultMessage,
     PipeErrorMessage,
     TaskErrorInfo,
 )
 
+MAX_RESULT_SIZE = 1024 * 1024
+
+
+def create_frame(data: bytes, kind: bytes = PIPE_MSG_KIND_FINAL) -> bytes:
+    return kind + len(data).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big") + data
+
+
+def create_socket_pair() -> tuple[socket.socket, socket.socket]:
+    """The runner's end, non-blocking as the pipe reader requires, and the subprocess's end."""
+
+    runner_sock, child_sock = socket.socketpair()
+    runner_sock.setblocking(False)
+    return runner_sock, child_sock
+
 
 class TestTaskExecutorProcessExitHandling:
-    def test_sigterm_raises_task_cancelled_error(self):
+    @pytest.mark.asyncio
+    async def test_sigterm_raises_task_cancelled_error(self):
         process = MagicMock()
         process.is_alive.return_value = False
         process.exitcode = SIGTERM_EXIT_CODE
@@ -24,16 +63,17 @@ class TestTaskExecutorProcessExitHandling:
         read_conn.fileno.return_value = 999
 
         with pytest.raises(TaskCancelledError):
-            TaskExecutor.execute_process(
+            await TaskExecutor.execute_process(
+                pipe_reader=PipeReader(),
                 process=process,
                 read_conn=read_conn,
                 write_conn=write_conn,
                 task_timeout=60,
-                pipe_reader_timeout=3.0,
                 continue_on_fail=False,
             )
 
-    def test_sigkill_raises_task_killed_error(self):
+    @pytest.mark.asyncio
+    async def test_sigkill_raises_task_killed_error(self):
         process = MagicMock()
         process.is_alive.return_value = False
         process.exitcode = SIGKILL_EXIT_CODE
@@ -43,16 +83,17 @@ class TestTaskExecutorProcessExitHandling:
         read_conn.fileno.return_value = 999
 
         with pytest.raises(TaskKilledError):
-            TaskExecutor.execute_process(
+            await TaskExecutor.execute_process(
+                pipe_reader=PipeReader(),
                 process=process,
                 read_conn=read_conn,
                 write_conn=write_conn,
                 task_timeout=60,
-                pipe_reader_timeout=3.0,
                 continue_on_fail=False,
             )
 
-    def test_other_non_zero_exit_code_raises_task_subprocess_failed_error(self):
+    @pytest.mark.asyncio
+    async def test_other_non_zero_exit_code_raises_task_subprocess_failed_error(self):
         process = MagicMock()
         process.is_alive.return_value = False
         process.exitcode = -1  # Some other error code
@@ -62,18 +103,19 @@ class TestTaskExecutorProcessExitHandling:
         read_conn.fileno.return_value = 999
 
         with pytest.raises(TaskSubprocessFailedError) as exc_info:
-            TaskExecutor.execute_process(
+            await TaskExecutor.execute_process(
+                pipe_reader=PipeReader(),
                 process=process,
                 read_conn=read_conn,
                 write_conn=write_conn,
                 task_timeout=60,
-                pipe_reader_timeout=3.0,
                 continue_on_fail=False,
             )
 
         assert exc_info.value.exit_code == -1
 
-    def test_zero_exit_code_with_empty_pipe_raises_task_result_read_error(self):
+    @pytest.mark.asyncio
+    async def test_zero_exit_code_with_empty_pipe_raises_task_result_read_error(self):
         from src.errors import TaskResultReadError
 
         process = MagicMock()
@@ -85,51 +127,379 @@ class TestTaskExecutorProcessExitHandling:
         read_conn.fileno.return_value = 999
 
         with pytest.raises(TaskResultReadError):
-            TaskExecutor.execute_process(
+            await TaskExecutor.execute_process(
+                pipe_reader=PipeReader(),
                 process=process,
                 read_conn=read_conn,
                 write_conn=write_conn,
                 task_timeout=60,
-                pipe_reader_timeout=3.0,
                 continue_on_fail=False,
             )
 
 
 class TestTaskExecutorPipeCommunication:
-    @patch("os.read")
-    def test_successful_result_communication(self, mock_os_read):
-        result_data: PipeResultMessage = {
-            "result": [{"json": {"foo": "bar"}}],
-            "print_args": [],
-        }
-        result_json = json.dumps(result_data).encode("utf-8")
-        result_length = len(result_json).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        mock_os_read.side_effect = [result_length, result_json]
+    @pytest.mark.asyncio
+    async def test_successful_result_communication(self):
+        result_json = (
+            json.dumps({"print_args": []}).encode("utf-8")
+            + PIPE_MSG_RESULT_SEPARATOR
+            + json.dumps([{"json": {"foo": "bar"}}]).encode("utf-8")
+        )
 
         process = MagicMock()
         process.is_alive.return_value = False
         process.exitcode = 0
 
+        runner_sock, child_sock = create_socket_pair()
         read_conn = MagicMock()
         write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
+        read_conn.fileno.return_value = runner_sock.fileno()
 
-        result, print_args, size = TaskExecutor.execute_process(
-            process=process,
-            read_conn=read_conn,
-            write_conn=write_conn,
-            task_timeout=60,
-            pipe_reader_timeout=3.0,
-            continue_on_fail=False,
-        )
+        with runner_sock, child_sock:
+            child_sock.sendall(create_frame(result_json))
+            result, print_args, size = await TaskExecutor.execute_process(
+                pipe_reader=PipeReader(),
+                process=process,
+                read_conn=read_conn,
+                write_conn=write_conn,
+                task_timeout=60,
+                continue_on_fail=False,
+            )
 
-        assert result == [{"json": {"foo": "bar"}}]
+        assert json.loads(bytes(result)) == [{"json": {"foo": "bar"}}]
         assert print_args == []
         assert size == len(result_json)
 
-    @patch("os.read")
-    def test_successful_error_communication(self, mock_os_read):
+    @pytest.mark.asyncio
+    async def test_result_is_passed_through_undecoded(self):
+        read_fd, write_fd = os.pipe()
+        result = [{"json": {"text": "line\nbreak ☕"}}]
+        os.set_blocking(read_fd, False)
+
+        try:
+            TaskExecutor._put_result(write_fd, result, [["'hi'"]])
+            pipe_message, _ = await PipeReader().read_message(read_fd)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        assert pipe_message["print_args"] == [["'hi'"]]
+        assert isinstance(pipe_message["result"], memoryview)
+        assert json.loads(bytes(pipe_message["result"])) == result
+
+    @pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="requires memfd")
+    @pytest.mark.asyncio
+    async def test_large_result_is_passed_in_memfd(self):
+        runner_sock, child_sock = create_socket_pair()
+        result = [{"json": {"text": "x" * PIPE_MSG_MEMFD_THRESHOLD}}]
+
+        with runner_sock, child_sock:
+            TaskExecutor._put_result(child_sock.fileno(), result, [])
+            pipe_message, size = await PipeReader().read_message(runner_sock.fileno())
+
+        raw_result = pipe_message["result"]
+        assert isinstance(raw_result, memoryview)
+        assert raw_result.readonly
+        assert json.loads(bytes(raw_result)) == result
+        assert size > PIPE_MSG_MEMFD_THRESHOLD
+
+    def test_result_is_encoded_in_batches(self):
+        result = [{"json": {"i": i, "text": "☕"}} for i in range(2500)]
+
+        parts, size = TaskExecutor._encode_result(result, MAX_RESULT_SIZE)
+
+        encoded = b"".join(parts)
+        assert len(parts) == 7  # brackets, three batches and their separators
+        assert size == len(encoded)
+        assert json.loads(encoded) == result
+
+    def test_oversized_result_is_rejected_before_it_is_fully_encoded(self):
+        result = [{"json": {"text": "x" * 100}} for _ in range(5000)]
+
+        with (
+            patch.object(json_codec, "dumps", wraps=json_codec.dumps) as dumps,
+            pytest.raises(TaskResultTooLargeError),
+        ):
+            TaskExecutor._encode_result(result, 50_000)
+
+        assert dumps.call_count == 1
+
+    def capture_prints(
+        self, subprocess_config: SubprocessConfig, *calls, on_print=None
+    ):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+
+        try:
+            print_capture = PrintCapture(write_fd, subprocess_config)
+            for args in calls:
+                print_capture(*args)
+            print_capture.flush()
+            TaskExecutor._put_result(write_fd, [])
+            pipe_message, _ = asyncio.run(PipeReader().read_message(read_fd, on_print))
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+        return pipe_message["print_args"]
+
+    def test_prints_are_streamed_before_the_result(self):
+        streamed = []
+
+        print_args = self.capture_prints(
+            SubprocessConfig(
+                print_max_bytes=1024,
+                print_records_kept=10,
+                max_result_size=MAX_RESULT_SIZE,
+                compact_decode=False,
+            ),
+            ("first",),
+            ("second", 2),
+            on_print=streamed.append,
+        )
+
+        assert streamed == [["'first'"], ["'second'", "2"]]
+        assert print_args == []
+
+    def test_keeps_first_and_last_prints_over_record_limit(self):
+        print_args = self.capture_prints(
+            SubprocessConfig(
+                print_max_bytes=1024,
+                print_records_kept=2,
+                max_result_size=MAX_RESULT_SIZE,
+                compact_decode=False,
+            ),
+            *[(i,) for i in range(10)],
+        )
+
+        assert print_args == [
+            ["0"],
+            ["1"],
+            ["[Output truncated - 6 more print statements (6 bytes)]"],
+            ["8"],
+            ["9"],
+        ]
+
+    def test_keeps_first_and_last_prints_within_byte_budget(self):
+        large = "x" * 1000
+
+        print_args = self.capture_prints(
+            SubprocessConfig(
+                print_max_bytes=100,
+                print_records_kept=10,
+                max_result_size=MAX_RESULT_SIZE,
+                compact_decode=False,
+            ),
+            ("a",),
+            (large,),
+            ("b", {"c": 1}),
+            (large, large),
+            ("d",),
+        )
+
+        assert print_args == [
+            ["'a'"],
+            ["[Output truncated - 2 more print statements (3006 bytes)]"],
+            ["'b'", '{"c": 1}'],
+            ["'d'"],
+        ]
+
+    def test_evicts_tail_prints_over_byte_budget(self):
+        print_args = self.capture_prints(
+            SubprocessConfig(
+                print_max_bytes=20,
+                print_records_kept=10,
+                max_result_size=MAX_RESULT_SIZE,
+                compact_decode=False,
+            ),
+            ("0123456789",),
+            ("abcdef",),
+            ("ghijkl",),
+        )
+
+        assert print_args == [
+            ["[Output truncated - 1 more print statements (12 bytes)]"],
+            ["'abcdef'"],
+            ["'ghijkl'"],
+        ]
+
+    def test_tail_prints_are_formatted_once(self):
+        formatted_args = []
+        format_print_args = TaskExecutor._format_print_args
+
+        def counting_format_print_args(*args):
+            formatted_args.extend(args)
+            return format_print_args(*args)
+
+        with patch.object(
+            TaskExecutor, "_format_print_args", counting_format_print_args
+        ):
+            print_args = self.capture_prints(
+                SubprocessConfig(
+                    print_max_bytes=1024,
+                    print_records_kept=1,
+                    max_result_size=MAX_RESULT_SIZE,
+                    compact_decode=False,
+                ),
+                ("a",),
+                ("b",),
+                ("c", {"d": 1}),
+            )
+
+        assert print_args == [
+            ["'a'"],
+            ["[Output truncated - 1 more print statements (3 bytes)]"],
+            ["'c'", '{"d": 1}'],
+        ]
+        assert formatted_args == ["a", "b", {"d": 1}, "c"]
+
+    @pytest.mark.parametrize("print_records_kept", [0, 1])
+    def test_dropped_tail_prints_are_measured_without_formatting(
+        self, print_records_kept
+    ):
+        formatted_args = []
+        format_print_args = TaskExecutor._format_print_args
+
+        def counting_format_print_args(*args):
+            formatted_args.extend(args)
+            return format_print_args(*args)
+
+        with patch.object(
+            TaskExecutor, "_format_print_args", counting_format_print_args
+        ):
+            print_args = self.capture_prints(
+                SubprocessConfig(
+                    print_max_bytes=20,
+                    print_records_kept=print_records_kept,
+                    max_result_size=MAX_RESULT_SIZE,
+                    compact_decode=False,
+                ),
+                ("a" * 30,),
+                ("b" * 30, {"c": 1}),
+                ("d" * 30,),
+            )
+
+        assert print_args == [
+            ["[Output truncated - 3 more print statements (at least 96 bytes)]"]
+        ]
+        assert formatted_args == ["a" * 30]
+
+    def test_unserializable_print_args_are_shown_as_circular(self):
+        circular: list = []
+        circular.append(circular)
+
+        assert TaskExecutor._format_print_args("a", 1, None, circular, {"b": [1]}) == [
+            "'a'",
+            "1",
+            "None",
+            "[Circular list]",
+            '{"b": [1]}',
+        ]
+
+    @pytest.mark.asyncio
+    async def test_missing_final_message_times_out(self):
+        read_fd, write_fd = os.pipe()
+        subprocess_config = SubprocessConfig(
+            print_max_bytes=1024,
+            print_records_kept=10,
+            max_result_size=MAX_RESULT_SIZE,
+            compact_decode=False,
+        )
+
+        os.set_blocking(read_fd, False)
+
+        try:
+            PrintCapture(write_fd, subprocess_config)("hi")
+            with pytest.raises(TimeoutError):
+                async with asyncio.timeout(0.1):
+                    await PipeReader().read_message(read_fd)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    @pytest.mark.asyncio
+    async def test_unknown_message_kind_is_rejected(self):
+        runner_sock, child_sock = create_socket_pair()
+
+        with runner_sock, child_sock:
+            child_sock.sendall(
+                create_frame(json.dumps({"print_args": []}).encode(), kind=b"x")
+            )
+            with pytest.raises(InvalidPipeMsgContentError):
+                await PipeReader().read_message(runner_sock.fileno())
+
+    @pytest.mark.asyncio
+    async def test_result_that_is_not_an_array_is_rejected(self):
+        data = (
+            json.dumps({"print_args": []}).encode() + PIPE_MSG_RESULT_SEPARATOR + b"{}"
+        )
+        runner_sock, child_sock = create_socket_pair()
+
+        with runner_sock, child_sock:
+            child_sock.sendall(create_frame(data))
+            with pytest.raises(InvalidPipeMsgContentError):
+                await PipeReader().read_message(runner_sock.fileno())
+
+    @pytest.mark.parametrize(
+        "result",
+        [
+            b'[1]},"taskId":"other","x":{"a":[2]',
+            b'[1], "extra": [2]',
+            b'["\\\\"]}, "taskId": "other", "x": ["]',
+            b'["unterminated]',
+            b"[}{]",
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_result_that_escapes_its_array_is_rejected(self, result):
+        data = json.dumps({"print_args": []}).encode() + PIPE_MSG_RESULT_SEPARATOR
+        runner_sock, child_sock = create_socket_pair()
+
+        with runner_sock, child_sock:
+            child_sock.sendall(create_frame(data + result))
+            with pytest.raises(InvalidPipeMsgContentError):
+                await PipeReader().read_message(runner_sock.fileno())
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 256 * 1024])
+    async def test_result_with_brackets_and_escapes_in_strings_is_an_array(
+        self, chunk_size
+    ):
+        result = json.dumps(
+            [{"json": {"s": '"]}', "t": "\\", "u": ["[", '\\"{'], "v": {}}}, []]
+        ).encode()
+
+        with patch("src.json_codec.ARRAY_SCAN_CHUNK_SIZE", chunk_size):
+            assert await PipeReader._is_json_array(memoryview(result))
+            assert not await PipeReader._is_json_array(memoryview(result + result))
+
+    @pytest.mark.asyncio
+    async def test_checking_large_result_does_not_stall_event_loop(self):
+        result = json.dumps(
+            [{"json": {"s": "]" * 20, "n": [i, {"t": '\\"['}]}} for i in range(150_000)]
+        ).encode()
+        max_lag = 0.0
+
+        async def measure_lag():
+            nonlocal max_lag
+            while True:
+                tick = time.monotonic()
+                await asyncio.sleep(0)
+                max_lag = max(max_lag, time.monotonic() - tick)
+
+        lag_monitor = asyncio.create_task(measure_lag())
+        await asyncio.sleep(0)
+        started_at = time.monotonic()
+        try:
+            assert await PipeReader._is_json_array(memoryview(result))
+        finally:
+            lag_monitor.cancel()
+
+        assert time.monotonic() - started_at > 0.1
+        assert max_lag < 0.05
+
+    @pytest.mark.asyncio
+    async def test_successful_error_communication(self):
         from src.errors import TaskRuntimeError
 
         error_info: TaskErrorInfo = {
@@ -143,62 +513,161 @@ class TestTaskExecutorPipeCommunication:
             "print_args": [],
         }
         error_json = json.dumps(error_data).encode("utf-8")
-        error_length = len(error_json).to_bytes(PIPE_MSG_PREFIX_LENGTH, "big")
-
-        mock_os_read.side_effect = [error_length, error_json]
 
         process = MagicMock()
         process.is_alive.return_value = False
         process.exitcode = 0
 
+        runner_sock, child_sock = create_socket_pair()
         read_conn = MagicMock()
         write_conn = MagicMock()
-        read_conn.fileno.return_value = 999
-
-        with pytest.raises(TaskRuntimeError) as exc_info:
-            TaskExecutor.execute_process(
-                process=process,
-                read_conn=read_conn,
-                write_conn=write_conn,
-                task_timeout=60,
-                pipe_reader_timeout=3.0,
-                continue_on_fail=False,
-            )
+        read_conn.fileno.return_value = runner_sock.fileno()
+
+        with runner_sock, child_sock:
+            child_sock.sendall(create_frame(error_json))
+            with pytest.raises(TaskRuntimeError) as exc_info:
+                await TaskExecutor.execute_process(
+                    pipe_reader=PipeReader(),
+                    process=process,
+                    read_conn=read_conn,
+                    write_conn=write_conn,
+                    task_timeout=60,
+                    continue_on_fail=False,
+                )
 
         assert str(exc_info.value) == "Test error"
         assert exc_info.value.stack_trace == "traceback..."
 
 
+class TestPipeReader:
+    @pytest.mark.asyncio
+    async def test_assembles_messages_arriving_in_pieces(self):
+        data = create_frame(b"[\"'hi'\"]", kind=PIPE_MSG_KIND_PRINT) + create_frame(
+            json.dumps({"print_args": []}).encode() + PIPE_MSG_RESULT_SEPARATOR + b"[]"
+        )
+        runner_sock, child_sock = create_socket_pair()
+        pipe_reader = PipeReader()
+
+        with runner_sock, child_sock:
+            read = asyncio.create_task(pipe_reader.read_message(runner_sock.fileno()))
+            for i in range(0, len(data), 5):
+                child_sock.sendall(data[i : i + 5])
+                await asyncio.sleep(0.001)
+            pipe_message, _ = await read
+
+        assert pipe_message["print_args"] == [["'hi'"]]
+        assert bytes(pipe_message["result"]) == b"[]"
+        assert pipe_reader.bytes_read == len(data)
+        assert pipe_reader.throughput > 0
+
+    @pytest.mark.asyncio
+    async def test_reads_pipes_of_concurrent_tasks(self):
+        pipe_reader = PipeReader()
+        socket_pairs = [create_socket_pair() for _ in range(3)]
+
+        try:
+            reads = [
+                asyncio.create_task(pipe_reader.read_message(runner_sock.fileno()))
+                for runner_sock, _ in socket_pairs
+            ]
+            for i, (_, child_sock) in reversed(list(enumerate(socket_pairs))):
+                TaskExecutor._put_result(child_sock.fileno(), [{"json": {"i": i}}])
+            pipe_messages = await asyncio.gather(*reads)
+        finally:
+            for runner_sock, child_sock in socket_pairs:
+                runner_sock.close()
+                child_sock.close()
+
+        assert [json.loads(bytes(m["result"])) for m, _ in pipe_messages] == [
+            [{"json": {"i": i}}] for i in range(3)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_rejects_output_over_task_limit_before_reading_it(self):
+        runner_sock, child_sock = create_socket_pair()
+
+        with runner_sock, child_sock:
+            # only the length prefix, which announces more than the limit
+            child_sock.sendall(create_frame(b"x" * 1000)[: 1 + PIPE_MSG_PREFIX_LENGTH])
+            with pytest.raises(TaskOutputTooLargeError):
+                await PipeReader(max_bytes_per_task=100).read_message(
+                    runner_sock.fileno()
+                )
+
+    @pytest.mark.asyncio
+    async def test_raises_eof_error_if_pipe_closes_before_final_message(self):
+        runner_sock, child_sock = create_socket_pair()
+
+        with runner_sock:
+            with child_sock:
+                child_sock.sendall(create_frame(b"[]")[:5])
+
+            with pytest.raises(EOFError, match="Pipe closed before reading all data"):
+                await PipeReader().read_message(runner_sock.fileno())
+
+
 class TestTaskExecutorLowLevelIO:
-    @patch("os.read")
-    def test_read_exact_bytes_single_read(self, mock_os_read):
-        data = b"test data"
-        mock_os_read.return_value = data
+    @patch("os.write")
+    def test_write_bytes_write_failure(self, mock_os_write):
+        mock_os_write.return_value = 0
 
-        result = PipeReader._read_exact_bytes(999, len(data))
+        with pytest.raises(OSError, match="Write failed"):
+            TaskExecutor._write_bytes(999, b"test data")
 
-        assert result == data
-        mock_os_read.assert_called_once_with(999, len(data))
 
-    @patch("os.read")
-    def test_read_exact_bytes_multiple_reads(self, mock_os_read):
-        mock_os_read.side_effect = [b"test", b" ", b"data"]
+class TestTaskExecutorPerItem:
+    def run_per_item(self, code: str, items):
+        security_config = SecurityConfig(
+            stdlib_allow=set(),
+            external_allow=set(),
+            builtins_deny=set(),
+            runner_env_deny=False,
+        )
+        compiled_code = TaskAnalyzer(security_config).compile(code, "per_item")
+        print_args = []
+        result = TaskExecutor._per_item(
+            marshal.loads(compiled_code),
+            items,
+            lambda *args: print_args.append(TaskExecutor._format_print_args(*args)),
+            dict(builtins.__dict__),
+        )
+        return result, print_args
 
-        result = PipeReader._read_exact_bytes(999, 9)
+    def test_calls_user_function_per_item(self):
+        items = [{"json": {"v": 1}}, {"json": {"v": 2}}]
 
-        assert result == b"test data"
-        assert mock_os_read.call_count == 3
+        result, print_args = self.run_per_item(
+            "print(_item['json']['v'])\nreturn {'v': _item['json']['v'] * 10}", items
+        )
 
-    @patch("os.read")
-    def test_read_exact_bytes_eof_error(self, mock_os_read):
-        mock_os_read.side_effect = [b"test", b""]  # empty for EOF
+        assert result == [
+            {"json": {"v": 10}, "pairedItem": {"item": 0}},
+            {"json": {"v": 20}, "pairedItem": {"item": 1}},
+        ]
+        assert print_args == [["1"], ["2"]]
 
-        with pytest.raises(EOFError, match="Pipe closed before reading all data"):
-            PipeReader._read_exact_bytes(999, 10)
+    def test_skips_none_and_keeps_paired_item_index(self):
+        items = [{"json": {"v": 1}}, {"json": {"v": 2}}, {"json": {"v": 3}}]
 
-    @patch("os.write")
-    def test_write_bytes_write_failure(self, mock_os_write):
-        mock_os_write.return_value = 0
+        result, _ = self.run_per_item(
+            "if _item['json']['v'] == 2:\n    return None\nreturn _item", items
+        )
 
-        with pytest.raises(OSError, match="Write failed"):
-            TaskExecutor._write_bytes(999, b"test data")
+        assert result == [
+            {"json": {"v": 1}, "pairedItem": {"item": 0}},
+            {"json": {"v": 3}, "pairedItem": {"item": 2}},
+        ]
+
+    def test_keeps_binary(self):
+        result, _ = self.run_per_item(
+            "return {'name': 'a', 'binary': {'data': {'mimeType': 'text/plain'}}}",
+            [{"json": {}}],
+        )
+
+        assert result == [
+            {
+                "json": {"name": "a"},
+                "pairedItem": {"item": 0},
+                "binary": {"data": {"mimeType": "text/plain"}},
+            }
+        ]
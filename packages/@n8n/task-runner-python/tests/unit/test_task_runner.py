@@ -1,29 +1,63 @@
+import asyncio
+import dataclasses
+import json
+import os
+import threading
+import time
+
 import pytest
-from unittest.mock import patch, Mock
+from unittest.mock import AsyncMock, patch, Mock
 from websockets.exceptions import InvalidStatus
 
+from src.constants import SERDE_OFFLOAD_THRESHOLD
+from src.errors import TaskRuntimeError
+from src.message_types import (
+    BrokerRunnerRegistered,
+    BrokerTaskCancel,
+    BrokerTaskSettings,
+    RunnerTaskDone,
+)
+from src.message_types.broker import TaskSettings
+from src.print_forwarder import PrintForwarder
 from src.task_runner import TaskRunner
+from src.task_state import TaskState, TaskStatus
 from src.config.task_runner_config import TaskRunnerConfig
 
 
-class TestTaskRunnerConnectionRetry:
-    @pytest.fixture
-    def config(self):
-        return TaskRunnerConfig(
-            grant_token="test-token",
-            task_broker_uri="http://127.0.0.1:5679",
-            max_concurrency=5,
-            max_payload_size=1024 * 1024,
-            task_timeout=60,
-            auto_shutdown_timeout=0,
-            graceful_shutdown_timeout=10,
-            stdlib_allow={"*"},
-            external_allow={"*"},
-            builtins_deny=set(),
-            env_deny=False,
-            pipe_reader_timeout=3.0,
-        )
+@pytest.fixture
+def config():
+    return TaskRunnerConfig(
+        grant_token="test-token",
+        task_broker_uri="http://127.0.0.1:5679",
+        max_concurrency=5,
+        prefetch_depth=0,
+        max_payload_size=1024 * 1024,
+        task_timeout=60,
+        auto_shutdown_timeout=0,
+        graceful_shutdown_timeout=10,
+        stdlib_allow={"*"},
+        external_allow={"*"},
+        builtins_deny=set(),
+        env_deny=False,
+        preload=set(),
+        worker_pool_enabled=False,
+        worker_pool_max_tasks=100,
+        worker_pool_max_rss=0,
+        per_item_shard_threshold=0,
+        items_spill_threshold=0,
+        result_chunk_size=1024 * 1024,
+        message_spool_threshold=0,
+        print_max_bytes=1024 * 1024,
+        print_records_kept=50,
+        items_compact_decode=False,
+        offer_validity_min=1000,
+        offer_validity_max=5000,
+        offer_latency_buffer_min=100,
+        offer_latency_buffer_max=2000,
+    )
+
 
+class TestTaskRunnerConnectionRetry:
     @pytest.mark.asyncio
     async def test_connection_failure_logs_warning_not_crash(self, config):
         runner = TaskRunner(config)
@@ -68,3 +102,603 @@ class TestTaskRunnerConnectionRetry:
             assert "Authentication failed with status 403" in args
 
             assert mock_connect.call_count == 1
+
+
+class TestTaskRunnerSerde:
+    @pytest.mark.asyncio
+    async def test_only_large_messages_are_deserialized_in_the_serde_thread(
+        self, config
+    ):
+        runner = TaskRunner(config)
+        threads = []
+        deserialize = runner.serde.deserialize_broker_message
+
+        def record_thread(raw_message):
+            threads.append(threading.current_thread().name)
+            return deserialize(raw_message)
+
+        runner.serde.deserialize_broker_message = record_thread
+        message = {"type": "broker:taskcancel", "taskId": "t", "reason": ""}
+        small = json.dumps(message)
+        large = json.dumps({**message, "reason": " " * SERDE_OFFLOAD_THRESHOLD})
+
+        await runner._deserialize_message(small.encode())
+        await runner._deserialize_message(large.encode())
+
+        assert threads[0] == threading.current_thread().name
+        assert threads[1].startswith("serde")
+
+    @pytest.mark.asyncio
+    async def test_results_over_chunk_size_are_sent_in_fragments(self, config):
+        runner = TaskRunner(dataclasses.replace(config, result_chunk_size=4))
+        runner.websocket_connection = AsyncMock()
+
+        await runner._send_message(RunnerTaskDone(task_id="small", result=b"[1]"))
+        await runner._send_message(RunnerTaskDone(task_id="large", result=b"[1, 2]"))
+
+        small, large = [
+            call.args[0] for call in runner.websocket_connection.send.call_args_list
+        ]
+        assert json.loads(small)["data"]["result"] == [1]
+        fragments = list(large)
+        assert [bytes(fragment) for fragment in fragments[1:-1]] == [b"[1, ", b"2]"]
+        assert json.loads(b"".join(fragments))["data"]["result"] == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_scanning_large_raw_items_does_not_stall_event_loop(self, config):
+        runner = TaskRunner(config)
+        items = [
+            {"json": {"s": "]" * 20, "n": [i, {"t": '\\"['}]}} for i in range(300_000)
+        ]
+        message = {
+            "type": "broker:tasksettings",
+            "taskId": "task",
+            "settings": {"code": "return []", "nodeMode": "runOnceForAllItems"},
+        }
+        message["settings"]["items"] = items
+        data = json.dumps(message, separators=(",", ":")).encode()
+
+        with patch("src.task_runner.LOOP_STALL_CHECK_INTERVAL", 0.01):
+            monitor = asyncio.create_task(runner._monitor_loop_stalls())
+            started_at = time.monotonic()
+            deserialized = await runner._deserialize_message(data)
+            duration = time.monotonic() - started_at
+            await runner._cancel_coroutine(monitor)
+
+        assert isinstance(deserialized.settings.items, memoryview)
+        assert duration > 0.1
+        assert runner.max_loop_stall_ms < 40
+
+    @pytest.mark.asyncio
+    async def test_records_longest_loop_stall(self, config):
+        runner = TaskRunner(config)
+        monitor = asyncio.create_task(runner._monitor_loop_stalls())
+
+        await asyncio.sleep(0.05)
+        asyncio.get_running_loop().call_soon(time.sleep, 0.3)  # blocks the loop
+        await asyncio.sleep(0.45)
+        await runner._cancel_coroutine(monitor)
+
+        assert runner.max_loop_stall_ms >= 200
+
+
+class TestTaskRunnerPrintForwarding:
+    @pytest.mark.asyncio
+    async def test_sends_one_rpc_call_per_print_call_by_default(self, config):
+        runner = TaskRunner(config)
+        runner.websocket_connection = AsyncMock()
+
+        await runner._send_print_args("task-1", [["'a'"], ["'b'"]])
+
+        sent = [
+            json.loads(call.args[0])
+            for call in runner.websocket_connection.send.call_args_list
+        ]
+        assert [(msg["name"], msg["params"]) for msg in sent] == [
+            ("logNodeOutput", ["'a'"]),
+            ("logNodeOutput", ["'b'"]),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_sends_one_rpc_call_per_batch_if_broker_supports_it(self, config):
+        runner = TaskRunner(config)
+        runner.websocket_connection = AsyncMock()
+        runner._ensure_forkserver_running = AsyncMock()
+        runner.offer_manager = Mock()
+
+        await runner._handle_runner_registered(
+            BrokerRunnerRegistered(rpc_methods=["logNodeOutputBatch"])
+        )
+        await runner._send_print_args("task-1", [["'a'"], ["'b'"]])
+        await runner._cancel_coroutine(runner.broker_rtt_coroutine)
+        await runner._cancel_coroutine(runner.idle_coroutine)
+
+        sent = runner.websocket_connection.send.call_args_list
+        assert len(sent) == 1
+        msg = json.loads(sent[0].args[0])
+        assert (msg["name"], msg["params"]) == (
+            "logNodeOutputBatch",
+            [["'a'"], ["'b'"]],
+        )
+
+
+class TestTaskRunnerBrokerRtt:
+    @pytest.mark.asyncio
+    async def test_latency_buffer_follows_keepalive_latency(self, config):
+        runner = TaskRunner(config)
+        runner.websocket_connection = Mock(latency=0.0)
+
+        with patch("src.task_runner.BROKER_RTT_POLL_INTERVAL", 0.01):
+            coroutine = asyncio.create_task(runner._measure_broker_rtt())
+            await asyncio.sleep(0.05)
+            runner.websocket_connection.latency = 0.3
+            await asyncio.sleep(0.05)
+            await runner._cancel_coroutine(coroutine)
+
+        assert list(runner.offer_manager.broker_rtts) == [0.3]
+        assert runner.offer_manager.latency_buffer_ms == 300
+
+    @pytest.mark.asyncio
+    async def test_latency_is_sampled_once_per_pong(self, config):
+        runner = TaskRunner(config)
+        runner.websocket_connection = Mock(latency=0.3)
+
+        with patch("src.task_runner.BROKER_RTT_POLL_INTERVAL", 0.01):
+            coroutine = asyncio.create_task(runner._measure_broker_rtt())
+            # no pong arrives while a ping times out, so the latency stays as is
+            await asyncio.sleep(0.1)
+            runner.websocket_connection.latency = 0.2
+            await asyncio.sleep(0.05)
+            await runner._cancel_coroutine(coroutine)
+
+        assert list(runner.offer_manager.broker_rtts) == [0.3, 0.2]
+
+
+class TestTaskRunnerSpooling:
+    def create_connection(self, fragments: list[bytes]) -> Mock:
+        async def recv_streaming(decode):
+            for fragment in fragments:
+                yield fragment
+
+        return Mock(recv_streaming=recv_streaming)
+
+    @pytest.mark.asyncio
+    async def test_small_messages_are_not_spooled(self, config):
+        runner = TaskRunner(dataclasses.replace(config, message_spool_threshold=1024))
+        runner.websocket_connection = self.create_connection([b'{"type": ', b"1}"])
+
+        raw_message, spool_memfd = await runner._receive_message()
+
+        assert raw_message == b'{"type": 1}'
+        assert spool_memfd is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="requires memfd")
+    async def test_task_settings_items_are_decoded_from_spool(self, config):
+        runner = TaskRunner(dataclasses.replace(config, message_spool_threshold=64))
+        items = [{"json": {"v": i}} for i in range(20)]
+        data = json.dumps(
+            {
+                "type": "broker:tasksettings",
+                "taskId": "task",
+                "settings": {
+                    "code": "return [{'json': {'n': len(_items)}}]",
+                    "nodeMode": "runOnceForAllItems",
+                    "items": items,
+                },
+            }
+        ).encode()
+        runner.websocket_connection = self.create_connection(
+            [data[i : i + 50] for i in range(0, len(data), 50)]
+        )
+
+        raw_message, spool_memfd = await runner._receive_message()
+        message = await runner._deserialize_message(raw_message)
+        task_settings = message.settings
+        task_settings.spool_memfd = spool_memfd
+
+        assert spool_memfd is not None
+        assert json.loads(bytes(task_settings.items)) == items
+
+        task_state = TaskState("task")
+        code = runner.analyzer.compile(task_settings.code, task_settings.node_mode)
+        result, _, _ = await runner._execute_items(
+            task_state,
+            task_settings,
+            code,
+            task_settings.items,
+            item_offset=0,
+            continue_on_fail=False,
+        )
+        runner._close_spool(task_settings)
+
+        assert json.loads(bytes(result)) == [{"json": {"n": 20}}]
+
+
+class TestTaskRunnerSharding:
+    @pytest.fixture
+    def runner(self, config):
+        return TaskRunner(dataclasses.replace(config, per_item_shard_threshold=10))
+
+    def create_task_settings(self, code: str, item_count: int, node_mode="per_item"):
+        return TaskSettings(
+            code=code,
+            node_mode=node_mode,
+            continue_on_fail=False,
+            items=json.dumps([{"json": {"v": i}} for i in range(item_count)]).encode(),
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+
+    def add_running_task(self, runner: TaskRunner, task_id: str) -> TaskState:
+        task_state = TaskState(task_id)
+        runner.running_tasks[task_id] = task_state
+        return task_state
+
+    @pytest.mark.asyncio
+    async def test_no_sharding_below_threshold_or_in_all_items_mode(self, runner):
+        self.add_running_task(runner, "task")
+        task_settings = self.create_task_settings("", 9)
+        all_items_settings = self.create_task_settings("", 100, node_mode="all_items")
+
+        with patch("src.task_runner.os.process_cpu_count", return_value=8):
+            assert await runner._get_shards(task_settings) == [(0, task_settings.items)]
+            assert await runner._get_shards(all_items_settings) == [
+                (0, all_items_settings.items)
+            ]
+
+    @pytest.mark.asyncio
+    async def test_shard_count_limited_by_free_slots_and_cores(self, runner):
+        self.add_running_task(runner, "task")
+        task_settings = self.create_task_settings("", 100)
+
+        with patch("src.task_runner.os.process_cpu_count", return_value=8):
+            shards = await runner._get_shards(task_settings)
+            assert [offset for offset, _ in shards] == [0, 20, 40, 60, 80]
+            assert json.loads(shards[1][1])[0] == {"json": {"v": 20}}
+
+            self.add_running_task(runner, "other").slots = 3
+            assert len(await runner._get_shards(task_settings)) == 2
+
+        with patch("src.task_runner.os.process_cpu_count", return_value=1):
+            assert len(await runner._get_shards(task_settings)) == 1
+
+    @pytest.mark.asyncio
+    async def test_merges_shards_in_item_order(self, runner):
+        task_state = self.add_running_task(runner, "task")
+        task_settings = self.create_task_settings(
+            "print(_item['json']['v'])\nreturn None if _item['json']['v'] == 3 else _item",
+            10,
+        )
+        code = runner.analyzer.compile(task_settings.code, task_settings.node_mode)
+
+        shards = runner._split_items(task_settings.items, 3, 10)
+
+        result, print_args, _ = await runner._execute_in_shards(
+            task_state, task_settings, code, shards
+        )
+
+        assert task_state.slots == 3
+        assert len(task_state.processes) == 3
+        assert json.loads(result) == [
+            {"json": {"v": i}, "pairedItem": {"item": i}} for i in range(10) if i != 3
+        ]
+        assert print_args == [[str(i)] for i in range(10)]
+
+    @pytest.mark.asyncio
+    async def test_forwards_shard_prints_in_item_order(self, runner):
+        task_state = self.add_running_task(runner, "task")
+        forwarded = []
+
+        async def send_batch(batch):
+            forwarded.extend(batch)
+
+        task_state.print_forwarder = PrintForwarder(send_batch)
+        task_settings = self.create_task_settings(
+            "import time\n"
+            "if _item['json']['v'] < 4:\n"
+            "    time.sleep(0.05)\n"
+            "print(_item['json']['v'])\n"
+            "return _item",
+            10,
+        )
+        code = runner.analyzer.compile(task_settings.code, task_settings.node_mode)
+
+        shards = runner._split_items(task_settings.items, 3, 10)
+
+        _, print_args, _ = await runner._execute_in_shards(
+            task_state, task_settings, code, shards
+        )
+        for print_args_per_call in print_args:
+            task_state.print_forwarder.add(print_args_per_call)
+        await task_state.print_forwarder.close()
+
+        assert forwarded == [[str(i)] for i in range(10)]
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="requires memfd")
+    async def test_shards_receive_spilled_items(self, config):
+        runner = TaskRunner(
+            dataclasses.replace(
+                config, per_item_shard_threshold=10, items_spill_threshold=1
+            )
+        )
+        task_state = self.add_running_task(runner, "task")
+        task_settings = self.create_task_settings("return _item", 10)
+        code = runner.analyzer.compile(task_settings.code, task_settings.node_mode)
+
+        shards = runner._split_items(task_settings.items, 2, 10)
+
+        result, _, _ = await runner._execute_in_shards(
+            task_state, task_settings, code, shards
+        )
+
+        assert json.loads(result) == [
+            {"json": {"v": i}, "pairedItem": {"item": i}} for i in range(10)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_fails_whole_task_if_a_shard_fails(self, runner):
+        task_state = self.add_running_task(runner, "task")
+        task_settings = self.create_task_settings(
+            "if _item['json']['v'] == 7:\n    raise ValueError('boom')\nreturn _item",
+            10,
+        )
+        code = runner.analyzer.compile(task_settings.code, task_settings.node_mode)
+
+        shards = runner._split_items(task_settings.items, 3, 10)
+
+        with pytest.raises(TaskRuntimeError):
+            await runner._execute_in_shards(task_state, task_settings, code, shards)
+
+        continue_on_fail_settings = dataclasses.replace(
+            task_settings, continue_on_fail=True
+        )
+        result, _, _ = await runner._execute_in_shards(
+            self.add_running_task(runner, "other"),
+            continue_on_fail_settings,
+            code,
+            shards,
+        )
+
+        assert json.loads(result) == [{"json": {"error": "boom"}}]
+
+
+class TestTaskRunnerPrefetch:
+    @pytest.fixture
+    def runner(self, config):
+        runner = TaskRunner(
+            dataclasses.replace(config, max_concurrency=1, prefetch_depth=2)
+        )
+        runner.websocket_connection = AsyncMock()
+        runner.offer_manager = Mock()
+        runner.finish_task = asyncio.Event()
+        runner.started_tasks = []
+
+        async def execute_items(task_state, *args, **kwargs):
+            runner.started_tasks.append(task_state.task_id)
+            await runner.finish_task.wait()
+            runner.finish_task.clear()
+            return b"[]", [], 2
+
+        runner._execute_items = execute_items
+        return runner
+
+    async def receive_task(self, runner: TaskRunner, task_id: str) -> None:
+        runner.running_tasks[task_id] = TaskState(task_id)
+        settings = TaskSettings(
+            code="return []",
+            node_mode="all_items",
+            continue_on_fail=False,
+            items=b"[]",
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+        await runner._handle_task_settings(BrokerTaskSettings(task_id, settings))
+        await asyncio.sleep(0.01)
+
+    def get_sent(self, runner: TaskRunner) -> list[tuple[str, str]]:
+        return [
+            (msg["type"], msg["taskId"])
+            for call in runner.websocket_connection.send.call_args_list
+            if (msg := json.loads(call.args[0]))
+        ]
+
+    def test_offers_prefetch_depth_beyond_free_slots(self, runner):
+        runner.can_send_offers = True
+        runner.is_forkserver_ready = True
+
+        assert runner._get_wanted_offers() == 3
+
+        runner.running_tasks["task-1"] = TaskState("task-1")
+        assert runner._get_wanted_offers() == 2
+
+    @pytest.mark.asyncio
+    async def test_prefetched_tasks_start_in_order_as_slots_free(self, runner):
+        for task_id in ["task-1", "task-2", "task-3"]:
+            await self.receive_task(runner, task_id)
+
+        assert runner.started_tasks == ["task-1"]
+        assert [task_state.task_id for task_state in runner.prefetched_tasks] == [
+            "task-2",
+            "task-3",
+        ]
+        assert runner.running_tasks["task-2"].status == TaskStatus.PREFETCHED
+
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+
+        assert runner.started_tasks == ["task-1", "task-2"]
+        assert "task-1" not in runner.running_tasks
+
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+
+        assert runner.started_tasks == ["task-1", "task-2", "task-3"]
+        assert not runner.running_tasks
+        assert self.get_sent(runner) == [
+            ("runner:taskdone", "task-1"),
+            ("runner:taskdone", "task-2"),
+            ("runner:taskdone", "task-3"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_prefetched_task_never_starts(self, runner):
+        await self.receive_task(runner, "task-1")
+        await self.receive_task(runner, "task-2")
+
+        await runner._handle_task_cancel(BrokerTaskCancel("task-2", "cancelled"))
+        await asyncio.sleep(0.01)
+
+        assert not runner.prefetched_tasks
+        assert "task-2" not in runner.running_tasks
+        assert self.get_sent(runner) == [("runner:taskerror", "task-2")]
+
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+
+        assert runner.started_tasks == ["task-1"]
+
+    @pytest.mark.asyncio
+    async def test_prefetched_task_timeout_starts_with_slot(self, runner):
+        runner.config = dataclasses.replace(runner.config, task_timeout=0.05)
+        await self.receive_task(runner, "task-1")
+        await self.receive_task(runner, "task-2")
+
+        await asyncio.sleep(0.1)
+
+        assert runner.running_tasks["task-2"].status == TaskStatus.PREFETCHED
+        assert self.get_sent(runner) == []
+
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+
+        assert runner.started_tasks == ["task-1", "task-2"]
+        assert self.get_sent(runner) == [
+            ("runner:taskdone", "task-1"),
+            ("runner:taskdone", "task-2"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_invalid_prefetched_task_fails_before_slot_frees(self, runner):
+        await self.receive_task(runner, "task-1")
+        runner.running_tasks["task-2"] = TaskState("task-2")
+        settings = TaskSettings(
+            code="return [",
+            node_mode="all_items",
+            continue_on_fail=False,
+            items=b"[]",
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+        await runner._handle_task_settings(BrokerTaskSettings("task-2", settings))
+        await asyncio.sleep(0.01)
+
+        assert not runner.prefetched_tasks
+        assert self.get_sent(runner) == [("runner:taskerror", "task-2")]
+
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+
+    @pytest.mark.asyncio
+    async def test_shutdown_cancels_prefetched_tasks(self, runner):
+        runner.config = dataclasses.replace(runner.config, graceful_shutdown_timeout=0)
+        await self.receive_task(runner, "task-1")
+        await self.receive_task(runner, "task-2")
+
+        await runner._terminate_tasks()
+        await asyncio.sleep(0.01)
+
+        assert not runner.prefetched_tasks
+        assert runner.started_tasks == ["task-1"]
+        assert ("runner:taskerror", "task-2") in self.get_sent(runner)
+
+        runner.finish_task.set()
+        await asyncio.sleep(0.01)
+
+
+class TestTaskRunnerCompile:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("continue_on_fail", [False, True])
+    async def test_code_that_fails_to_compile_fails_as_user_code(
+        self, config, continue_on_fail
+    ):
+        runner = TaskRunner(config)
+        runner.websocket_connection = AsyncMock()
+        runner.offer_manager = Mock()
+        runner._execute_items = AsyncMock()
+        runner.running_tasks["task-1"] = TaskState("task-1")
+        settings = TaskSettings(
+            code="return [",
+            node_mode="all_items",
+            continue_on_fail=continue_on_fail,
+            items=b"[]",
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+
+        await runner._handle_task_settings(BrokerTaskSettings("task-1", settings))
+        await asyncio.sleep(0.01)
+
+        runner._execute_items.assert_not_awaited()
+        sent = json.loads(runner.websocket_connection.send.call_args.args[0])
+        if continue_on_fail:
+            assert sent["type"] == "runner:taskdone"
+            assert "was never closed" in sent["data"]["result"][0]["json"]["error"]
+        else:
+            assert sent["type"] == "runner:taskerror"
+            assert "was never closed" in sent["error"]["message"]
+
+
+class TestTaskRunnerCancel:
+    @pytest.mark.asyncio
+    async def test_task_cancelled_while_acquiring_worker_is_never_sent(self, config):
+        runner = TaskRunner(config)
+        runner.websocket_connection = AsyncMock()
+        runner.offer_manager = Mock()
+        runner.worker_pool = Mock()
+        runner.worker_pool.release = AsyncMock()
+        runner.worker_pool.execute_task = AsyncMock()
+        worker_spawned = asyncio.Event()
+
+        async def acquire(workflow_id):
+            await worker_spawned.wait()
+            return Mock()
+
+        runner.worker_pool.acquire = acquire
+        runner.running_tasks["task-1"] = TaskState("task-1")
+        settings = TaskSettings(
+            code="return []",
+            node_mode="all_items",
+            continue_on_fail=True,
+            items=b"[]",
+            workflow_name="",
+            workflow_id="",
+            node_name="",
+            node_id="",
+        )
+
+        await runner._handle_task_settings(BrokerTaskSettings("task-1", settings))
+        await asyncio.sleep(0.01)
+        await runner._handle_task_cancel(BrokerTaskCancel("task-1", "cancelled"))
+        worker_spawned.set()
+        await asyncio.sleep(0.01)
+
+        runner.worker_pool.execute_task.assert_not_awaited()
+        runner.worker_pool.release.assert_awaited_once()
+        assert "task-1" not in runner.running_tasks
+        sent = json.loads(runner.websocket_connection.send.call_args.args[0])
+        assert sent["type"] == "runner:taskerror"
+        assert sent["error"]["message"] == "Task was cancelled"
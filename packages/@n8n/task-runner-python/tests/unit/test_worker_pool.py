@@ -0,0 +1,415 @@
+import asyncio
+import dataclasses
+import json
+import os
+import threading
+import time
+
+import pytest
+import pytest_asyncio
+
+from src.config.security_config import SecurityConfig
+from src.config.subprocess_config import SubprocessConfig
+from src.errors import TaskOutputTooLargeError, TaskRuntimeError, TaskTimeoutError
+from src.pipe_reader import PipeReader
+from src.task_analyzer import TaskAnalyzer
+from src.task_executor import TaskExecutor
+from src.worker_pool import WorkerPool
+
+SUBPROCESS_CONFIG = SubprocessConfig(
+    print_max_bytes=1024 * 1024,
+    print_records_kept=50,
+    max_result_size=64 * 1024 * 1024,
+    compact_decode=False,
+)
+
+
+@pytest.fixture
+def security_config():
+    return SecurityConfig(
+        stdlib_allow={"*"},
+        external_allow=set(),
+        builtins_deny=set(),
+        runner_env_deny=True,
+    )
+
+
+@pytest_asyncio.fixture
+async def pool(security_config):
+    pool = WorkerPool(
+        size=1,
+        security_config=security_config,
+        subprocess_config=SUBPROCESS_CONFIG,
+        pipe_reader=PipeReader(),
+        max_tasks=3,
+        max_rss=0,
+    )
+    await pool.start()
+    yield pool
+    await pool.stop()
+
+
+def compile_code(pool: WorkerPool, code: str, node_mode="all_items") -> bytes:
+    return TaskAnalyzer(pool.security_config).compile(code, node_mode)
+
+
+async def run(
+    pool: WorkerPool,
+    code: str,
+    items=None,
+    node_mode="all_items",
+    timeout=5,
+    workflow_id="workflow",
+):
+    worker = await pool.acquire(workflow_id)
+    result = await pool.execute_task(
+        worker=worker,
+        code=compile_code(pool, code, node_mode),
+        node_mode=node_mode,
+        items=json.dumps(items or []).encode(),
+        task_timeout=timeout,
+        continue_on_fail=False,
+    )
+    return worker, result
+
+
+class TestWorkerPoolExecution:
+    @pytest.mark.asyncio
+    async def test_runs_all_items_task(self, pool):
+        _, (result, print_args, size) = await run(
+            pool, "print('hi')\nreturn [{'json': {'n': len(_items)}}]", [{}, {}]
+        )
+
+        assert json.loads(bytes(result)) == [{"json": {"n": 2}}]
+        assert print_args == [["'hi'"]]
+        assert size > 0
+
+    @pytest.mark.asyncio
+    async def test_runs_task_with_large_result(self, pool):
+        _, (result, _, size) = await run(
+            pool, "return [{'json': {'text': 'x' * 2 * 1024 * 1024}}]"
+        )
+
+        assert json.loads(bytes(result))[0]["json"]["text"] == "x" * 2 * 1024 * 1024
+        assert size > 2 * 1024 * 1024
+
+    @pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="requires memfd")
+    @pytest.mark.asyncio
+    async def test_runs_task_with_spilled_items(self, pool):
+        items = json.dumps([{"json": {"v": i}} for i in range(100)]).encode()
+        worker = await pool.acquire("workflow")
+
+        result, _, _ = await pool.execute_task(
+            worker=worker,
+            code=compile_code(pool, "return [{'json': {'n': len(_items)}}]"),
+            node_mode="all_items",
+            items=items,
+            task_timeout=5,
+            continue_on_fail=False,
+            items_memfd=TaskExecutor.spill_items(items, threshold=1),
+        )
+
+        assert json.loads(bytes(result)) == [{"json": {"n": 100}}]
+
+    @pytest.mark.asyncio
+    async def test_runs_per_item_task(self, pool):
+        _, (result, _, _) = await run(
+            pool,
+            "return {'v': _item['json']['v'] * 2}",
+            [{"json": {"v": 1}}, {"json": {"v": 2}}],
+            node_mode="per_item",
+        )
+
+        assert json.loads(bytes(result)) == [
+            {"json": {"v": 2}, "pairedItem": {"item": 0}},
+            {"json": {"v": 4}, "pairedItem": {"item": 1}},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_reuses_worker_across_tasks(self, pool):
+        first, _ = await run(pool, "return []")
+        second, _ = await run(pool, "return []")
+
+        assert first.process.pid == second.process.pid
+        assert second.tasks_run == 2
+
+    @pytest.mark.asyncio
+    async def test_streams_prints_while_task_runs(self, pool):
+        streamed = []
+        worker = await pool.acquire("workflow")
+
+        _, print_args, _ = await pool.execute_task(
+            worker=worker,
+            code=compile_code(
+                pool, "import time\nprint('hi')\ntime.sleep(0.5)\nreturn []"
+            ),
+            node_mode="all_items",
+            items=b"[]",
+            task_timeout=5,
+            continue_on_fail=False,
+            on_print=lambda args: streamed.append((args, time.monotonic())),
+        )
+        finished_at = time.monotonic()
+
+        assert [args for args, _ in streamed] == [["'hi'"]]
+        assert finished_at - streamed[0][1] >= 0.4
+        assert print_args == []
+
+    @pytest.mark.asyncio
+    async def test_runs_concurrent_tasks_without_threads(self, security_config):
+        pool = WorkerPool(
+            size=3,
+            security_config=security_config,
+            subprocess_config=SUBPROCESS_CONFIG,
+            pipe_reader=PipeReader(),
+            max_tasks=100,
+            max_rss=0,
+        )
+        await pool.start()
+        threads_before = threading.active_count()
+
+        try:
+            tasks = [
+                asyncio.create_task(
+                    run(pool, "import time\ntime.sleep(0.3)\nreturn []")
+                )
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.1)
+            threads_while_running = threading.active_count()
+            results = await asyncio.gather(*tasks)
+        finally:
+            await pool.stop()
+
+        assert threads_while_running == threads_before
+        assert all(json.loads(bytes(result)) == [] for _, (result, _, _) in results)
+
+    @pytest.mark.asyncio
+    async def test_does_not_leak_globals_across_tasks(self, pool):
+        await run(pool, "global leaked\nleaked = 1\nreturn []")
+
+        with pytest.raises(TaskRuntimeError):
+            await run(pool, "return [{'json': {'leaked': leaked}}]")
+
+    @pytest.mark.asyncio
+    async def test_does_not_leak_module_state_across_tasks(self, pool):
+        first, _ = await run(
+            pool,
+            "import json, string, colorsys\n"
+            "json.stash = _items[0]['json']['secret']\n"
+            "string.capwords = None\n"
+            "return []",
+            [{"json": {"secret": "tenant-token"}}],
+        )
+        second, (result, _, _) = await run(
+            pool,
+            "import json, string, sys\n"
+            "return [{'json': {\n"
+            "    'stash': getattr(json, 'stash', None),\n"
+            "    'capwords': string.capwords('a b'),\n"
+            "    'colorsys': 'colorsys' in sys.modules,\n"
+            "}}]",
+        )
+
+        assert first.process.pid == second.process.pid
+        assert json.loads(bytes(result)) == [
+            {"json": {"stash": None, "capwords": "A B", "colorsys": False}}
+        ]
+
+    @pytest.mark.asyncio
+    async def test_does_not_share_workers_across_workflows(self, pool):
+        first, _ = await run(pool, "return []", workflow_id="workflow-a")
+        second, _ = await run(pool, "return []", workflow_id="workflow-b")
+        third, _ = await run(pool, "return []", workflow_id="workflow-b")
+
+        assert first.process.pid != second.process.pid
+        assert second.process.pid == third.process.pid
+        assert not first.process.is_alive()
+        assert len(pool._idle_workers) == 1
+
+    @pytest.mark.skipif(not hasattr(os, "memfd_create"), reason="requires memfd")
+    @pytest.mark.asyncio
+    async def test_hands_over_unspilled_items_in_memfd(self, pool):
+        worker = await pool.acquire("workflow")
+        sent = []
+        send = worker.task_conn.send
+        worker.task_conn.send = lambda task: (sent.append(task), send(task))
+
+        result, _, _ = await pool.execute_task(
+            worker=worker,
+            code=compile_code(pool, "return [{'json': {'n': len(_items)}}]"),
+            node_mode="all_items",
+            items=json.dumps([{"json": {}}] * 3).encode(),
+            task_timeout=5,
+            continue_on_fail=False,
+        )
+
+        assert json.loads(bytes(result)) == [{"json": {"n": 3}}]
+        assert sent[0][2] is None
+
+
+class TestWorkerPoolRecycling:
+    @pytest.mark.asyncio
+    async def test_recycles_worker_after_max_tasks(self, pool):
+        workers = [(await run(pool, "return []"))[0] for _ in range(4)]
+
+        assert workers[0].process.pid == workers[2].process.pid
+        assert workers[3].process.pid != workers[0].process.pid
+        assert not workers[0].process.is_alive()
+
+    @pytest.mark.asyncio
+    async def test_recycles_worker_after_error(self, pool):
+        with pytest.raises(TaskRuntimeError):
+            await run(pool, "raise ValueError('boom')")
+
+        worker, (result, _, _) = await run(pool, "return []")
+
+        assert json.loads(bytes(result)) == []
+        assert worker.tasks_run == 1
+
+    @pytest.mark.asyncio
+    async def test_recycles_worker_after_timeout(self, pool):
+        with pytest.raises(TaskTimeoutError):
+            await run(pool, "while True:\n    pass", timeout=1)
+
+        worker, (result, _, _) = await run(pool, "return []")
+
+        assert json.loads(bytes(result)) == []
+        assert worker.tasks_run == 1
+
+    @pytest.mark.asyncio
+    async def test_times_out_while_task_keeps_printing(self, pool):
+        with pytest.raises(TaskTimeoutError):
+            await run(pool, "while True:\n    print('busy')", timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_recycles_worker_above_max_rss(self, security_config):
+        pool = WorkerPool(
+            size=1,
+            security_config=security_config,
+            subprocess_config=SUBPROCESS_CONFIG,
+            pipe_reader=PipeReader(),
+            max_tasks=100,
+            max_rss=1,
+        )
+        await pool.start()
+
+        try:
+            first, _ = await run(pool, "return []")
+            second, _ = await run(pool, "return []")
+
+            assert first.process.pid != second.process.pid
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_rejects_result_above_max_size(self, security_config):
+        pool = WorkerPool(
+            size=1,
+            security_config=security_config,
+            subprocess_config=dataclasses.replace(
+                SUBPROCESS_CONFIG,
+                max_result_size=1024,
+                compact_decode=False,
+            ),
+            pipe_reader=PipeReader(),
+            max_tasks=100,
+            max_rss=0,
+        )
+        await pool.start()
+
+        try:
+            with pytest.raises(TaskRuntimeError, match="exceeds the max payload size"):
+                await run(pool, "return [{'json': {'text': 'x' * 2048}}]")
+
+            _, (result, _, _) = await run(pool, "return [{'json': {'text': 'x'}}]")
+
+            assert json.loads(bytes(result)) == [{"json": {"text": "x"}}]
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_rejects_output_above_pipe_reader_limit(self, security_config):
+        pool = WorkerPool(
+            size=1,
+            security_config=security_config,
+            subprocess_config=SUBPROCESS_CONFIG,
+            pipe_reader=PipeReader(max_bytes_per_task=4096),
+            max_tasks=100,
+            max_rss=0,
+        )
+        await pool.start()
+
+        try:
+            with pytest.raises(TaskOutputTooLargeError):
+                await run(pool, "print('x' * 8192)\nreturn []")
+
+            worker, (result, _, _) = await run(pool, "return []")
+
+            assert json.loads(bytes(result)) == []
+            assert worker.tasks_run == 1
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_runs_task_with_compact_decoding(self, security_config):
+        pool = WorkerPool(
+            size=1,
+            security_config=security_config,
+            subprocess_config=dataclasses.replace(
+                SUBPROCESS_CONFIG, compact_decode=True
+            ),
+            pipe_reader=PipeReader(),
+            max_tasks=100,
+            max_rss=0,
+        )
+        await pool.start()
+
+        try:
+            _, (result, _, _) = await run(
+                pool,
+                "return [{'json': {'same': _items[0]['json']['s'] is _items[1]['json']['s']}}]",
+                [{"json": {"s": "shared"}}, {"json": {"s": "shared"}}],
+            )
+
+            assert json.loads(bytes(result)) == [{"json": {"same": True}}]
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_continue_on_fail_returns_error_item(self, pool):
+        worker = await pool.acquire("workflow")
+        result, _, _ = await pool.execute_task(
+            worker=worker,
+            code=compile_code(pool, "raise ValueError('boom')"),
+            node_mode="all_items",
+            items=b"[]",
+            task_timeout=5,
+            continue_on_fail=True,
+        )
+
+        assert json.loads(bytes(result)) == [{"json": {"error": "boom"}}]
+
+
+class TestWorkerPoolStartup:
+    @pytest.mark.asyncio
+    async def test_start_waits_until_workers_are_ready(self, security_config):
+        pool = WorkerPool(
+            size=2,
+            security_config=security_config,
+            subprocess_config=SUBPROCESS_CONFIG,
+            pipe_reader=PipeReader(),
+            max_tasks=100,
+            max_rss=0,
+        )
+        await pool.start()
+
+        try:
+            workers = [await pool.acquire("workflow"), await pool.acquire("workflow")]
+
+            assert all(worker.process.is_alive() for worker in workers)
+            assert all(not worker.task_conn.poll() for worker in workers)
+        finally:
+            for worker in workers:
+                await pool.release(worker)
+            await pool.stop()